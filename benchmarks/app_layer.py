@@ -0,0 +1,105 @@
+"""
+Benchmark the HTTP layer of product routes on the in-memory database backend,
+isolating FastAPI, pydantic and middleware overhead from database latency.
+
+Usage:
+    python benchmarks/app_layer.py
+    python benchmarks/app_layer.py --products 10000 --requests 2000 --items 100 1000
+
+App settings are read from the environment (or `env/.env.{APP_ENV}`) like when running the app,
+the database backend is forced to `memory`, response caching and rate limiting are disabled.
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT_DIR, "src"))
+os.environ["DB__BACKEND"] = "memory"
+os.environ["RESPONSE_CACHE__ENABLED"] = "false"
+os.environ["RATE_LIMIT__ENABLED"] = "false"
+
+import httpx  # noqa: E402  # pylint: disable=C0413
+
+from main import STORAGE, app_  # noqa: E402  # pylint: disable=C0413
+from modules import MySQLStorage  # noqa: E402  # pylint: disable=C0413
+
+WORDS = ["bolt", "nut", "screw", "washer", "rivet", "anchor", "hinge", "bracket"]
+
+
+async def seed(count: int):
+    """
+    Insert random products.
+    """
+    rng = random.Random(42)
+    async with STORAGE.pool.acquire() as connection:
+        await MySQLStorage(connection).apply_batch(
+            "INSERT INTO products (name, description, price, image_url) VALUES (%s, %s, %s, %s)",
+            [
+                (
+                    f"{rng.choice(WORDS)} {rng.randint(1, 999)}",
+                    " ".join(rng.choices(WORDS, k=30)),
+                    round(rng.uniform(1, 1000), 2),
+                    None,
+                )
+                for _ in range(count)
+            ],
+        )
+
+
+async def timed(client: httpx.AsyncClient, method: str, url: str, repeat: int, **kwargs):
+    """
+    Median and p99 request latency in milliseconds.
+    """
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        response = await client.request(method, url, **kwargs)
+        samples.append((time.perf_counter() - started) * 1000)
+        assert response.is_success, response.text
+    samples.sort()
+    return statistics.median(samples), samples[int(0.99 * (len(samples) - 1))]
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--products", type=int, default=5000)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--items", type=int, nargs="+", default=[10, 100, 1000])
+    options = parser.parse_args()
+
+    STORAGE.init_db()
+    await STORAGE.acquire_pool()
+    await seed(options.products)
+    payload = {
+        "name": "bolt 1",
+        "description": "a hex bolt",
+        "price": 1.5,
+        "image_url": None,
+    }
+
+    transport = httpx.ASGITransport(app=app_)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        cases = [("get", "GET", "/v1/products/42", {})]
+        cases += [
+            (f"list {n}", "GET", "/v1/products", {"params": {"items_per_page": n}})
+            for n in options.items
+        ]
+        cases += [
+            ("list filtered", "GET", "/v1/products", {"params": {"name_like": "bolt"}}),
+            ("create", "POST", "/v1/products", {"json": payload}),
+            ("update", "PUT", "/v1/products/42", {"json": payload}),
+        ]
+        print(f"{options.products:,} products, {options.requests:,} requests per case")
+        for label, method, url, kwargs in cases:
+            median, p99 = await timed(client, method, url, options.requests, **kwargs)
+            print(f"{label:>14}: median {median:7.3f} ms, p99 {p99:7.3f} ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,173 @@
+"""
+Benchmark list filters on the in-memory columnar catalog against the SQL path.
+
+Usage:
+    python benchmarks/catalog_filters.py                # catalog only
+    python benchmarks/catalog_filters.py --sql          # also seed MariaDB and time SQL
+
+The SQL path uses `MYSQL_HOST`, `MYSQL_PORT`, `MYSQL_USER`, `MYSQL_PASSWORD` like the test suite
+and a throwaway `bench_app` database. It renders filters with the product `Resource`,
+so app settings must be available like when running the app.
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from datetime import datetime
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT_DIR, "src"))
+
+from modules import (  # noqa: E402  # pylint: disable=C0413
+    ColumnarCatalog,
+    MigrationManager,
+    MySQLDatabase,
+    MySQLStorage,
+)
+
+# Text filters are left to SQL, the catalog does not mirror the collation
+FILTERS = {
+    "price range": {"price_ge": 100.0, "price_lt": 200.0},
+    "price gt": {"price_gt": 990.0},
+    "id in": {"id_in": list(range(1, 1000, 7))},
+    "combined": {"id_in": list(range(1, 1000, 7)), "price_gt": 500.0},
+}
+WORDS = ["bolt", "nut", "screw", "washer", "rivet", "anchor", "hinge", "bracket"]
+
+
+def make_rows(count: int) -> list[dict]:
+    """
+    Generate synthetic product rows.
+    """
+    rng = random.Random(42)
+    now = datetime.now()
+    return [
+        {
+            "id": i,
+            "name": f"{rng.choice(WORDS)} {rng.randint(1, 999)} {rng.choice(WORDS)}",
+            "description": "d" * 200,
+            "price": round(rng.uniform(1, 1000), 2),
+            "image_url": None,
+            "updated_at": now,
+        }
+        for i in range(1, count + 1)
+    ]
+
+
+def timed(func, repeat: int) -> float:
+    """
+    Median call time in milliseconds.
+    """
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) * 1000)
+    return sorted(samples)[len(samples) // 2]
+
+
+async def timed_async(func, repeat: int) -> float:
+    """
+    Median coroutine time in milliseconds.
+    """
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await func()
+        samples.append((time.perf_counter() - started) * 1000)
+    return sorted(samples)[len(samples) // 2]
+
+
+async def bench_sql(rows: list[dict], repeat: int) -> dict[str, float]:
+    """
+    Seed a throwaway database with rows and time the SQL list path.
+    """
+    # Renders filters like the list route, reading app settings from the environment
+    from routes.v1.resources.products.routes import (  # pylint: disable=C0415
+        PRODUCTS,
+    )
+
+    database = MySQLDatabase(
+        database="bench_app",
+        host=os.getenv("MYSQL_HOST", "localhost"),
+        port=int(os.getenv("MYSQL_PORT", 3306)),
+        user=os.getenv("MYSQL_USER", "root"),
+        password=os.getenv("MYSQL_PASSWORD", "password"),
+    )
+    database.teardown_db()
+    database.init_db()
+    MigrationManager(
+        db_user=database.user,
+        db_password=database.password,
+        db_host=database.host,
+        db_name=database.database,
+        db_port=database.port,
+        base_dir=ROOT_DIR,
+    ).apply()
+    await database.acquire_pool()
+
+    results = {}
+    try:
+        async with database.pool.acquire() as connection:
+            storage = MySQLStorage(connection)
+            for start in range(0, len(rows), 5000):
+                await storage.apply_many(
+                    [
+                        (
+                            "INSERT INTO products (id, name, description, price, image_url) "
+                            "VALUES (%s, %s, %s, %s, %s)",
+                            (r["id"], r["name"], r["description"], r["price"], None),
+                        )
+                        for r in rows[start : start + 5000]
+                    ]
+                )
+
+            for label, filters in FILTERS.items():
+
+                async def run(filters=filters):
+                    query, args = PRODUCTS.filter_query(
+                        "SELECT id, name, description, price, image_url FROM products",
+                        filters,
+                    )
+                    count_query, _ = PRODUCTS.filter_query(
+                        "SELECT COUNT(*) AS count FROM products", filters
+                    )
+                    await storage.get(count_query, args)
+                    return await storage.get(
+                        query + " ORDER BY id LIMIT 100", args, fetch_all=True
+                    )
+
+                results[label] = await timed_async(run, repeat)
+    finally:
+        await database.close_pool()
+        database.teardown_db()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--sql", action="store_true", help="Also time the SQL path")
+    options = parser.parse_args()
+
+    for count in options.rows:
+        rows = make_rows(count)
+        catalog = ColumnarCatalog(None)
+        started = time.perf_counter()
+        catalog._build(rows)  # pylint: disable=W0212
+        print(f"\n{count:,} rows, snapshot built in {time.perf_counter() - started:.2f}s")
+
+        sql = asyncio.run(bench_sql(rows, options.repeat)) if options.sql else {}
+        for label, filters in FILTERS.items():
+            line = f"  {label:<12} catalog {timed(lambda f=filters: catalog.query(f), options.repeat):8.2f} ms"
+            if label in sql:
+                line += f"   sql {sql[label]:8.2f} ms"
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""
+Benchmark compressed product descriptions.
+
+Usage:
+    python benchmarks/description_compression.py          # compression ratio and inflate cost
+    python benchmarks/description_compression.py --sql    # also list latency and buffer pool
+
+The SQL part uses `MYSQL_HOST`, `MYSQL_PORT`, `MYSQL_USER`, `MYSQL_PASSWORD` like the test suite
+and a throwaway `bench_app` database. It seeds plain rows, measures table size, buffer pool hit
+rate and list latency, compresses the rows with `TextCompressor.backfill` and measures again.
+Hit rates only differ once the table outgrows the buffer pool, run the server with
+a small `innodb_buffer_pool_size` (e.g. 64M) and enough `--rows`.
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT_DIR, "src"))
+
+from modules import (  # noqa: E402  # pylint: disable=C0413
+    MigrationManager,
+    MySQLDatabase,
+    MySQLStorage,
+    TextCompressor,
+    inflate,
+)
+
+WORDS = [
+    "durable", "steel", "bolt", "zinc", "plated", "corrosion", "resistant", "thread",
+    "pitch", "metric", "hex", "head", "suitable", "outdoor", "use", "pack", "of", "the",
+    "with", "and", "for", "high", "tensile", "strength", "standard", "grade",
+]  # fmt: skip
+LIST_QUERY = (
+    "SELECT id, name, description, description_compressed, price, image_url "
+    "FROM products WHERE id > %s ORDER BY id LIMIT 100"
+)
+
+
+def make_description(rng: random.Random, length: int) -> str:
+    """
+    Generate a catalog-like description of about `length` characters.
+    """
+    words = []
+    while sum(len(w) + 1 for w in words) < length:
+        words.append(rng.choice(WORDS))
+    return " ".join(words)
+
+
+def bench_codec(descriptions: list[str], compressor: TextCompressor):
+    """
+    Print compression ratio over stored bytes and per-row cost.
+    """
+    started = time.perf_counter()
+    packed = [compressor.compress(d) for d in descriptions]
+    compress_us = (time.perf_counter() - started) / len(descriptions) * 1_000_000
+    started = time.perf_counter()
+    for _, blob in packed:
+        if blob is not None:
+            inflate(blob)
+    inflate_us = (time.perf_counter() - started) / len(descriptions) * 1_000_000
+    plain = sum(len(d.encode()) for d in descriptions)
+    stored = sum(len(blob) if blob else len(text.encode()) for text, blob in packed)
+    print(
+        f"  ratio {plain / stored:.2f}x"
+        f"  compress {compress_us:.1f} µs/row  inflate {inflate_us:.1f} µs/row"
+    )
+
+
+async def measure(storage: MySQLStorage, rows: int, repeat: int) -> str:
+    """
+    Table size, buffer pool hit rate and list latency over random pages.
+    """
+    await storage.get("ANALYZE TABLE products", fetch_all=True)
+    size = await storage.get(
+        "SELECT data_length + index_length AS size FROM information_schema.tables "
+        "WHERE table_schema = DATABASE() AND table_name = 'products'"
+    )
+    status = "SHOW GLOBAL STATUS LIKE 'Innodb_buffer_pool_read%'"
+    before = {
+        r.Variable_name: int(r.Value) for r in await storage.get(status, fetch_all=True)
+    }
+
+    rng = random.Random(7)
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        items = await storage.get(
+            LIST_QUERY, rng.randint(0, max(rows - 100, 0)), fetch_all=True
+        )
+        for item in items:
+            if item.description_compressed is not None:
+                item.description = inflate(item.description_compressed)
+        samples.append((time.perf_counter() - started) * 1000)
+
+    after = {
+        r.Variable_name: int(r.Value) for r in await storage.get(status, fetch_all=True)
+    }
+    requests = (
+        after["Innodb_buffer_pool_read_requests"]
+        - before["Innodb_buffer_pool_read_requests"]
+    )
+    misses = after["Innodb_buffer_pool_reads"] - before["Innodb_buffer_pool_reads"]
+    samples.sort()
+    return (
+        f"table {size.size / 2**20:8.1f} MiB"
+        f"  buffer pool hit rate {1 - misses / max(requests, 1):7.2%}"
+        f"  list median {samples[len(samples) // 2]:6.2f} ms"
+        f"  p99 {samples[int(len(samples) * 0.99)]:6.2f} ms"
+    )
+
+
+async def bench_sql(descriptions: list[str], compressor: TextCompressor, repeat: int):
+    """
+    Seed a throwaway database and measure it before and after compression.
+    """
+    database = MySQLDatabase(
+        database="bench_app",
+        host=os.getenv("MYSQL_HOST", "localhost"),
+        port=int(os.getenv("MYSQL_PORT", 3306)),
+        user=os.getenv("MYSQL_USER", "root"),
+        password=os.getenv("MYSQL_PASSWORD", "password"),
+        query_timeout=None,
+    )
+    database.teardown_db()
+    database.init_db()
+    MigrationManager(
+        db_user=database.user,
+        db_password=database.password,
+        db_host=database.host,
+        db_name=database.database,
+        db_port=database.port,
+        base_dir=ROOT_DIR,
+    ).apply()
+    await database.acquire_pool()
+
+    try:
+        async with database.pool.acquire() as connection:
+            storage = MySQLStorage(connection)
+            for start in range(0, len(descriptions), 1000):
+                await storage.apply_batch(
+                    "INSERT INTO products (name, description, price, image_url) "
+                    "VALUES (%s, %s, %s, %s)",
+                    [
+                        (f"product {start + i}", d, 1.0, None)
+                        for i, d in enumerate(descriptions[start : start + 1000])
+                    ],
+                )
+            print(f"  plain       {await measure(storage, len(descriptions), repeat)}")
+
+        started = time.perf_counter()
+        converted = await compressor.backfill(database)
+        elapsed = time.perf_counter() - started
+        async with database.pool.acquire() as connection:
+            storage = MySQLStorage(connection)
+            # Reclaim the pages freed by the backfill
+            await storage.get("OPTIMIZE TABLE products", fetch_all=True)
+            print(f"  compressed  {await measure(storage, len(descriptions), repeat)}")
+        print(f"  backfill converted {converted:,} rows in {elapsed:.1f}s")
+    finally:
+        await database.close_pool()
+        database.teardown_db()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--length", type=int, default=2000, help="Description length")
+    parser.add_argument("--repeat", type=int, default=1000)
+    parser.add_argument("--sql", action="store_true", help="Also measure MariaDB")
+    options = parser.parse_args()
+
+    rng = random.Random(42)
+    descriptions = [
+        make_description(rng, rng.randint(options.length // 2, options.length * 3 // 2))
+        for _ in range(options.rows)
+    ]
+    compressor = TextCompressor(batch_size=1000, batch_pause=0)
+    print(f"{options.rows:,} descriptions of ~{options.length} characters")
+    bench_codec(descriptions, compressor)
+    if options.sql:
+        asyncio.run(bench_sql(descriptions, compressor, options.repeat))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Benchmark error responses of the whole app: malformed queries, missing products and internal errors.
+
+Usage:
+    python benchmarks/error_paths.py
+    python benchmarks/error_paths.py --requests 20000
+
+Requests are sent straight to the ASGI app, like a server would, on the in-memory database backend.
+Exceptions escaping the app are logged the way uvicorn does and all logs go to /dev/null,
+so the numbers include traceback formatting but not terminal output.
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT_DIR, "src"))
+os.environ["DB__BACKEND"] = "memory"
+os.environ["RESPONSE_CACHE__ENABLED"] = "false"
+os.environ["RATE_LIMIT__ENABLED"] = "false"
+
+import routes  # noqa: E402  # pylint: disable=C0413
+from main import STORAGE, app_  # noqa: E402  # pylint: disable=C0413
+
+SERVER_LOGGER = logging.getLogger("uvicorn.error")
+
+CASES = {
+    "422 query": ("/v1/products", b"price_lt=abc&items_per_page=0&id_in=x"),
+    "422 path": ("/v1/products/abc", b""),
+    "404": ("/v1/products/999999", b""),
+    "500": ("/v1/bench/fail", b""),
+}
+
+
+async def fail():
+    """
+    Route failing with the same internal error on every request.
+    """
+    raise RuntimeError("Benchmark failure")
+
+
+async def receive():
+    """
+    ASGI receive of an empty request body.
+    """
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+async def run(path: str, query: bytes, repeat: int) -> tuple[float, int]:
+    """
+    Requests per second and response status of a case.
+    """
+    statuses = []
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            statuses.append(message["status"])
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": query,
+        "headers": [(b"host", b"bench"), (b"accept", b"application/json")],
+        "client": ("127.0.0.1", 50000),
+        "server": ("bench", 80),
+    }
+    started = time.perf_counter()
+    for _ in range(repeat):
+        try:
+            await app_(dict(scope), receive, send)
+        except Exception:  # pylint: disable=W0718
+            SERVER_LOGGER.exception("Exception in ASGI application")
+    return repeat / (time.perf_counter() - started), statuses[-1]
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=10_000)
+    options = parser.parse_args()
+
+    with open(os.devnull, "w", encoding="utf-8") as devnull:
+        logging.basicConfig(stream=devnull, level=logging.INFO, force=True)
+        routes.v1.app_.add_api_route("/bench/fail", fail)
+        STORAGE.init_db()
+        await STORAGE.acquire_pool()
+
+        print(f"{options.requests:,} requests per case")
+        for label, (path, query) in CASES.items():
+            await run(path, query, 100)  # Warm up
+            throughput, status = await run(path, query, options.requests)
+            print(f"{label:>10}: {throughput:8,.0f} requests/s, status {status}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
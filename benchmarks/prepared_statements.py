@@ -0,0 +1,160 @@
+"""
+Benchmark the fixed product statements over the text protocol against prepared statements.
+
+Usage:
+    python benchmarks/prepared_statements.py
+    python benchmarks/prepared_statements.py --server-pid $(pidof mariadbd)
+
+Uses `MYSQL_HOST`, `MYSQL_PORT`, `MYSQL_USER`, `MYSQL_PASSWORD` like the test suite
+and a throwaway `bench_app` database. Reports median and p99 client latency, server counters
+of prepared statements and, with `--server-pid` of a local server, its CPU time per query.
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT_DIR, "src"))
+
+from modules import (  # noqa: E402  # pylint: disable=C0413
+    MigrationManager,
+    MySQLDatabase,
+    MySQLStorage,
+    PreparedQuery,
+)
+
+# Same statements as the product routes, which need the app settings to import
+SELECT_PRODUCT = PreparedQuery(
+    "SELECT id, name, description, price, image_url FROM products WHERE id = %s"
+)
+CHECK_PRODUCT = PreparedQuery("SELECT id FROM products WHERE id = %s")
+UPDATE_PRODUCT_PRICE = PreparedQuery("UPDATE products SET price = %s WHERE id = %s")
+
+COUNTERS = ("Com_stmt_prepare", "Com_stmt_execute", "Com_stmt_close", "Questions")
+
+
+def server_cpu_seconds(pid: int | None) -> float:
+    """
+    User and system CPU time of a local server process, 0 without one.
+    """
+    if not pid:
+        return 0.0
+    with open(f"/proc/{pid}/stat", encoding="ascii") as file:
+        fields = file.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+async def counters(storage: MySQLStorage) -> dict[str, int]:
+    """
+    Global server counters of executed statements.
+    """
+    rows = await storage.get("SHOW GLOBAL STATUS", fetch_all=True)
+    return {r.Variable_name: int(r.Value) for r in rows if r.Variable_name in COUNTERS}
+
+
+async def bench(
+    connection, rows: int, repeat: int, prepare: bool, server_pid: int | None
+) -> dict:
+    """
+    Run a mix of point reads, existence checks and price updates on a single connection.
+    """
+    storage = MySQLStorage(connection, prepare=prepare)
+    probe = MySQLStorage(connection)
+    rng = random.Random(42)
+    queries = [
+        (SELECT_PRODUCT, CHECK_PRODUCT, UPDATE_PRODUCT_PRICE)[i % 3]
+        for i in range(repeat)
+    ]
+
+    before = await counters(probe)
+    cpu = server_cpu_seconds(server_pid)
+    samples = []
+    for query in queries:
+        product_id = rng.randint(1, rows)
+        args = (
+            (round(rng.uniform(1, 1000), 2), product_id)
+            if query is UPDATE_PRODUCT_PRICE
+            else product_id
+        )
+        started = time.perf_counter()
+        if query is UPDATE_PRODUCT_PRICE:
+            await storage.apply(query, args)
+        else:
+            await storage.get(query, args)
+        samples.append((time.perf_counter() - started) * 1_000_000)
+    cpu = server_cpu_seconds(server_pid) - cpu
+    after = await counters(probe)
+
+    samples.sort()
+    return {
+        "median": samples[len(samples) // 2],
+        "p99": samples[int(len(samples) * 0.99)],
+        "cpu": cpu / repeat * 1_000_000,
+        **{name: after.get(name, 0) - before.get(name, 0) for name in COUNTERS},
+    }
+
+
+async def run(rows: int, repeat: int, server_pid: int | None):
+    """
+    Seed a throwaway database and compare both protocols.
+    """
+    database = MySQLDatabase(
+        database="bench_app",
+        host=os.getenv("MYSQL_HOST", "localhost"),
+        port=int(os.getenv("MYSQL_PORT", 3306)),
+        user=os.getenv("MYSQL_USER", "root"),
+        password=os.getenv("MYSQL_PASSWORD", "password"),
+    )
+    database.teardown_db()
+    database.init_db()
+    MigrationManager(
+        db_user=database.user,
+        db_password=database.password,
+        db_host=database.host,
+        db_name=database.database,
+        db_port=database.port,
+        base_dir=ROOT_DIR,
+    ).apply()
+    await database.acquire_pool()
+
+    try:
+        async with database.pool.acquire() as connection:
+            storage = MySQLStorage(connection)
+            await storage.apply_batch(
+                "INSERT INTO products (name, description, price, image_url) "
+                "VALUES (%s, %s, %s, %s)",
+                [(f"product {i}", "d" * 200, 1.0, None) for i in range(rows)],
+            )
+
+            print(f"{repeat:,} statements on {rows:,} rows, latency in µs")
+            for prepare in (False, True, False, True):  # Second rounds run warm
+                result = await bench(connection, rows, repeat, prepare, server_pid)
+                line = (
+                    f"  {'prepared' if prepare else 'text':<8}"
+                    f" median {result['median']:7.1f}  p99 {result['p99']:7.1f}"
+                    f"  prepare {result['Com_stmt_prepare']:>5}"
+                    f"  execute {result['Com_stmt_execute']:>7}"
+                )
+                if server_pid:
+                    line += f"  server cpu {result['cpu']:6.1f}/stmt"
+                print(line)
+    finally:
+        await database.close_pool()
+        database.teardown_db()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=20_000)
+    parser.add_argument("--server-pid", type=int, help="PID of a local MariaDB server")
+    options = parser.parse_args()
+    asyncio.run(run(options.rows, options.repeat, options.server_pid))
+
+
+if __name__ == "__main__":
+    main()
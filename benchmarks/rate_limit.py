@@ -0,0 +1,85 @@
+"""
+Benchmark the per-request overhead of rate limiting against a no-op ASGI app.
+
+Usage:
+    python benchmarks/rate_limit.py
+    python benchmarks/rate_limit.py --requests 200000 --clients 10000
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT_DIR, "src"))
+
+from modules.rate_limiting import (  # noqa: E402  # pylint: disable=C0413
+    LocalRateLimitBackend,
+    RateLimitMiddleware,
+)
+
+SCOPES = {
+    "point read": ("GET", "/v1/products/42", b""),
+    "list": ("GET", "/v1/products", b"page=3&items_per_page=1000&name_like=bolt"),
+    "write": ("POST", "/v1/products", b""),
+}
+
+
+async def app(scope, receive, send):
+    """
+    No-op ASGI app.
+    """
+
+
+async def send(message):
+    """
+    No-op ASGI send.
+    """
+
+
+async def receive():
+    """
+    ASGI receive of an empty request body.
+    """
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+async def run(handler, scopes: list[dict]) -> float:
+    """
+    Mean time per request in microseconds.
+    """
+    started = time.perf_counter()
+    for scope in scopes:
+        await handler(scope, receive, send)
+    return (time.perf_counter() - started) / len(scopes) * 1e6
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=100_000)
+    parser.add_argument("--clients", type=int, default=1000)
+    options = parser.parse_args()
+
+    for label, (method, path, query_string) in SCOPES.items():
+        scopes = [
+            {
+                "type": "http",
+                "method": method,
+                "path": path,
+                "query_string": query_string,
+                "headers": [(b"accept", b"application/json")],
+                "client": (f"10.0.{i // 256 % 256}.{i % 256}", 50000),
+            }
+            for i in (n % options.clients for n in range(options.requests))
+        ]
+        # Never throttle, so that every request pays the full bookkeeping cost
+        limited = RateLimitMiddleware(app, LocalRateLimitBackend(rate=1e9, burst=1e9))
+        baseline = await run(app, scopes)
+        overhead = await run(limited, scopes) - baseline
+        print(f"{label:>10}: {overhead:.2f} us per request")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,95 @@
+"""
+Benchmark JSON and MessagePack encoding of `GET /v1/products` pages.
+
+Usage:
+    python benchmarks/response_formats.py
+    python benchmarks/response_formats.py --items 1000 10000 --repeat 50
+
+Requires the optional `msgpack` package (`pipenv install msgpack`).
+"""
+
+import argparse
+import gzip
+import os
+import random
+import sys
+import time
+
+import msgpack
+import orjson
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT_DIR, "src"))
+
+from modules.content_negotiation import (  # noqa: E402  # pylint: disable=C0413
+    JSON_MEDIA_TYPE,
+    render,
+)
+
+WORDS = ["bolt", "nut", "screw", "washer", "rivet", "anchor", "hinge", "bracket"]
+DECODERS = {
+    "json": orjson.loads,
+    "msgpack": msgpack.unpackb,
+}
+
+
+def make_page(count: int) -> dict:
+    """
+    Build a `ProductListResponse` page in the shape the route serializes.
+    """
+    rng = random.Random(42)
+    return {
+        "ok": True,
+        "page": 1,
+        "items_per_page": count,
+        "total_pages": 1,
+        "items": [
+            {
+                "name": f"{rng.choice(WORDS)} {rng.randint(1, 999)} {rng.choice(WORDS)}",
+                "description": " ".join(rng.choices(WORDS, k=30)),
+                "price": round(rng.uniform(1, 1000), 2),
+                "image_url": f"https://cdn.example.com/products/{i}.png",
+                "id": i,
+            }
+            for i in range(1, count + 1)
+        ],
+    }
+
+
+def timed(func, repeat: int) -> float:
+    """
+    Median call time in milliseconds.
+    """
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) * 1000)
+    return sorted(samples)[len(samples) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, nargs="+", default=[1000])
+    parser.add_argument("--repeat", type=int, default=100)
+    options = parser.parse_args()
+
+    media_types = {"json": JSON_MEDIA_TYPE, "msgpack": "application/msgpack"}
+    for count in options.items:
+        content = make_page(count)
+        print(f"\n{count:,} items per page")
+        print(
+            f"  {'format':<8} {'encode ms':>10} {'decode ms':>10} {'bytes':>10} {'gzip bytes':>11}"
+        )
+        for label, media_type in media_types.items():
+            body = render(content, media_type)
+            encode = timed(lambda m=media_type: render(content, m), options.repeat)
+            decode = timed(lambda d=DECODERS[label], b=body: d(b), options.repeat)
+            print(
+                f"  {label:<8} {encode:10.3f} {decode:10.3f} "
+                f"{len(body):10,} {len(gzip.compress(body)):11,}"
+            )
+
+
+if __name__ == "__main__":
+    main()
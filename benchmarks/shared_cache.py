@@ -0,0 +1,119 @@
+"""
+Benchmark hit latency of the shared product cache against in-process dictionaries.
+
+Usage:
+    python benchmarks/shared_cache.py
+    python benchmarks/shared_cache.py --reads 500000 --rows 10000 --workers 4
+
+`dict` returns cached row objects and is the lower bound, `dict + orjson` keeps serialized rows
+like the shared cache does. With `--workers`, reader processes hit the same shared file
+concurrently with a writer invalidating rows, and their aggregate reads per second are reported.
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+import orjson
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT_DIR, "src"))
+
+from modules.shared_cache import SharedRowCache  # noqa: E402  # pylint: disable=C0413
+
+
+def make_row(product_id: int) -> dict:
+    """
+    Product row as served by `GET /v1/products/{id}`.
+    """
+    return {
+        "id": product_id,
+        "name": f"Product {product_id}",
+        "description": "A reasonably sized product description. " * 4,
+        "price": round(random.uniform(1, 1000), 2),
+        "image_url": f"https://img.example.com/{product_id}.png",
+    }
+
+
+def measure(get, keys: list[int]) -> float:
+    """
+    Mean time per read in microseconds.
+    """
+    started = time.perf_counter()
+    for key in keys:
+        get(key)
+    return (time.perf_counter() - started) / len(keys) * 1e6
+
+
+def reader(path: str, slots: int, keys: list[int], results) -> None:
+    """
+    Worker process reading the shared cache.
+    """
+    cache = SharedRowCache(path, slots=slots)
+    started = time.perf_counter()
+    for key in keys:
+        cache.get(key)
+    results.put((len(keys) / (time.perf_counter() - started), cache.hits, cache.misses))
+    cache.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--reads", type=int, default=200_000)
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--workers", type=int, default=0)
+    options = parser.parse_args()
+
+    rows = {i: make_row(i) for i in range(1, options.rows + 1)}
+    keys = [random.randint(1, options.rows) for _ in range(options.reads)]
+    slots = options.rows * 4
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "products.cache")
+        cache = SharedRowCache(path, slots=slots, ttl=3600)
+        for key, row in rows.items():
+            cache.put(key, row, cache.version(key))
+        # Slots are direct-mapped, rows evicted by a colliding ID are left out of the reads
+        keys = [key for key in keys if cache.get(key) is not None]
+        cache.hits = cache.misses = 0
+        serialized = {key: orjson.dumps(row) for key, row in rows.items()}
+
+        print(f"{len(keys):,} reads of {options.rows:,} rows in {slots:,} slots")
+        print(f"{'dict':>14}: {measure(rows.get, keys):6.2f} us")
+        print(
+            f"{'dict + orjson':>14}: "
+            f"{measure(lambda key: orjson.loads(serialized[key]), keys):6.2f} us"
+        )
+        print(f"{'shared cache':>14}: {measure(cache.get, keys):6.2f} us")
+        print(f"{'':>14}  hits {cache.hits:,}, misses {cache.misses:,}")
+
+        if options.workers:
+            results = multiprocessing.Queue()
+            processes = [
+                multiprocessing.Process(target=reader, args=(path, slots, keys, results))
+                for _ in range(options.workers)
+            ]
+            for process in processes:
+                process.start()
+            invalidations = 0
+            while any(process.is_alive() for process in processes):
+                key = random.randint(1, options.rows)
+                cache.invalidate(key)
+                cache.put(key, rows[key], cache.version(key))
+                invalidations += 1
+            stats = [results.get() for _ in processes]
+            for process in processes:
+                process.join()
+            print(
+                f"{options.workers} workers: {sum(s[0] for s in stats):,.0f} reads/s, "
+                f"hits {sum(s[1] for s in stats):,}, misses {sum(s[2] for s in stats):,}, "
+                f"{invalidations:,} concurrent invalidations"
+            )
+        cache.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""
+Benchmark cold start: interpreter start, `import main`, app startup and the first request.
+
+Usage:
+    python benchmarks/startup.py                      # median of 10 fresh processes
+    python benchmarks/startup.py --top 15             # also list the slowest imports
+    python benchmarks/startup.py --target-ms 800      # exit with 1 above the target
+    python benchmarks/startup.py --path "/v1/products?name_like=a"
+
+App settings are read from the environment (or `env/.env.{APP_ENV}`) like when running the app,
+the database must be reachable (`DB__BACKEND=memory` works without a server).
+App startup runs the lifespan, opening the database pool. The first request is a real
+filtered product list by default, so that it pays for everything loaded on first use.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import statistics
+import subprocess  # nosec B404
+import sys
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC_DIR = os.path.join(ROOT_DIR, "src")
+
+# Time-to-first-request target tracked for autoscaling deploys
+TARGET_FIRST_REQUEST_MS = 600.0
+
+FIRST_REQUEST_PATH = "/v1/products?price_gt=0"
+
+
+async def first_request(app, url: str) -> int:
+    """
+    Send a single GET request through the ASGI app.
+    :param url: Path with an optional query string.
+    :return: Response status.
+    """
+    path, _, query_string = url.partition("?")
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": query_string.encode(),
+        "headers": [(b"host", b"localhost")],
+        "client": ("127.0.0.1", 0),
+        "server": ("localhost", 80),
+    }
+    status = 0
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await app(scope, receive, send)
+    return status
+
+
+async def start_and_request(main, url: str) -> dict:
+    """
+    Run the app lifespan and send the first request once it started.
+    :return: Startup and first request timings and the response status.
+    """
+    started = time.perf_counter()
+    async with main.lifespan(main.app_):
+        ready = time.perf_counter()
+        status = await first_request(main.app_, url)
+        finished = time.perf_counter()
+    return {
+        "startup_ms": (ready - started) * 1000,
+        "first_request_ms": (finished - ready) * 1000,
+        "status": status,
+    }
+
+
+def child(url: str):
+    """
+    Measure the current process, print timings as JSON.
+    """
+    started = time.perf_counter()
+    sys.path.insert(0, SRC_DIR)
+    import main  # pylint: disable=C0415,E0401
+
+    imported = time.perf_counter()
+    result = asyncio.run(start_and_request(main, url))
+    print(json.dumps({"import_ms": (imported - started) * 1000, **result}))
+
+
+def run_child(extra_args: list[str], url: str) -> subprocess.CompletedProcess:
+    """
+    Run the benchmark in a fresh interpreter.
+    """
+    return subprocess.run(  # nosec B603
+        [
+            sys.executable,
+            *extra_args,
+            os.path.abspath(__file__),
+            "--child",
+            "--path",
+            url,
+        ],
+        capture_output=True,
+        text=True,
+        check=True,
+        cwd=SRC_DIR,
+    )
+
+
+def slowest_imports(count: int, url: str) -> list[tuple[int, str]]:
+    """
+    List top-level imports of `main` and the first request by cumulative import time.
+    :return: Microseconds and module name pairs.
+    """
+    stderr = run_child(["-X", "importtime"], url).stderr
+    imports = []
+    for line in stderr.splitlines():
+        match = re.match(r"import time:\s+\d+ \|\s+(\d+) \| (\s*)(\S+)", line)
+        if match and len(match.group(2)) <= 4:
+            imports.append((int(match.group(1)), match.group(3)))
+    return sorted(imports, reverse=True)[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--top", type=int, default=0, help="List the slowest imports")
+    parser.add_argument("--target-ms", type=float, default=TARGET_FIRST_REQUEST_MS)
+    parser.add_argument("--path", default=FIRST_REQUEST_PATH, help="First request URL")
+    options = parser.parse_args()
+    if options.child:
+        return child(options.path)
+
+    samples = []
+    for _ in range(options.repeat):
+        started = time.perf_counter()
+        result = json.loads(run_child([], options.path).stdout)
+        result["process_ms"] = (time.perf_counter() - started) * 1000
+        samples.append(result)
+
+    print(f"median of {options.repeat} cold starts, first request GET {options.path}")
+    statuses = sorted({s["status"] for s in samples})
+    if statuses != [200]:
+        print(f"  unexpected first request statuses {statuses}")
+    for key in ("import_ms", "startup_ms", "first_request_ms", "process_ms"):
+        print(f"  {key:<18} {statistics.median(s[key] for s in samples):8.1f}")
+    time_to_first_request = statistics.median(
+        s["import_ms"] + s["startup_ms"] + s["first_request_ms"] for s in samples
+    )
+    print(
+        f"  {'to first response':<18} {time_to_first_request:8.1f}"
+        f"   (target {options.target_ms:.0f} ms)"
+    )
+
+    if options.top:
+        print("\nslowest imports (cumulative ms)")
+        for microseconds, module in slowest_imports(options.top, options.path):
+            print(f"  {microseconds / 1000:8.1f}  {module}")
+
+    if time_to_first_request > options.target_ms:
+        sys.exit(1)
+    return None
+
+
+if __name__ == "__main__":
+    main()
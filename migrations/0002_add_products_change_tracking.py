@@ -0,0 +1,32 @@
+from yoyo import step
+
+__depends__ = {'0001_create_init'}
+
+steps = [
+    step(
+        """
+        ALTER TABLE `products`
+            ADD COLUMN `updated_at` TIMESTAMP(6) NOT NULL
+                DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6),
+            ADD INDEX `idx_products_updated_at` (`updated_at`, `id`);
+        """,
+        """
+        ALTER TABLE `products`
+            DROP INDEX `idx_products_updated_at`,
+            DROP COLUMN `updated_at`;
+        """,
+    ),
+    step(
+        """
+        CREATE TABLE IF NOT EXISTS `product_tombstones` (
+            `id` int(10) UNSIGNED NOT NULL,
+            `deleted_at` TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6),
+            PRIMARY KEY (`id`),
+            INDEX `idx_product_tombstones_deleted_at` (`deleted_at`, `id`)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+        """,
+        """
+        DROP TABLE IF EXISTS `product_tombstones`;
+        """,
+    ),
+]
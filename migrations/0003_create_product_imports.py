@@ -0,0 +1,57 @@
+from yoyo import step
+
+__depends__ = {'0002_add_products_change_tracking'}
+
+steps = [
+    step(
+        """
+        CREATE TABLE IF NOT EXISTS `product_imports` (
+            `id` int(10) UNSIGNED NOT NULL AUTO_INCREMENT,
+            `status` ENUM('pending', 'validating', 'loading', 'completed', 'failed')
+                NOT NULL DEFAULT 'pending',
+            `format` varchar(10) NOT NULL,
+            `total_rows` int(10) UNSIGNED NOT NULL DEFAULT 0,
+            `valid_rows` int(10) UNSIGNED NOT NULL DEFAULT 0,
+            `failed_rows` int(10) UNSIGNED NOT NULL DEFAULT 0,
+            `imported_rows` int(10) UNSIGNED NOT NULL DEFAULT 0,
+            `message` varchar(250) DEFAULT NULL,
+            `created_at` TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6),
+            `started_at` TIMESTAMP(6) NULL DEFAULT NULL,
+            `finished_at` TIMESTAMP(6) NULL DEFAULT NULL,
+            PRIMARY KEY (`id`)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+        """,
+        """
+        DROP TABLE IF EXISTS `product_imports`;
+        """,
+    ),
+    step(
+        """
+        CREATE TABLE IF NOT EXISTS `product_import_rows` (
+            `import_id` int(10) UNSIGNED NOT NULL,
+            `row_no` int(10) UNSIGNED NOT NULL,
+            `name` varchar(50) NOT NULL,
+            `description` TEXT NOT NULL,
+            `price` double UNSIGNED NOT NULL,
+            `image_url` varchar(250) DEFAULT NULL,
+            PRIMARY KEY (`import_id`, `row_no`)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+        """,
+        """
+        DROP TABLE IF EXISTS `product_import_rows`;
+        """,
+    ),
+    step(
+        """
+        CREATE TABLE IF NOT EXISTS `product_import_errors` (
+            `import_id` int(10) UNSIGNED NOT NULL,
+            `row_no` int(10) UNSIGNED NOT NULL,
+            `message` varchar(500) NOT NULL,
+            PRIMARY KEY (`import_id`, `row_no`)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+        """,
+        """
+        DROP TABLE IF EXISTS `product_import_errors`;
+        """,
+    ),
+]
@@ -0,0 +1,18 @@
+from yoyo import step
+
+__depends__ = {'0003_create_product_imports'}
+
+steps = [
+    step(
+        """
+        CREATE TABLE IF NOT EXISTS `id_sequences` (
+            `name` varchar(64) NOT NULL,
+            `next_id` int(10) UNSIGNED NOT NULL,
+            PRIMARY KEY (`name`)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+        """,
+        """
+        DROP TABLE IF EXISTS `id_sequences`;
+        """,
+    ),
+]
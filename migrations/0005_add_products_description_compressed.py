@@ -0,0 +1,30 @@
+from yoyo import step
+
+__depends__ = {'0004_create_id_sequences'}
+
+
+def uncompress_descriptions(conn):
+    """
+    Restore compressed descriptions before dropping their column.
+    """
+    cursor = conn.cursor()
+    cursor.execute("""
+        UPDATE `products`
+            SET `description` = UNCOMPRESS(`description_compressed`),
+                `updated_at` = `updated_at`
+            WHERE `description_compressed` IS NOT NULL;
+        """)
+    cursor.execute("ALTER TABLE `products` DROP COLUMN `description_compressed`;")
+
+
+# Rows are compressed by the app in batches, see `TextCompressor.backfill`
+steps = [
+    step(
+        """
+        ALTER TABLE `products`
+            ADD COLUMN `description_compressed` BLOB DEFAULT NULL,
+            ALGORITHM=INPLACE, LOCK=NONE;
+        """,
+        uncompress_descriptions,
+    ),
+]
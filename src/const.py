@@ -1,10 +1,25 @@
 import os
+import tempfile
+from typing import Literal
 
 from dotenv import load_dotenv
 from pydantic import BaseModel, Field
 from pydantic_settings import BaseSettings
 
-from modules import MySQLDatabase
+import modules
+from modules import (
+    ColumnarCatalog,
+    ErrorReporter,
+    EventBroker,
+    MySQLDatabase,
+    QueryGovernor,
+    RequestProfiler,
+    ResponseCache,
+    SharedRowCache,
+    TextCompressor,
+    Tracer,
+    WriteBehindBuffer,
+)
 
 SRC_DIR: str = os.path.dirname(os.path.abspath(__file__))
 ROOT_DIR: str = os.path.dirname(SRC_DIR)
@@ -13,11 +28,19 @@ load_dotenv(os.path.join(ROOT_DIR, "env", f".env.{ENVIRONMENT}"))
 
 
 class MariaDBSettings(BaseModel):
+    backend: Literal["mysql", "memory"] = Field(default="mysql")  # In-process SQLite
     host: str = Field(default="127.0.0.1")
     user: str = Field()
     password: str = Field()
     name: str = Field(default="app")
     port: int = Field(default=3306)
+    query_timeout: float | None = Field(default=10.0)
+    acquire_timeout: float | None = Field(default=5.0)
+    breaker_threshold: int = Field(default=5)
+    breaker_reset_timeout: float = Field(default=10.0)
+    shards: list[str] = Field(default=[])  # Additional shard database names
+    id_block_size: int = Field(default=100)
+    prepared_statements: bool = Field(default=False)  # Binary protocol for fixed queries
 
 
 class AppSettings(BaseModel):
@@ -25,14 +48,141 @@ class AppSettings(BaseModel):
     version: str = Field(default="1.0.0")
     port: int = Field(default=8080)
     keep_alive_timeout: int = Field(default=5)
+    request_timeout: float | None = Field(default=30.0)
+    debug: bool = Field(default=False)  # Adds `X-Query-Stats` response headers
     host: str = Field(default="0.0.0.0")  # nosec B104
 
 
+class AdmissionSettings(BaseModel):
+    enabled: bool = Field(default=True)
+    adaptive: bool = Field(default=False)
+    max_concurrency: int = Field(default=64)  # Initial limit in adaptive mode
+    min_concurrency: int = Field(default=4)
+    adaptive_max_concurrency: int = Field(default=256)
+    max_queue: int = Field(default=128)
+    queue_timeout: float = Field(default=0.5)
+    target_latency: float = Field(default=0.25)
+
+
+class CatalogSettings(BaseModel):
+    enabled: bool = Field(default=False)  # Requires `numpy`
+    refresh_interval: float = Field(default=1.0)
+    lazy_cache_size: int = Field(default=10_000)
+
+
+class ResponseCacheSettings(BaseModel):
+    enabled: bool = Field(default=True)
+    ttl: float = Field(default=5.0)
+    stale_ttl: float = Field(default=30.0)
+    max_bytes: int = Field(default=64 << 20)
+
+
+class StreamSettings(BaseModel):
+    history_size: int = Field(default=1000)
+    queue_size: int = Field(default=256)
+
+
+class AdminSettings(BaseModel):
+    token: str | None = Field(default=None)  # Admin routes are disabled without it
+
+
+class ProfilingSettings(BaseModel):
+    enabled: bool = Field(default=False)
+    output_dir: str = Field(default=os.path.join(tempfile.gettempdir(), "profiles"))
+    max_profiles: int = Field(default=20)
+
+
+class TracingSettings(BaseModel):
+    enabled: bool = Field(default=True)
+    sample_rate: float = Field(default=0.01, ge=0, le=1)
+    buffer_size: int = Field(default=1000)
+    export_path: str | None = Field(default=None)  # JSON lines file
+
+
+class IdempotencySettings(BaseModel):
+    enabled: bool = Field(default=True)
+    ttl: float = Field(default=86400.0)
+    max_entries: int = Field(default=100_000)
+    wait_timeout: float = Field(default=10.0)
+    max_body_bytes: int = Field(default=8 << 20)
+
+
+class RateLimitSettings(BaseModel):
+    enabled: bool = Field(default=True)
+    rate: float = Field(default=100.0)  # Tokens per second, a point read costs 1
+    burst: float = Field(default=1000.0)
+    max_clients: int = Field(default=100_000)
+    api_keys: list[str] = Field(default=[])  # Keys of `X-API-Key` limited on their own
+
+
+class WriteBehindSettings(BaseModel):
+    enabled: bool = Field(
+        default=False
+    )  # Acknowledges price updates before they are written
+    flush_interval: float = Field(default=0.05)
+    max_pending: int = Field(default=100_000)
+    max_batch: int = Field(default=1000)
+
+
+class CompressionSettings(BaseModel):
+    enabled: bool = Field(default=False)  # Stores long product descriptions compressed
+    min_length: int = Field(default=256)  # Bytes, shorter descriptions are stored plain
+    level: int = Field(default=6, ge=1, le=9)
+    backfill: bool = Field(default=True)  # Compresses existing rows in the background
+    batch_size: int = Field(default=500)
+
+
+class ErrorReportingSettings(BaseModel):
+    log_first: int = Field(default=5)  # Tracebacks logged per distinct internal error
+    log_every: int = Field(default=1000)  # Then one per this many occurrences, 0 for none
+    max_fingerprints: int = Field(default=1000)
+
+
+class SharedCacheSettings(BaseModel):
+    enabled: bool = Field(
+        default=False
+    )  # Product point reads shared by the workers of a host
+    path: str = Field(
+        default=os.path.join(
+            "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir(),
+            "products.cache",
+        )
+    )
+    slots: int = Field(default=16384, gt=0)
+    slot_size: int = Field(default=2048, ge=256)  # Bytes, larger rows are not cached
+    ttl: float = Field(default=5.0)  # Bounds staleness from writes of other hosts
+
+
+class QueryGovernorSettings(BaseModel):
+    enabled: bool = Field(default=True)
+    max_cost: int = Field(
+        default=1_000_000
+    )  # Estimated rows a page may examine per shard
+    max_count_cost: int = Field(default=100_000)  # Costlier lists skip the exact count
+    page_statement_time: float = Field(default=5.0)  # Seconds, 0 for no server-side limit
+    count_statement_time: float = Field(default=1.0)
+    refresh_interval: float = Field(default=60.0)  # Seconds between table size estimates
+
+
 class Settings(BaseSettings):
     db: MariaDBSettings = Field()
     disable_swagger_docs: bool = Field(default=False)
     disable_redoc_docs: bool = Field(default=True)
     app: AppSettings = Field(default=AppSettings())
+    admission: AdmissionSettings = Field(default=AdmissionSettings())
+    catalog: CatalogSettings = Field(default=CatalogSettings())
+    response_cache: ResponseCacheSettings = Field(default=ResponseCacheSettings())
+    stream: StreamSettings = Field(default=StreamSettings())
+    admin: AdminSettings = Field(default=AdminSettings())
+    profiling: ProfilingSettings = Field(default=ProfilingSettings())
+    tracing: TracingSettings = Field(default=TracingSettings())
+    idempotency: IdempotencySettings = Field(default=IdempotencySettings())
+    rate_limit: RateLimitSettings = Field(default=RateLimitSettings())
+    write_behind: WriteBehindSettings = Field(default=WriteBehindSettings())
+    compression: CompressionSettings = Field(default=CompressionSettings())
+    errors: ErrorReportingSettings = Field(default=ErrorReportingSettings())
+    shared_cache: SharedCacheSettings = Field(default=SharedCacheSettings())
+    query_governor: QueryGovernorSettings = Field(default=QueryGovernorSettings())
     jwt_secret: str = Field()
     jwt_expires_minutes: int = Field(default=720)  # 12 hours default
 
@@ -43,10 +193,118 @@ class Settings(BaseSettings):
 SETTINGS = Settings()
 
 
-STORAGE: MySQLDatabase = MySQLDatabase(
+STORAGE: MySQLDatabase = (
+    modules.MemoryDatabase if SETTINGS.db.backend == "memory" else MySQLDatabase
+)(
     database=SETTINGS.db.name,
     host=SETTINGS.db.host,
     port=SETTINGS.db.port,
     user=SETTINGS.db.user,
     password=SETTINGS.db.password,
+    query_timeout=SETTINGS.db.query_timeout,
+    acquire_timeout=SETTINGS.db.acquire_timeout,
+    breaker_threshold=SETTINGS.db.breaker_threshold,
+    breaker_reset_timeout=SETTINGS.db.breaker_reset_timeout,
+    shards=SETTINGS.db.shards,
+    id_block_size=SETTINGS.db.id_block_size,
+    prepared_statements=SETTINGS.db.prepared_statements,
+)
+
+CATALOG: ColumnarCatalog | None = (
+    ColumnarCatalog(
+        STORAGE,
+        lazy_columns=("description", "description_compressed"),
+        refresh_interval=SETTINGS.catalog.refresh_interval,
+        lazy_cache_size=SETTINGS.catalog.lazy_cache_size,
+    )
+    if SETTINGS.catalog.enabled and not SETTINGS.db.shards  # Not shard-aware
+    else None
+)
+
+RESPONSE_CACHE: ResponseCache = ResponseCache(
+    ttl=SETTINGS.response_cache.ttl,
+    stale_ttl=SETTINGS.response_cache.stale_ttl,
+    max_bytes=SETTINGS.response_cache.max_bytes,
+)
+
+# Pass a cross-worker `backend` when running multiple workers
+BROKER: EventBroker = EventBroker(
+    history_size=SETTINGS.stream.history_size,
+    queue_size=SETTINGS.stream.queue_size,
+)
+
+PROFILER: RequestProfiler | None = (
+    RequestProfiler(
+        SETTINGS.profiling.output_dir,
+        token=SETTINGS.admin.token,
+        max_profiles=SETTINGS.profiling.max_profiles,
+    )
+    if SETTINGS.profiling.enabled
+    else None
+)
+
+TRACER: Tracer | None = (
+    Tracer(
+        sample_rate=SETTINGS.tracing.sample_rate,
+        buffer_size=SETTINGS.tracing.buffer_size,
+        export_path=SETTINGS.tracing.export_path,
+    )
+    if SETTINGS.tracing.enabled
+    else None
+)
+
+PRICE_WRITER: WriteBehindBuffer | None = (
+    WriteBehindBuffer(
+        STORAGE,
+        table="products",
+        column="price",
+        flush_interval=SETTINGS.write_behind.flush_interval,
+        max_pending=SETTINGS.write_behind.max_pending,
+        max_batch=SETTINGS.write_behind.max_batch,
+    )
+    if SETTINGS.write_behind.enabled
+    else None
+)
+
+DESCRIPTION_COMPRESSOR: TextCompressor | None = (
+    TextCompressor(
+        min_length=SETTINGS.compression.min_length,
+        level=SETTINGS.compression.level,
+        batch_size=SETTINGS.compression.batch_size,
+    )
+    if SETTINGS.compression.enabled
+    else None
+)
+
+ERROR_REPORTER: ErrorReporter = ErrorReporter(
+    log_first=SETTINGS.errors.log_first,
+    log_every=SETTINGS.errors.log_every,
+    max_fingerprints=SETTINGS.errors.max_fingerprints,
+)
+
+PRODUCT_CACHE: SharedRowCache | None = (
+    SharedRowCache(
+        SETTINGS.shared_cache.path,
+        slots=SETTINGS.shared_cache.slots,
+        slot_size=SETTINGS.shared_cache.slot_size,
+        ttl=SETTINGS.shared_cache.ttl,
+    )
+    if SETTINGS.shared_cache.enabled
+    else None
+)
+
+QUERY_GOVERNOR: QueryGovernor | None = (
+    QueryGovernor(
+        STORAGE,
+        tables=("products",),
+        max_cost=SETTINGS.query_governor.max_cost,
+        max_count_cost=SETTINGS.query_governor.max_count_cost,
+        statement_times={
+            "page": SETTINGS.query_governor.page_statement_time,
+            "count": SETTINGS.query_governor.count_statement_time,
+        },
+        refresh_interval=SETTINGS.query_governor.refresh_interval,
+    )
+    if SETTINGS.query_governor.enabled
+    else None
 )
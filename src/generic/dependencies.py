@@ -1,16 +1,50 @@
-from fastapi import Request
+import secrets
+from contextlib import AsyncExitStack
 
-from modules.mysql_driver import MySQLStorage
+from fastapi import HTTPException, Request
+
+from modules.mysql_driver import MySQLStorage, acquire_storage
+from modules.sharding import ShardedStorage
 
 
 async def get_storage(request: Request) -> MySQLStorage:
     """
-    Get storage instance.
+    Get storage instance of the first shard.
     :param request: FastAPI request.
     :return: Storage instance.
     """
-    storage = request.app.extra["storage"]
-    if storage.extra.get("is_test"):
-        await storage.acquire_pool()
-    async with storage.pool.acquire() as connection:
-        yield MySQLStorage(connection)
+    database = request.app.extra["storage"]
+    if database.extra.get("is_test"):
+        await database.acquire_pool()
+
+    async with acquire_storage(database) as db:
+        yield db
+
+
+async def get_shards(request: Request) -> ShardedStorage:
+    """
+    Get sharded storage, connections to shards are acquired on first use.
+    :param request: FastAPI request.
+    :return: Sharded storage instance.
+    """
+    database = request.app.extra["storage"]
+    if database.extra.get("is_test"):
+        await database.acquire_pool()
+
+    async with AsyncExitStack() as stack:
+        yield ShardedStorage(database, acquire_storage, stack)
+
+
+async def require_admin(request: Request):
+    """
+    Allow only requests carrying the admin token in the `X-Admin-Token` header.
+    Admin routes look nonexistent while no admin token is configured.
+    :param request: FastAPI request.
+    """
+    token = request.app.extra.get("admin_token")
+    if not token:
+        raise HTTPException(status_code=404, detail="Not found")
+    if not secrets.compare_digest(
+        request.headers.get("x-admin-token", "").encode(), token.encode()
+    ):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
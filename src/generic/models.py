@@ -23,6 +23,12 @@ class BasePaginatedResponse(BaseResponse):
     total_pages: int = Field(
         title="Total number of pages", description="Total number of pages"
     )
+    total_pages_exact: bool = Field(
+        default=True,
+        title="Whether the total number of pages is exact",
+        description="False when counting was skipped for cost, "
+        "`total_pages` then only tells whether a next page exists",
+    )
 
 
 class BaseErrorResponse(BaseResponse):
@@ -53,6 +59,17 @@ class BaseErrorResponse(BaseResponse):
         return data
 
 
+class Error403Response(BaseErrorResponse):  # Forbidden
+    """
+    The client does not have access rights to the content; that is, it is unauthorized,
+    so the server is refusing to give the requested resource.
+    Unlike 401 Unauthorized, the client's identity is known to the server.
+    https://developer.mozilla.org/en-US/docs/Web/HTTP/Status/403.
+    """
+
+    message: str = "Forbidden"
+
+
 class Error404Response(BaseErrorResponse):  # Not found
     """
     The server cannot find the requested resource. In the browser, this means the URL is not recognized.
@@ -83,3 +100,13 @@ class Error500Response(BaseErrorResponse):  # Internal server error
     """
 
     message: str = "Internal server error"
+
+
+class Error503Response(BaseErrorResponse):  # Service unavailable
+    """
+    The server is not ready to handle the request.
+    Common causes are a server that is down for maintenance or that is overloaded.
+    https://developer.mozilla.org/en-US/docs/Web/HTTP/Status/503.
+    """
+
+    message: str = "Service unavailable"
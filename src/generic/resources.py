@@ -0,0 +1,773 @@
+import heapq
+import inspect
+from itertools import islice
+from math import ceil
+from operator import itemgetter
+from typing import Any, Callable, Literal, Optional, Sequence
+
+from fastapi import APIRouter, Body, Depends, HTTPException, Path, Query, Request
+from pydantic import BaseModel
+
+from modules import (
+    AttrDict,
+    MySQLStorage,
+    PreparedQuery,
+    QueryGovernor,
+    ShardedStorage,
+    SharedRowCache,
+    SQLQueryUtil,
+    StatementTimeoutError,
+)
+from modules.sharding import gather_all, shard_index
+from modules.tracing import trace_span
+
+from . import dependencies as generic_deps
+from . import models as generic_models
+
+FILTER_OPERATORS = {
+    "eq": "=",
+    "in": "IN",
+    "like": "LIKE",
+    "lt": "<",
+    "gt": ">",
+    "le": "<=",
+    "ge": ">=",
+}
+FILTER_TITLES = {
+    "eq": "{} filter",
+    "in": "{} list filter",
+    "like": "{} alike filter",
+    "lt": "{} less filter",
+    "gt": "{} greater filter",
+    "le": "{} less equal filter",
+    "ge": "{} greater equal filter",
+}
+# Estimated share of rows matched per filter operator, for query cost estimates.
+# `in` matches one `eq` share per value. Ranges get the classic optimizer guess of a third.
+FILTER_SELECTIVITY = {
+    "eq": 0.01,
+    "in": 0.01,
+    "like": 0.1,
+    "lt": 1 / 3,
+    "gt": 1 / 3,
+    "le": 1 / 3,
+    "ge": 1 / 3,
+}
+
+
+class Filter:
+    """
+    Filterable column of a resource. Every operator becomes a query parameter,
+    `eq` is named after the column, others get the operator as suffix, e.g. `price_lt`.
+    """
+
+    def __init__(
+        self,
+        column: str,
+        annotation: Any,
+        operators: Sequence[str] = ("eq",),
+        title: Optional[str] = None,
+        constraints: Optional[dict[str, dict[str, Any]]] = None,
+        **common: Any,
+    ):
+        """
+        Initialize filter.
+        :param column: Column name.
+        :param annotation: Type of filter values.
+        :param operators: Operators of `FILTER_OPERATORS`.
+        :param title: Column title used in parameter titles, capitalized column name by default.
+        :param constraints: Extra `Query` arguments per operator, override `common`.
+        :param common: `Query` arguments of every operator except `in`, e.g. `gt=0`.
+        """
+        self.column: str = column
+        self.annotation: Any = annotation
+        self.operators: tuple[str, ...] = tuple(operators)
+        self.title: str = title or column.replace("_", " ").capitalize()
+        self.constraints: dict[str, dict[str, Any]] = constraints or {}
+        self.common: dict[str, Any] = common
+
+    def name(self, operator: str) -> str:
+        """
+        Query parameter and filter name of an operator.
+        """
+        return self.column if operator == "eq" else f"{self.column}_{operator}"
+
+    def parameters(self) -> list[inspect.Parameter]:
+        """
+        Query parameters of all operators.
+        """
+        parameters = []
+        for operator in self.operators:
+            if operator == "in":
+                annotation, kwargs = list[self.annotation], {"min_length": 1}
+            else:
+                annotation, kwargs = self.annotation, dict(self.common)
+            kwargs.update(self.constraints.get(operator, {}))
+            parameters.append(
+                inspect.Parameter(
+                    self.name(operator),
+                    inspect.Parameter.KEYWORD_ONLY,
+                    default=Query(
+                        default=None,
+                        title=FILTER_TITLES[operator].format(self.title),
+                        **kwargs,
+                    ),
+                    annotation=Optional[annotation],
+                )
+            )
+        return parameters
+
+    def clauses(self) -> dict[str, tuple[str, Callable[[Any], Any]]]:
+        """
+        SQL condition and argument conversion per filter name.
+        """
+        return {
+            self.name(operator): (
+                f"{self.column} {FILTER_OPERATORS[operator]} %({self.name(operator)})s",
+                (lambda v: f"%{v}%") if operator == "like" else (lambda v: v),
+            )
+            for operator in self.operators
+        }
+
+
+class Resource:
+    """
+    Declarative CRUD resource over a table with an `id` primary key.
+    Statements are generated once on declaration, the fixed ones as `PreparedQuery`,
+    list statements per combination of active filters on first use. `add_routes` adds
+    list, get, create, batch create, update and delete routes on top of `ShardedStorage`:
+    point routes touch the shard of the row only, lists are merged across shards.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        table: str,
+        columns: Sequence[str],
+        model: type[BaseModel],
+        request_model: type[BaseModel],
+        response_model: type[BaseModel],
+        list_response_model: type[BaseModel],
+        batch_request_model: type[BaseModel],
+        batch_response_model: type[BaseModel],
+        filters: Sequence[Filter] = (),
+        sortable: Sequence[str] = ("id",),
+        plural: Optional[str] = None,
+        tombstones_table: Optional[str] = None,
+        encode: Optional[Callable[[Request, dict[str, Any]], dict[str, Any]]] = None,
+        indexed: Sequence[str] = ("id",),
+        catalog: Optional[str] = None,
+        cache: Optional[str] = None,
+        governor: Optional[str] = None,
+        writers: Sequence[str] = (),
+        events: bool = False,
+    ):
+        """
+        Initialize resource.
+        :param name: Singular title, e.g. `Product`.
+        :param table: Table name.
+        :param columns: Stored columns besides `id`, in statement order.
+        :param model: Row model, validated from selected rows.
+        :param request_model: Model of create and update payloads.
+        :param response_model: Response with a single `item`.
+        :param list_response_model: Paginated response with `items`.
+        :param batch_request_model: Batch create payload with `items`.
+        :param batch_response_model: Batch create response with `items`.
+        :param filters: Filterable columns of list routes.
+        :param sortable: Columns list routes can be sorted by.
+        :param plural: Plural title, `name` with `s` by default.
+        :param tombstones_table: Table recording IDs of deleted rows for change feeds.
+        :param encode: Converts dumped payloads into column values, e.g. to compress them.
+        :param indexed: Columns leading an index, used to estimate the cost of lists.
+        :param catalog: `app.extra` key of a `ColumnarCatalog` serving unsorted lists.
+        :param cache: `app.extra` key of a `SharedRowCache` serving point reads, invalidated
+            by the update and delete routes.
+        :param governor: `app.extra` key of a `QueryGovernor` admitting lists by estimated cost.
+        :param writers: `app.extra` keys of `WriteBehindBuffer`s of single columns, whose buffered
+            updates the update and delete routes discard before writing.
+        :param events: Whether to publish `created`, `updated` and `deleted` events
+            to the `broker` of `app.extra`.
+        """
+        self.name: str = name
+        self.plural: str = plural or f"{name}s"
+        self.table: str = table
+        self.columns: tuple[str, ...] = tuple(columns)
+        self.model: type[BaseModel] = model
+        self.request_model: type[BaseModel] = request_model
+        self.response_model: type[BaseModel] = response_model
+        self.list_response_model: type[BaseModel] = list_response_model
+        self.batch_request_model: type[BaseModel] = batch_request_model
+        self.batch_response_model: type[BaseModel] = batch_response_model
+        self.sortable: tuple[str, ...] = tuple(sortable)
+        self.tombstones_table: Optional[str] = tombstones_table
+        self.encode: Optional[Callable[[Request, dict[str, Any]], dict[str, Any]]] = (
+            encode
+        )
+        self.catalog: Optional[str] = catalog
+        self.indexed: tuple[str, ...] = tuple(indexed)
+        self.cache: Optional[str] = cache
+        self.governor: Optional[str] = governor
+        self.writers: tuple[str, ...] = tuple(writers)
+        self.events: bool = events
+
+        self.clauses: dict[str, tuple[str, Callable[[Any], Any]]] = {}
+        self.operators: dict[str, tuple[str, str]] = (
+            {}
+        )  # Column and operator by filter name
+        for filter_ in filters:
+            self.clauses.update(filter_.clauses())
+            for operator in filter_.operators:
+                self.operators[filter_.name(operator)] = (filter_.column, operator)
+        self.filters: Callable[..., dict[str, Any]] = self._filters_dependency(filters)
+        self.too_expensive: str = (
+            f"Query too expensive, filter by {', '.join(self.indexed)}, "
+            "request fewer items per page or an earlier page"
+        )
+        self._list_queries: dict[tuple, tuple[str, str]] = {}
+
+        columns_sql = ", ".join(self.columns)
+        row = f"({', '.join(['%s'] * len(self.columns))})"
+        row_with_id = f"(%s, {row[1:]}"
+        self.select_sql: str = f"SELECT id, {columns_sql} FROM {table}"  # nosec B608
+        self.insert_sql: str = (
+            f"INSERT INTO {table} ({columns_sql}) VALUES "  # nosec B608
+        )
+        self.insert_with_id_sql: str = (
+            f"INSERT INTO {table} (id, {columns_sql}) VALUES "  # nosec B608
+        )
+        self.row_sql: str = row
+        self.row_with_id_sql: str = row_with_id
+        self.select_statement: PreparedQuery = PreparedQuery(
+            f"{self.select_sql} WHERE id = %s"
+        )
+        # Inserted IDs are returned, they are not consecutive with `innodb_autoinc_lock_mode=2`
+        # or `auto_increment_increment` above 1, MariaDB 10.5+
+        self.insert_statement: PreparedQuery = PreparedQuery(
+            self.insert_sql + row + " RETURNING id"
+        )
+        self.insert_with_id_statement: PreparedQuery = PreparedQuery(
+            self.insert_with_id_sql + row_with_id
+        )
+        self.update_statement: PreparedQuery = PreparedQuery(
+            f"UPDATE {table} SET "  # nosec B608
+            f"{', '.join(f'{c} = %s' for c in self.columns)} WHERE id = %s"
+        )
+        # Deleted rows are returned in the same round trip, MariaDB 10.0.5+
+        self.delete_statement: PreparedQuery = PreparedQuery(
+            f"DELETE FROM {table} WHERE id = %s RETURNING id, {columns_sql}"  # nosec B608
+        )
+        self.tombstone_statement: Optional[PreparedQuery] = None
+        if tombstones_table:
+            # Recorded for existing rows only, ahead of deleting them in the same transaction
+            self.tombstone_statement = PreparedQuery(
+                f"REPLACE INTO {tombstones_table} (id) "  # nosec B608
+                f"SELECT id FROM {table} WHERE id = %s"
+            )
+
+    @staticmethod
+    def _filters_dependency(filters: Sequence[Filter]) -> Callable[..., dict[str, Any]]:
+        """
+        Build a FastAPI dependency collecting filter query parameters into a dict.
+        """
+
+        async def dependency(**kwargs) -> dict[str, Any]:
+            return kwargs
+
+        dependency.__signature__ = inspect.Signature(  # type: ignore[attr-defined]
+            [p for f in filters for p in f.parameters()]
+        )
+        return dependency
+
+    def where(self, filters: dict[str, Any]) -> tuple[tuple[str, ...], dict[str, Any]]:
+        """
+        Resolve active filters.
+        :param filters: Filter values by name, None for inactive filters.
+        :return: Names of active filters and query arguments.
+        """
+        SQLQueryUtil.validate_filters(filters)
+        with trace_span("sql.render_filters"):
+            names, args = [], {}
+            for name, value in filters.items():
+                if value is not None:
+                    names.append(name)
+                    args[name] = self.clauses[name][1](value)
+            return tuple(names), args
+
+    def _where_sql(self, names: tuple[str, ...]) -> str:
+        """
+        WHERE clause of active filters.
+        """
+        if not names:
+            return ""
+        return " WHERE " + " AND ".join(self.clauses[n][0] for n in names)
+
+    def filter_query(
+        self, query: str, filters: dict[str, Any]
+    ) -> tuple[str, dict[str, Any]]:
+        """
+        Apply filters to a query of the table without pagination, e.g. to use it as a subquery.
+        :param query: SQL query without a WHERE clause.
+        :param filters: Filter values by name.
+        :return: Filtered SQL query and its arguments.
+        """
+        names, args = self.where(filters)
+        return query + self._where_sql(names), args
+
+    def _list_query(self, names: tuple[str, ...], order: Optional[str], sharded: bool):
+        """
+        Page and count statements of a filter combination, generated on first use.
+        """
+        key = (names, order, sharded)
+        queries = self._list_queries.get(key)
+        if queries is None:
+            where = self._where_sql(names)
+            order_sql = ""
+            if order:
+                column = order.lstrip("-")
+                direction = " DESC" if order.startswith("-") else ""
+                order_sql = f" ORDER BY {column}{direction}"
+                if column != "id":
+                    order_sql += f", id{direction}"
+            elif sharded:
+                order_sql = " ORDER BY id"
+            limit = (
+                " LIMIT %(limit)s" if sharded else " LIMIT %(limit)s OFFSET %(offset)s"
+            )
+            queries = (
+                self.select_sql + where + order_sql + limit,
+                f"SELECT COUNT(*) AS count FROM {self.table}{where}",  # nosec B608
+            )
+            self._list_queries[key] = queries
+        return queries
+
+    def estimate(
+        self,
+        names: tuple[str, ...],
+        args: dict[str, Any],
+        order: Optional[str],
+        rows: int,
+        table_rows: int,
+    ) -> tuple[int, int]:
+        """
+        Estimate rows examined per shard by the statements of a list from its filter shape.
+        Lookups and ranges of indexed columns read candidate rows only, other filters scan them.
+        A page statement stops once it found its rows unless it sorts by a column without index,
+        a count examines all candidates.
+        :param names: Names of active filters.
+        :param args: Query arguments.
+        :param order: Sortable column, prefixed with `-` for descending order.
+        :param rows: Rows the page statement returns, including those skipped by its offset.
+        :param table_rows: Estimated rows of the table per shard.
+        :return: Page and count costs.
+        """
+        candidates, matched = table_rows, 1.0
+        for name in names:
+            column, operator = self.operators[name]
+            if column in self.indexed and operator == "eq":
+                candidates = min(candidates, 1)
+            elif column in self.indexed and operator == "in":
+                candidates = min(candidates, len(args[name]))
+            elif column in self.indexed and operator != "like":
+                candidates = min(
+                    candidates, ceil(table_rows * FILTER_SELECTIVITY[operator])
+                )
+            elif operator == "in":
+                matched *= min(FILTER_SELECTIVITY[operator] * len(args[name]), 1.0)
+            else:
+                matched *= FILTER_SELECTIVITY[operator]
+        if order and order.lstrip("-") not in self.indexed:
+            return candidates, candidates
+        return min(candidates, ceil(rows / matched)), candidates
+
+    def govern_aggregate(
+        self, request: Request, filters: dict[str, Any]
+    ) -> Optional[QueryGovernor]:
+        """
+        Admit an aggregate over all filtered rows, e.g. facets, by the governor if enabled.
+        Aggregates the governor estimates too expensive are rejected with a 422.
+        :param request: FastAPI request.
+        :param filters: Filter values by name.
+        :return: Governor whose `count` time budget the aggregate statements run with.
+        """
+        governor = request.app.extra.get(self.governor) if self.governor else None
+        if not governor:
+            return None
+        table_rows = governor.table_rows.get(self.table)
+        if table_rows is not None:
+            names, args = self.where(filters)
+            _, cost = self.estimate(names, args, None, 0, table_rows)
+            if governor.decide_aggregate(cost) == "rejected":
+                raise HTTPException(status_code=422, detail=self.too_expensive)
+        return governor
+
+    async def select_page(
+        self,
+        shards: ShardedStorage,
+        filters: dict[str, Any],
+        page: int = 1,
+        items_per_page: int = 100,
+        order: Optional[str] = None,
+        governor: Optional[QueryGovernor] = None,
+    ) -> tuple[list[AttrDict], int, bool]:
+        """
+        Select a page of filtered rows from all shards.
+        A single shard is queried for the page only, unordered unless `order` is given.
+        Shards are queried concurrently for their first `page * items_per_page` rows,
+        which are k-way merged, so deep pages get more expensive.
+        A row past the page is fetched, so that the number of pages is still known to grow
+        when the exact count is skipped by the `governor` or exceeds its time budget.
+        Lists the governor estimates too expensive, or whose page exceeds its time budget,
+        are rejected with a 422.
+        :param shards: Request shards.
+        :param filters: Filter values by name.
+        :param page: Current page number.
+        :param items_per_page: Number of items per page.
+        :param order: Sortable column, prefixed with `-` for descending order.
+        :param governor: Query governor.
+        :return: Rows of the page, the number of available pages and whether it is exact,
+            otherwise it is a lower bound.
+        """
+        names, args = self.where(filters)
+        sharded = len(shards) > 1
+        page_sql, count_sql = self._list_query(names, order, sharded)
+        offset = (page - 1) * items_per_page
+        count = True
+        if governor:
+            table_rows = governor.table_rows.get(self.table)
+            if table_rows is not None:
+                decision = governor.decide(
+                    *self.estimate(
+                        names, args, order, page * items_per_page + 1, table_rows
+                    )
+                )
+                if decision == "rejected":
+                    raise HTTPException(status_code=422, detail=self.too_expensive)
+                count = decision == "admitted"
+            page_sql = governor.limit(page_sql, "page")
+            count_sql = governor.limit(count_sql, "count")
+
+        async def select(storage: MySQLStorage) -> tuple[list[AttrDict], Optional[int]]:
+            try:
+                rows = await storage.get(page_sql, page_args, fetch_all=True)
+            except StatementTimeoutError as e:
+                if governor:
+                    governor.record_timeout("page")
+                raise HTTPException(status_code=422, detail=self.too_expensive) from e
+            if not count:
+                return rows, None
+            try:
+                return rows, (await storage.get(count_sql, args))["count"]
+            except StatementTimeoutError:
+                if governor:
+                    governor.record_timeout("count")
+                return rows, None
+
+        if not sharded:
+            page_args = {**args, "limit": items_per_page + 1, "offset": offset}
+            results = [await select(await shards.shard(0))]
+            rows = results[0][0]
+        else:
+            page_args = {**args, "limit": page * items_per_page + 1}
+            results = await shards.scatter(select)
+            column = (order or "id").lstrip("-")
+            rows = list(
+                islice(
+                    heapq.merge(
+                        *(rows for rows, _ in results),
+                        key=(
+                            itemgetter(column, "id")
+                            if column != "id"
+                            else itemgetter("id")
+                        ),
+                        reverse=bool(order and order.startswith("-")),
+                    ),
+                    offset,
+                    offset + items_per_page + 1,
+                )
+            )
+
+        if any(total is None for _, total in results):
+            return rows[:items_per_page], page + (len(rows) > items_per_page), False
+        total = sum(total for _, total in results)
+        return rows[:items_per_page], max(ceil(total / items_per_page), 1), True
+
+    def values(self, request: Request, data: BaseModel) -> tuple[Any, ...]:
+        """
+        Column values of a payload in statement order.
+        """
+        values = data.model_dump()
+        if self.encode:
+            values = self.encode(request, values)
+        return tuple(values[c] for c in self.columns)
+
+    async def create_many(
+        self, request: Request, shards: ShardedStorage, items: Sequence[BaseModel]
+    ) -> list[int]:
+        """
+        Insert rows with a multi-row statement per shard.
+        A single shard assigns AUTO_INCREMENT IDs, which the statement returns.
+        :param request: FastAPI request.
+        :param shards: Request shards.
+        :param items: Payloads.
+        :return: IDs of the inserted rows.
+        """
+        rows = [self.values(request, item) for item in items]
+        if len(shards) == 1:
+            query = (
+                self.insert_statement
+                if len(rows) == 1
+                else self.insert_sql
+                + ", ".join([self.row_sql] * len(rows))
+                + " RETURNING id"
+            )
+            inserted = await (await shards.shard(0)).apply_many(
+                [(query, tuple(v for row in rows for v in row))], fetch_all=True
+            )
+            return [row.id for row in inserted]
+
+        # AUTO_INCREMENT values are only unique within a shard
+        ids = [await shards.allocate_id(self.table) for _ in rows]
+        batches: dict[int, list[tuple[Any, ...]]] = {}
+        for item_id, row in zip(ids, rows):
+            batches.setdefault(shard_index(item_id, len(shards)), []).append(
+                (item_id, *row)
+            )
+
+        async def insert(index: int, batch: list[tuple[Any, ...]]):
+            query = (
+                self.insert_with_id_statement
+                if len(batch) == 1
+                else self.insert_with_id_sql
+                + ", ".join([self.row_with_id_sql] * len(batch))
+            )
+            await (await shards.shard(index)).apply(
+                query, tuple(v for r in batch for v in r)
+            )
+
+        await gather_all(*(insert(index, batch) for index, batch in batches.items()))
+        return ids
+
+    def row_cache(self, request: Request) -> Optional[SharedRowCache]:
+        """
+        Get the row cache if enabled.
+        :param request: FastAPI request.
+        :return: Row cache or None.
+        """
+        return request.app.extra.get(self.cache) if self.cache else None
+
+    def invalidate(self, request: Request, item_id: int):
+        """
+        Drop a changed row from the row cache, for routes changing rows besides the generated ones.
+        :param request: FastAPI request.
+        :param item_id: Row ID.
+        """
+        cache = self.row_cache(request)
+        if cache:
+            cache.invalidate(item_id)
+
+    async def discard_buffered(self, request: Request, item_id: int):
+        """
+        Drop buffered column updates of a row about to be written as a whole or deleted,
+        which a later flush would apply on top of it otherwise.
+        :param request: FastAPI request.
+        :param item_id: Row ID.
+        """
+        for key in self.writers:
+            writer = request.app.extra.get(key)
+            if writer:
+                await writer.discard(item_id)
+
+    async def _publish(self, request: Request, event_type: str, data: dict[str, Any]):
+        """
+        Publish a change event if enabled.
+        """
+        if self.events:
+            await request.app.extra["broker"].publish(event_type, data)
+
+    def add_routes(self, router: APIRouter):
+        """
+        Add CRUD routes to a router. Add them after custom routes with static paths,
+        which `/{id}` would shadow otherwise.
+        :param router: Router of the resource, e.g. with its prefix and tags.
+        """
+        resource, name, plural = self, self.name, self.plural
+        request_model, batch_request_model = self.request_model, self.batch_request_model
+        not_found = f"{name} not found"
+        id_path = Path(alias="id", title=f"{name} ID", gt=0)
+        sort = Literal[tuple(v for c in self.sortable for v in (c, f"-{c}"))]  # type: ignore
+        error_404 = {"model": generic_models.Error404Response, "description": "Not Found"}
+
+        @router.get(
+            "",
+            name=f"List {plural}",
+            description=f"List all {plural.lower()}",
+            responses={
+                200: {"model": self.list_response_model, "description": "Success"}
+            },
+        )
+        async def _(
+            request: Request,
+            shards: ShardedStorage = Depends(generic_deps.get_shards),
+            filters: dict = Depends(self.filters),
+            page: int = Query(default=1, title="Page number", gt=0),
+            items_per_page: int = Query(
+                default=100, title="Number of items per page", gt=0, le=1000
+            ),
+            order: Optional[sort] = Query(  # type: ignore[valid-type]
+                default=None,
+                alias="sort",
+                title="Column to sort by, prefixed with `-` for descending order",
+            ),
+        ):
+            catalog = (
+                request.app.extra.get(resource.catalog) if resource.catalog else None
+            )
+            if catalog and order in (None, "id") and catalog.supports(filters):
+                SQLQueryUtil.validate_filters(filters)
+                items, total_pages = catalog.query(filters, page, items_per_page)
+                await catalog.load_lazy(items, await shards.shard(0))
+                exact = True
+            else:
+                items, total_pages, exact = await resource.select_page(
+                    shards,
+                    filters,
+                    page,
+                    items_per_page,
+                    order,
+                    (
+                        request.app.extra.get(resource.governor)
+                        if resource.governor
+                        else None
+                    ),
+                )
+            return resource.list_response_model(
+                items=[resource.model(**i) for i in items],
+                page=page,
+                items_per_page=items_per_page,
+                total_pages=total_pages,
+                total_pages_exact=exact,
+            )
+
+        @router.get(
+            "/{id}",
+            name=f"Get {name}",
+            description=f"Get a single {name.lower()}",
+            responses={
+                200: {"model": self.response_model, "description": "Success"},
+                404: error_404,
+            },
+        )
+        async def _(
+            request: Request,
+            item_id: int = id_path,
+            shards: ShardedStorage = Depends(generic_deps.get_shards),
+        ):
+            cache, version = resource.row_cache(request), 0
+            if cache:
+                row = cache.get(item_id)
+                if row is not None:  # Served without a connection
+                    return resource.response_model(item=resource.model(**row))
+                version = cache.version(item_id)
+
+            storage = await shards.for_id(item_id)
+            row = await storage.get(resource.select_statement, item_id)
+            if not row:
+                raise HTTPException(status_code=404, detail=not_found)
+            item = resource.model(**row)
+            if cache:
+                cache.put(item_id, item.model_dump(mode="json"), version)
+            return resource.response_model(item=item)
+
+        @router.post(
+            "",
+            name=f"Create {name}",
+            description=f"Create a single {name.lower()}",
+            responses={201: {"model": self.response_model, "description": "Success"}},
+            status_code=201,
+        )
+        async def _(
+            request: Request,
+            data: request_model,  # type: ignore[valid-type]
+            shards: ShardedStorage = Depends(generic_deps.get_shards),
+        ):
+            (item_id,) = await resource.create_many(request, shards, [data])
+            item = resource.model(id=item_id, **data.model_dump())
+            await resource._publish(request, "created", item.model_dump(mode="json"))
+            return resource.response_model(item=item)
+
+        @router.post(
+            "/batch",
+            name=f"Create {plural}",
+            description=f"Create several {plural.lower()} with a single statement per shard",
+            responses={
+                201: {"model": self.batch_response_model, "description": "Success"}
+            },
+            status_code=201,
+        )
+        async def _(
+            request: Request,
+            data: batch_request_model = Body(),  # type: ignore[valid-type]
+            shards: ShardedStorage = Depends(generic_deps.get_shards),
+        ):
+            ids = await resource.create_many(request, shards, data.items)
+            items = [
+                resource.model(id=item_id, **item.model_dump())
+                for item_id, item in zip(ids, data.items)
+            ]
+            for item in items:
+                await resource._publish(request, "created", item.model_dump(mode="json"))
+            return resource.batch_response_model(items=items)
+
+        @router.put(
+            "/{id}",
+            name=f"Update {name}",
+            description=f"Update a single {name.lower()}",
+            responses={
+                200: {"model": self.response_model, "description": "Success"},
+                404: error_404,
+            },
+        )
+        async def _(
+            request: Request,
+            data: request_model,  # type: ignore[valid-type]
+            item_id: int = id_path,
+            shards: ShardedStorage = Depends(generic_deps.get_shards),
+        ):
+            storage = await shards.for_id(item_id)
+            await resource.discard_buffered(request, item_id)
+            # Matched rows, connections report them instead of changed ones
+            if not await storage.apply(
+                resource.update_statement, (*resource.values(request, data), item_id)
+            ):
+                raise HTTPException(status_code=404, detail=not_found)
+            resource.invalidate(request, item_id)
+            item = resource.model(id=item_id, **data.model_dump())
+            await resource._publish(request, "updated", item.model_dump(mode="json"))
+            return resource.response_model(item=item)
+
+        @router.delete(
+            "/{id}",
+            name=f"Delete {name}",
+            description=f"Delete a single {name.lower()}",
+            responses={
+                200: {"model": self.response_model, "description": "Success"},
+                404: error_404,
+            },
+        )
+        async def _(
+            request: Request,
+            item_id: int = id_path,
+            shards: ShardedStorage = Depends(generic_deps.get_shards),
+        ):
+            storage = await shards.for_id(item_id)
+            await resource.discard_buffered(request, item_id)
+            statements = [(resource.delete_statement, item_id)]
+            if resource.tombstone_statement:
+                statements.insert(0, (resource.tombstone_statement, item_id))
+            rows = await storage.apply_many(statements, fetch_all=True)
+            if not rows:
+                raise HTTPException(status_code=404, detail=not_found)
+
+            resource.invalidate(request, item_id)
+            await resource._publish(request, "deleted", {"id": item_id})
+            return resource.response_model(item=resource.model(**rows[0]))
@@ -1,22 +1,55 @@
 import asyncio
 from contextlib import asynccontextmanager
 
-import uvicorn
 import uvloop
 from fastapi import FastAPI, HTTPException
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import ORJSONResponse as JSONResponse
 from pydantic import ValidationError
 
 import routes
-from const import ENVIRONMENT, ROOT_DIR, SETTINGS, STORAGE
+from const import (
+    BROKER,
+    CATALOG,
+    DESCRIPTION_COMPRESSOR,
+    ENVIRONMENT,
+    ERROR_REPORTER,
+    PRICE_WRITER,
+    PRODUCT_CACHE,
+    PROFILER,
+    QUERY_GOVERNOR,
+    RESPONSE_CACHE,
+    ROOT_DIR,
+    SETTINGS,
+    STORAGE,
+    TRACER,
+)
 from generic import models as generic_models
-from modules import MigrationManager
+from modules import (
+    AdmissionController,
+    AdmissionControlMiddleware,
+    ContentNegotiationMiddleware,
+    DatabaseUnavailableError,
+    ErrorReportingMiddleware,
+    IdempotencyMiddleware,
+    LocalIdempotencyBackend,
+    LocalRateLimitBackend,
+    NegotiatedResponse,
+    ProfilingMiddleware,
+    QueryAccountingMiddleware,
+    RateLimitMiddleware,
+    RequestCancellationMiddleware,
+    ResponseCacheMiddleware,
+    TracingMiddleware,
+)
 from modules.error_handlers import (
+    database_unavailable_handler,
     error_500_handler,
     generic_error_handler,
+    request_validation_error_handler,
     validation_error_handler,
 )
+from routes.v1.resources.products.routes import publish_price_updates
 
 asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
 
@@ -25,19 +58,24 @@ def migrate_db():
     """
     Apply DB migrations.
     """
+    from modules import MigrationManager  # pylint: disable=C0415
+
     STORAGE.init_db()
-    manager = MigrationManager(
-        db_user=SETTINGS.db.user,
-        db_password=SETTINGS.db.password,
-        db_host=SETTINGS.db.host,
-        db_name=SETTINGS.db.name,
-        db_port=SETTINGS.db.port,
-        base_dir=ROOT_DIR,
-    )
-    manager.apply()
-    # Uncomment below for seeding
-    # manager.set_migrations_dir("seeds")
-    # manager.apply()
+    if SETTINGS.db.backend == "memory":
+        return  # Tables are created by `init_db`
+    for shard in STORAGE.shards:
+        manager = MigrationManager(
+            db_user=SETTINGS.db.user,
+            db_password=SETTINGS.db.password,
+            db_host=SETTINGS.db.host,
+            db_name=shard.database,
+            db_port=SETTINGS.db.port,
+            base_dir=ROOT_DIR,
+        )
+        manager.apply()
+        # Uncomment below for seeding
+        # manager.set_migrations_dir("seeds")
+        # manager.apply()
 
 
 @asynccontextmanager  # pragma: no cover
@@ -48,9 +86,29 @@ async def lifespan(_: FastAPI):
     """
     # Startup
     await STORAGE.acquire_pool()
+    await BROKER.start()
+    if CATALOG:
+        await CATALOG.start()
+    if PRICE_WRITER:
+        await PRICE_WRITER.start()
+    if DESCRIPTION_COMPRESSOR and SETTINGS.compression.backfill:
+        await DESCRIPTION_COMPRESSOR.start(STORAGE)
+    if QUERY_GOVERNOR:
+        await QUERY_GOVERNOR.start()
     yield  # pragma: no cover
     # Shutdown
+    if QUERY_GOVERNOR:
+        await QUERY_GOVERNOR.stop()
+    if DESCRIPTION_COMPRESSOR:
+        await DESCRIPTION_COMPRESSOR.stop()
+    if PRICE_WRITER:
+        await PRICE_WRITER.stop()
+    if CATALOG:
+        await CATALOG.stop()
+    await BROKER.stop()
     await STORAGE.close_pool()
+    if PRODUCT_CACHE:
+        PRODUCT_CACHE.close()
 
 
 app_: FastAPI = FastAPI(
@@ -60,15 +118,91 @@ app_: FastAPI = FastAPI(
     redoc_url=None if SETTINGS.disable_redoc_docs else "/redoc",
     title=SETTINGS.app.title,
     version=SETTINGS.app.version,
-    default_response_class=JSONResponse,
+    default_response_class=NegotiatedResponse,
     storage=STORAGE,
 )
 
 app_.add_exception_handler(500, error_500_handler)
 app_.add_exception_handler(HTTPException, generic_error_handler)  # noqa
 app_.add_exception_handler(ValidationError, validation_error_handler)  # noqa
+app_.add_exception_handler(
+    RequestValidationError, request_validation_error_handler  # noqa
+)
+app_.add_exception_handler(DatabaseUnavailableError, database_unavailable_handler)  # noqa
 app_.mount("/v1", routes.v1.app_, "V1")
 
+# Innermost, so that the rest of the stack sees internal errors as plain 500 responses
+app_.add_middleware(ErrorReportingMiddleware, reporter=ERROR_REPORTER)  # noqa
+if SETTINGS.idempotency.enabled:
+    # Inside the rest of the stack, so that replays are admitted, accounted and traced
+    # like any other request.
+    # Pass a shared `backend` when running multiple workers
+    app_.add_middleware(
+        IdempotencyMiddleware,  # noqa
+        paths=("/v1/products",),
+        backend=LocalIdempotencyBackend(max_entries=SETTINGS.idempotency.max_entries),
+        ttl=SETTINGS.idempotency.ttl,
+        wait_timeout=SETTINGS.idempotency.wait_timeout,
+        max_body_bytes=SETTINGS.idempotency.max_body_bytes,
+        api_keys=SETTINGS.rate_limit.api_keys,
+    )
+if SETTINGS.app.debug:
+    app_.add_middleware(QueryAccountingMiddleware)  # noqa
+if PROFILER:
+    app_.add_middleware(ProfilingMiddleware, profiler=PROFILER)  # noqa
+app_.add_middleware(ContentNegotiationMiddleware)  # noqa
+app_.add_middleware(
+    RequestCancellationMiddleware, timeout=SETTINGS.app.request_timeout  # noqa
+)
+if SETTINGS.admission.enabled:
+    app_.add_middleware(
+        AdmissionControlMiddleware,  # noqa
+        controller=AdmissionController(
+            limit=SETTINGS.admission.max_concurrency,
+            min_limit=SETTINGS.admission.min_concurrency,
+            max_limit=SETTINGS.admission.adaptive_max_concurrency,
+            max_queue=SETTINGS.admission.max_queue,
+            queue_timeout=SETTINGS.admission.queue_timeout,
+            adaptive=SETTINGS.admission.adaptive,
+            target_latency=SETTINGS.admission.target_latency,
+            pressure=lambda: app_.extra["storage"].acquire_waiters,
+        ),
+    )
+# Pass a shared backend instead when running multiple workers
+RATE_LIMITS = LocalRateLimitBackend(
+    rate=SETTINGS.rate_limit.rate,
+    burst=SETTINGS.rate_limit.burst,
+    max_clients=SETTINGS.rate_limit.max_clients,
+)
+if SETTINGS.rate_limit.enabled:
+    # Outside admission control, so that throttled clients never hold a slot
+    app_.add_middleware(
+        RateLimitMiddleware,  # noqa
+        backend=RATE_LIMITS,
+        api_keys=SETTINGS.rate_limit.api_keys,
+    )
+if PRICE_WRITER:
+
+    async def prices_flushed(product_ids: list[int]):
+        """
+        Make flushed price updates visible and announce them, buffered ones are not when accepted.
+        :param product_ids: IDs of written products.
+        """
+        RESPONSE_CACHE.invalidate()
+        if PRODUCT_CACHE:
+            for product_id in product_ids:
+                PRODUCT_CACHE.invalidate(product_id)
+        await publish_price_updates(BROKER, STORAGE, product_ids)
+
+    PRICE_WRITER.on_flush = prices_flushed
+if SETTINGS.response_cache.enabled:
+    app_.add_middleware(
+        ResponseCacheMiddleware,  # noqa
+        cache=RESPONSE_CACHE,
+        paths=("/v1/products", "/v1/products/facets"),
+    )
+if TRACER:
+    app_.add_middleware(TracingMiddleware, tracer=TRACER)  # noqa
 app_.add_middleware(
     CORSMiddleware,  # noqa
     allow_origins=["*"],
@@ -79,7 +213,7 @@ app_.add_middleware(
 
 
 @app_.get(
-    "/", response_model=generic_models.BaseResponse, name="Healthcheck", tags=['Health']
+    "/", response_model=generic_models.BaseResponse, name="Healthcheck", tags=["Health"]
 )
 async def _():
     """
@@ -89,6 +223,8 @@ async def _():
 
 
 if __name__ == "__main__":  # pragma: no cover
+    import uvicorn  # pylint: disable=C0415
+
     migrate_db()
 
     uvicorn.run(
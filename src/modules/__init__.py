@@ -1,5 +1,43 @@
 from . import error_handlers
+from .admission_control import AdmissionController, AdmissionControlMiddleware
 from .attr_dict import AttrDict
-from .migrations import MigrationManager
-from .mysql_driver import MySQLDatabase, MySQLStorage
+from .circuit_breaker import CircuitBreaker
+from .columnar_catalog import ColumnarCatalog
+from .content_negotiation import ContentNegotiationMiddleware, NegotiatedResponse
+from .error_reporting import ErrorReporter, ErrorReportingMiddleware
+from .event_broker import EventBroker, LocalEventBackend
+from .idempotency import IdempotencyMiddleware, LocalIdempotencyBackend
+from .mysql_driver import (
+    DatabaseUnavailableError,
+    MySQLDatabase,
+    MySQLStorage,
+    StatementTimeoutError,
+)
+from .prepared_statements import PreparedQuery
+from .profiling import ProfilingMiddleware, RequestProfiler
+from .query_accounting import QueryAccountingMiddleware, QueryStats
+from .query_governor import QueryGovernor
+from .rate_limiting import LocalRateLimitBackend, RateLimitMiddleware
+from .request_cancellation import RequestCancellationMiddleware
+from .response_cache import ResponseCache, ResponseCacheMiddleware
+from .sharding import IdAllocator, ShardedStorage
+from .shared_cache import SharedRowCache
 from .sql_query_util import SQLQueryUtil
+from .text_compression import TextCompressor, inflate
+from .tracing import Tracer, TracingMiddleware
+from .write_behind import WriteBehindBuffer
+
+
+def __getattr__(name: str):
+    """
+    Import rarely used members on first access, keeps yoyo out of app startup.
+    """
+    if name == "MigrationManager":
+        from .migrations import MigrationManager  # pylint: disable=C0415
+
+        return MigrationManager
+    if name == "MemoryDatabase":
+        from .memory_driver import MemoryDatabase  # pylint: disable=C0415
+
+        return MemoryDatabase
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
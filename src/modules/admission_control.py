@@ -0,0 +1,225 @@
+import asyncio
+import itertools
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+from .content_negotiation import negotiate, prerender
+
+# Request priorities, lower value is served first
+PRIORITY_HIGH = 0  # Cheap point reads
+PRIORITY_NORMAL = 1  # Writes
+PRIORITY_LOW = 2  # Lists and exports
+
+OVERLOADED_BODIES = prerender(
+    {"ok": False, "message": "Server is overloaded", "traceback": None}
+)
+
+
+class AdmissionController:
+    """
+    Caps in-flight requests, queues excess briefly by priority and sheds the rest.
+    In adaptive mode the limit follows observed latency and DB pool pressure (AIMD).
+    """
+
+    def __init__(
+        self,
+        limit: int = 64,
+        min_limit: int = 4,
+        max_limit: int = 256,
+        max_queue: int = 128,
+        queue_timeout: float = 0.5,
+        adaptive: bool = False,
+        target_latency: float = 0.25,
+        window: int = 50,
+        pressure: Optional[Callable[[], int]] = None,
+    ):
+        """
+        Initialize admission controller.
+        :param limit: Static in-flight request limit, the initial limit in adaptive mode.
+        :param min_limit: Lowest limit adaptive mode may shrink to.
+        :param max_limit: Highest limit adaptive mode may grow to.
+        :param max_queue: Max number of queued requests.
+        :param queue_timeout: Seconds a request may wait for a slot before being shed.
+        :param adaptive: Whether to adapt the limit to observed latency.
+        :param target_latency: Average latency in seconds above which the limit shrinks.
+        :param window: Number of completed requests per adaptation step.
+        :param pressure: Callable returning the number of DB pool waiters.
+        """
+        self.limit: int = limit
+        self.min_limit: int = min_limit
+        self.max_limit: int = max_limit
+        self.max_queue: int = max_queue
+        self.queue_timeout: float = queue_timeout
+        self.adaptive: bool = adaptive
+        self.target_latency: float = target_latency
+        self.window: int = window
+        self.pressure: Optional[Callable[[], int]] = pressure
+        self.in_flight: int = 0
+        self.queued: int = 0
+        self.shed: int = 0
+        # Queued requests per priority in arrival order, keyed by arrival number
+        self._waiters: dict[int, OrderedDict[int, asyncio.Future]] = {}
+        self._counter = itertools.count()
+        self._latency_sum: float = 0.0
+        self._latency_count: int = 0
+
+    async def acquire(self, priority: int = PRIORITY_NORMAL) -> bool:
+        """
+        Acquire an in-flight slot.
+        :param priority: Request priority.
+        :return: True if admitted, False if the request must be shed.
+        """
+        if self.in_flight < self.limit and not self.queued:
+            self.in_flight += 1
+            return True
+
+        if self.queued >= self.max_queue and not self._evict(priority):
+            self.shed += 1
+            return False
+
+        key = next(self._counter)
+        future = asyncio.get_running_loop().create_future()
+        waiters = self._waiters.setdefault(priority, OrderedDict())
+        waiters[key] = future
+        self.queued += 1
+        try:
+            admitted = await asyncio.wait_for(future, self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiters.pop(key, None) is not None:
+                self.queued -= 1
+            elif not future.cancelled() and future.result():
+                # The slot was handed over right as the wait was interrupted
+                self.release()
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            self.shed += 1
+            return False
+
+        if not admitted:
+            self.shed += 1
+        return admitted
+
+    def release(self, latency: Optional[float] = None):
+        """
+        Release an in-flight slot and hand it to the most important waiter.
+        :param latency: Request latency in seconds, used by adaptive mode.
+        """
+        self.in_flight -= 1
+        if latency is not None and self.adaptive:
+            self._observe(latency)
+        self._wake()
+
+    def _wake(self):
+        """
+        Admit queued requests in priority order while there is capacity.
+        """
+        while self.queued and self.in_flight < self.limit:
+            waiters = next(w for _, w in sorted(self._waiters.items()) if w)
+            _, future = waiters.popitem(last=False)
+            self.queued -= 1
+            if not future.done():  # Skip waiters cancelled but not yet cleaned up
+                self.in_flight += 1
+                future.set_result(True)
+
+    def _evict(self, priority: int) -> bool:
+        """
+        Shed the newest least important queued request to make room for a more important one.
+        :param priority: Priority of the incoming request.
+        :return: True if a queue slot was freed.
+        """
+        lowest = max((p for p, w in self._waiters.items() if w), default=None)
+        if lowest is None or lowest <= priority:
+            return False
+        _, future = self._waiters[lowest].popitem(last=True)
+        self.queued -= 1
+        if not future.done():
+            future.set_result(False)
+        return True
+
+    def _observe(self, latency: float):
+        """
+        Adapt the limit: additive increase while healthy, multiplicative decrease under pressure.
+        :param latency: Request latency in seconds.
+        """
+        self._latency_sum += latency
+        self._latency_count += 1
+        if self._latency_count < self.window:
+            return
+
+        average = self._latency_sum / self._latency_count
+        self._latency_sum, self._latency_count = 0.0, 0
+        waiters = self.pressure() if self.pressure else 0
+        if average > self.target_latency or waiters > 0:
+            self.limit = max(self.min_limit, int(self.limit * 0.9))
+        else:
+            self.limit = min(self.max_limit, self.limit + 1)
+            self._wake()
+
+
+def classify_request(scope: dict) -> Optional[int]:
+    """
+    Derive request priority from the ASGI scope.
+    :param scope: ASGI scope.
+    :return: Request priority, None for requests exempt from admission control.
+    """
+    path = scope["path"].rstrip("/")
+    if path in ("", "/v1"):  # Health checks
+        return None
+    if path.endswith("/stream"):  # Long-lived event streams, hold no pool connection
+        return None
+    if scope["method"] != "GET":
+        return PRIORITY_NORMAL
+    if path.rsplit("/", 1)[-1].isdigit():
+        return PRIORITY_HIGH
+    return PRIORITY_LOW
+
+
+class AdmissionControlMiddleware:
+    """
+    ASGI middleware applying `AdmissionController` to HTTP requests.
+    """
+
+    def __init__(
+        self,
+        app,
+        controller: AdmissionController,
+        classify: Callable[[dict], Optional[int]] = classify_request,
+        retry_after: int = 1,
+    ):
+        self.app = app
+        self.controller: AdmissionController = controller
+        self.classify: Callable[[dict], Optional[int]] = classify
+        self.retry_after: bytes = str(retry_after).encode()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        priority = self.classify(scope)
+        if priority is None:
+            return await self.app(scope, receive, send)
+
+        if not await self.controller.acquire(priority):
+            media_type = negotiate(scope)
+            body = OVERLOADED_BODIES[media_type]
+            await send(
+                {
+                    "type": "http.response.start",
+                    "status": 503,
+                    "headers": [
+                        (b"content-type", media_type.encode()),
+                        (b"content-length", str(len(body)).encode()),
+                        (b"retry-after", self.retry_after),
+                        (b"vary", b"Accept"),
+                    ],
+                }
+            )
+            await send({"type": "http.response.body", "body": body})
+            return None
+
+        started = time.perf_counter()
+        try:
+            return await self.app(scope, receive, send)
+        finally:
+            self.controller.release(time.perf_counter() - started)
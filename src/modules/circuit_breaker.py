@@ -0,0 +1,84 @@
+import time
+from math import ceil
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    `closed` - requests pass through, failures are counted.
+    `open` - requests are rejected until `reset_timeout` elapses.
+    `half_open` - a single probe request is let through, its outcome closes or re-opens the breaker.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 10.0):
+        """
+        Initialize circuit breaker.
+        :param failure_threshold: Number of consecutive failures that trips the breaker.
+        :param reset_timeout: Seconds to stay open before letting a probe through.
+        """
+        self.failure_threshold: int = failure_threshold
+        self.reset_timeout: float = reset_timeout
+        self.failures: int = 0
+        self.opened_at: float | None = None
+        self._probing: bool = False
+
+    @property
+    def state(self) -> str:
+        """
+        Current breaker state.
+        """
+        if self.opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    @property
+    def retry_after(self) -> int:
+        """
+        Seconds a rejected client should wait before retrying.
+        """
+        if self.opened_at is None:
+            return 0
+        return max(ceil(self.reset_timeout - (time.monotonic() - self.opened_at)), 1)
+
+    def allow_request(self) -> bool:
+        """
+        Check whether a request may reach the database.
+        :return: True if the request may proceed, False if it must fail fast.
+        """
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def record_success(self):
+        """
+        Register a successful database call, closing the breaker.
+        """
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    def record_failure(self):
+        """
+        Register a failed database call, opening the breaker once the threshold is reached.
+        """
+        self.failures += 1
+        if self._probing or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+        self._probing = False
+
+    def release_probe(self):
+        """
+        Give up a probe that never reached the database, letting the next request probe instead.
+        """
+        self._probing = False
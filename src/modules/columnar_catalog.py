@@ -0,0 +1,311 @@
+import asyncio
+import sys
+from collections import OrderedDict
+from contextlib import suppress
+from datetime import datetime, timedelta
+from math import ceil
+from typing import Any, Optional
+
+from .attr_dict import AttrDict
+from .mysql_driver import MySQLDatabase, MySQLStorage, acquire_storage
+
+# Same filter vocabulary as `SQLQueryUtil`
+_OPERATORS = ("in", "like", "lt", "gt", "le", "ge")
+
+
+class ColumnarCatalog:
+    """
+    In-process columnar snapshot of a table for serving filtered listings without the database.
+    Filterable columns are kept in NumPy arrays sorted by `id`, lazy columns (large texts)
+    are fetched by ID on demand and kept in a bounded LRU cache.
+    The snapshot is refreshed incrementally from `updated_at` and the tombstones table.
+    Only filters on numeric columns are served, text comparisons of `utf8mb4_unicode_ci`
+    (accents, trailing spaces) are left to SQL.
+    Requires `numpy`, installed with the Pipfile packages.
+    """
+
+    def __init__(
+        self,
+        database: MySQLDatabase,
+        table: str = "products",
+        tombstones_table: str = "product_tombstones",
+        numeric_columns: tuple[str, ...] = ("id", "price"),
+        text_columns: tuple[str, ...] = ("name", "image_url"),
+        lazy_columns: tuple[str, ...] = ("description",),
+        refresh_interval: float = 1.0,
+        refresh_overlap: float = 5.0,
+        lazy_cache_size: int = 10_000,
+    ):
+        """
+        Initialize catalog.
+        :param database: Database to load the snapshot from.
+        :param table: Table name, must have `id` and `updated_at` columns.
+        :param tombstones_table: Table with `id` and `deleted_at` of deleted rows.
+        :param numeric_columns: Columns stored as numeric arrays, must include `id`.
+        :param text_columns: Columns stored as interned string arrays, returned but not filtered.
+        :param lazy_columns: Columns fetched from the database on demand.
+        :param refresh_interval: Seconds between incremental refreshes.
+        :param refresh_overlap: Seconds of changes re-read on every refresh,
+            covers transactions that committed after a later `updated_at` was seen.
+        :param lazy_cache_size: Max number of rows kept in the lazy column cache.
+        """
+        import numpy  # pylint: disable=C0415
+
+        self._np = numpy
+        self.database: MySQLDatabase = database
+        self.table: str = table
+        self.tombstones_table: str = tombstones_table
+        self.numeric_columns: tuple[str, ...] = numeric_columns
+        self.text_columns: tuple[str, ...] = text_columns
+        self.lazy_columns: tuple[str, ...] = lazy_columns
+        self.refresh_interval: float = refresh_interval
+        self.refresh_overlap: float = refresh_overlap
+        self.lazy_cache_size: int = lazy_cache_size
+
+        self.columns: dict[str, Any] = {}
+        self.lazy_cache: OrderedDict[int, dict[str, Any]] = OrderedDict()
+        self.updated_at: Optional[datetime] = None
+        self.deleted_at: Optional[datetime] = None
+        self.ready: bool = False
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def size(self) -> int:
+        """
+        Number of rows in the snapshot.
+        """
+        return len(self.columns["id"]) if self.columns else 0
+
+    def _split(self, filter_name: str) -> tuple[str, str]:
+        """
+        Split filter name into column and operator.
+        :param filter_name: Filter name, e.g. `price_lt`.
+        :return: Column name and operator, `eq` for plain equality.
+        """
+        column, _, operator = filter_name.rpartition("_")
+        if operator in _OPERATORS and column in self.columns:
+            return column, operator
+        return filter_name, "eq"
+
+    def supports(self, filters: dict[str, Any]) -> bool:
+        """
+        Check whether filters can be evaluated on the snapshot with the same result as SQL.
+        :param filters: Query filters.
+        :return: True if the snapshot can serve the query.
+        """
+        if not self.ready:
+            return False
+        for filter_name, filter_value in filters.items():
+            if filter_value is None:
+                continue
+            column, operator = self._split(filter_name)
+            if column not in self.numeric_columns or operator == "like":
+                return False
+        return True
+
+    def _mask(self, filters: dict[str, Any]) -> Any:
+        """
+        Evaluate filters into a boolean row mask.
+        :param filters: Query filters.
+        :return: Boolean NumPy array.
+        """
+        np = self._np
+        mask = np.ones(self.size, dtype=bool)
+        for filter_name, filter_value in filters.items():
+            if filter_value is None:
+                continue
+            column, operator = self._split(filter_name)
+            data = self.columns[column]
+            if operator == "in":
+                mask &= np.isin(data, filter_value)
+            elif operator == "lt":
+                mask &= data < filter_value
+            elif operator == "gt":
+                mask &= data > filter_value
+            elif operator == "le":
+                mask &= data <= filter_value
+            elif operator == "ge":
+                mask &= data >= filter_value
+            else:
+                mask &= data == filter_value
+        return mask
+
+    def query(
+        self, filters: dict[str, Any], page: int = 1, items_per_page: int = 100
+    ) -> tuple[list[AttrDict], int]:
+        """
+        Filter and paginate the snapshot, lazy columns are not included.
+        :param filters: Query filters.
+        :param page: Current page number.
+        :param items_per_page: Number of items per page.
+        :return: Rows of the requested page and total number of pages.
+        """
+        matched = self._np.flatnonzero(self._mask(filters))
+        total_pages = max(ceil(len(matched) / items_per_page), 1)
+        selected = matched[(page - 1) * items_per_page : page * items_per_page]
+
+        values = {c: self.columns[c][selected].tolist() for c in self.columns}
+        rows = [AttrDict(zip(values, row)) for row in zip(*values.values())]
+        return rows, total_pages
+
+    async def load_lazy(self, rows: list[AttrDict], storage: MySQLStorage):
+        """
+        Fill lazy columns of rows in place, fetching cache misses in a single query.
+        :param rows: Rows returned by `query`.
+        :param storage: MySQLStorage instance.
+        """
+        if not self.lazy_columns or not rows:
+            return
+
+        missing = tuple(r.id for r in rows if r.id not in self.lazy_cache)
+        if missing:
+            fetched = await storage.get(
+                f"SELECT id, {', '.join(self.lazy_columns)} FROM {self.table} "  # nosec B608
+                f"WHERE id IN %s",
+                (missing,),
+                fetch_all=True,
+                use_attr_dict=False,
+            )
+            for row in fetched:
+                self.lazy_cache[row.pop("id")] = row
+            while len(self.lazy_cache) > self.lazy_cache_size:
+                self.lazy_cache.popitem(last=False)
+
+        for row in rows:
+            cached = self.lazy_cache.get(row.id)
+            if cached is not None:
+                self.lazy_cache.move_to_end(row.id)
+                row.update(cached)
+
+    def _arrays(self, rows: list[dict[str, Any]]) -> dict[str, Any]:
+        """
+        Convert rows into column arrays.
+        :param rows: Rows with all eager columns.
+        :return: Column name to NumPy array mapping.
+        """
+        np = self._np
+        arrays = {}
+        for column in self.numeric_columns:
+            dtype = np.int64 if column == "id" else np.float64
+            arrays[column] = np.fromiter(
+                (r[column] for r in rows), dtype=dtype, count=len(rows)
+            )
+        for column in self.text_columns:
+            arrays[column] = np.array(
+                [sys.intern(r[column]) if r[column] else r[column] for r in rows],
+                dtype=object,
+            )
+        return arrays
+
+    def _build(self, rows: list[dict[str, Any]]):
+        """
+        Replace the snapshot with rows.
+        :param rows: Rows sorted by `id`.
+        """
+        self.columns = self._arrays(rows)
+        self.lazy_cache.clear()
+        self.updated_at = max(
+            (r["updated_at"] for r in rows), default=datetime(1970, 1, 1)
+        )
+        self.deleted_at = self.updated_at
+        self.ready = True
+
+    def _apply(self, changed: list[dict[str, Any]], deleted: list[dict[str, Any]]):
+        """
+        Merge changed and deleted rows into the snapshot.
+        :param changed: Created or updated rows.
+        :param deleted: Tombstones of deleted rows.
+        """
+        np = self._np
+        if deleted:
+            self.deleted_at = max(self.deleted_at, max(r["deleted_at"] for r in deleted))
+            deleted = np.fromiter((r["id"] for r in deleted), dtype=np.int64)
+            keep = ~np.isin(self.columns["id"], deleted)
+            self.columns = {c: a[keep] for c, a in self.columns.items()}
+            for item_id in deleted.tolist():
+                self.lazy_cache.pop(item_id, None)
+
+        if not changed:
+            return
+
+        arrays = self._arrays(changed)
+        ids = self.columns["id"]
+        positions = np.searchsorted(ids, arrays["id"])
+        exists = positions < len(ids)
+        exists[exists] = ids[positions[exists]] == arrays["id"][exists]
+
+        for column, values in arrays.items():
+            self.columns[column][positions[exists]] = values[exists]
+
+        if not exists.all():
+            new = ~exists
+            self.columns = {
+                c: np.concatenate([a, arrays[c][new]]) for c, a in self.columns.items()
+            }
+            order = np.argsort(self.columns["id"], kind="stable")
+            self.columns = {c: a[order] for c, a in self.columns.items()}
+
+        for item_id in arrays["id"].tolist():
+            self.lazy_cache.pop(item_id, None)
+        self.updated_at = max(self.updated_at, max(r["updated_at"] for r in changed))
+
+    async def load(self):
+        """
+        Load the full snapshot from the database.
+        """
+        async with acquire_storage(self.database) as storage:
+            rows = await storage.get(
+                f"SELECT {', '.join(self.numeric_columns + self.text_columns)}, updated_at "  # nosec B608
+                f"FROM {self.table} ORDER BY id",
+                fetch_all=True,
+                use_attr_dict=False,
+            )
+        self._build(rows)
+
+    async def refresh(self):
+        """
+        Merge changes made since the last load or refresh into the snapshot.
+        """
+        overlap = timedelta(seconds=self.refresh_overlap)
+        async with acquire_storage(self.database) as storage:
+            changed = await storage.get(
+                f"SELECT {', '.join(self.numeric_columns + self.text_columns)}, updated_at "  # nosec B608
+                f"FROM {self.table} WHERE updated_at >= %s",
+                self.updated_at - overlap,
+                fetch_all=True,
+                use_attr_dict=False,
+            )
+            deleted = await storage.get(
+                f"SELECT id, deleted_at FROM {self.tombstones_table} "  # nosec B608
+                f"WHERE deleted_at >= %s",
+                self.deleted_at - overlap,
+                fetch_all=True,
+                use_attr_dict=False,
+            )
+        self._apply(changed, deleted)
+
+    async def _refresh_loop(self):
+        """
+        Refresh the snapshot periodically.
+        """
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            with suppress(Exception):
+                await self.refresh()
+
+    async def start(self):
+        """
+        Load the snapshot and start refreshing it in the background.
+        """
+        await self.load()
+        self._task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        """
+        Stop background refresh.
+        """
+        if self._task:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
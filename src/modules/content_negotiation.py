@@ -0,0 +1,150 @@
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Any
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import ORJSONResponse, Response
+
+from .tracing import trace_span
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover
+    msgpack = None
+
+JSON_MEDIA_TYPE = "application/json"
+# Aliases used by MessagePack clients, the one requested is echoed back
+MSGPACK_MEDIA_TYPES = (
+    "application/msgpack",
+    "application/x-msgpack",
+    "application/vnd.msgpack",
+)
+
+# Media type negotiated for the current request
+_MEDIA_TYPE: ContextVar[str] = ContextVar("media_type", default=JSON_MEDIA_TYPE)
+
+
+@lru_cache(maxsize=256)
+def negotiate_accept(accept: bytes) -> str:
+    """
+    Pick the response media type for an `Accept` header, JSON unless MessagePack is preferred.
+    :param accept: Raw `Accept` header value.
+    :return: Media type.
+    """
+    best, best_q = JSON_MEDIA_TYPE, -1.0
+    for part in accept.decode("latin-1").split(","):
+        media_type, *params = (p.strip() for p in part.split(";"))
+        media_type = media_type.lower()
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+
+        if quality <= 0 or (media_type in MSGPACK_MEDIA_TYPES and msgpack is None):
+            continue
+        if media_type in ("application/*", "*/*"):
+            media_type = JSON_MEDIA_TYPE
+        elif media_type != JSON_MEDIA_TYPE and media_type not in MSGPACK_MEDIA_TYPES:
+            continue
+        if quality > best_q:  # Ties go to the first listed type
+            best, best_q = media_type, quality
+    return best
+
+
+def negotiate(scope: dict) -> str:
+    """
+    Pick the response media type for a request.
+    :param scope: ASGI scope.
+    :return: Media type.
+    """
+    for name, value in scope["headers"]:
+        if name == b"accept":
+            return negotiate_accept(value)
+    return JSON_MEDIA_TYPE
+
+
+def render(content: Any, media_type: str) -> bytes:
+    """
+    Serialize content in the given media type.
+    :param content: JSON compatible content.
+    :param media_type: Media type returned by `negotiate`.
+    :return: Serialized content.
+    """
+    if media_type in MSGPACK_MEDIA_TYPES:
+        return msgpack.packb(content, default=jsonable_encoder)
+    return orjson.dumps(
+        content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+    )
+
+
+def prerender(content: Any) -> dict[str, bytes]:
+    """
+    Serialize static content in every supported media type ahead of time.
+    :param content: JSON compatible content.
+    :return: Media type to serialized content mapping.
+    """
+    media_types = (JSON_MEDIA_TYPE,) + (MSGPACK_MEDIA_TYPES if msgpack else ())
+    return {media_type: render(content, media_type) for media_type in media_types}
+
+
+class NegotiatedResponse(ORJSONResponse):
+    """
+    ORJSON response that is serialized as MessagePack when the client prefers it.
+    MessagePack is available when the `msgpack` package of the Pipfile is installed.
+    """
+
+    def __init__(self, content: Any = None, *args, **kwargs):
+        self.media_type = _MEDIA_TYPE.get()
+        super().__init__(content, *args, **kwargs)
+        self.headers["vary"] = "Accept"
+
+    def render(self, content: Any) -> bytes:
+        with trace_span("response.serialize"):
+            if self.media_type in MSGPACK_MEDIA_TYPES:
+                return render(content, self.media_type)
+            return super().render(content)
+
+
+class PrerenderedResponse(Response):
+    """
+    Response with a body serialized ahead of time by `prerender`, sent in the negotiated media type.
+    """
+
+    def __init__(
+        self,
+        bodies: dict[str, bytes],
+        status_code: int = 200,
+        headers: dict[str, str] | None = None,
+    ):
+        media_type = _MEDIA_TYPE.get()
+        super().__init__(bodies[media_type], status_code, headers, media_type)
+        self.headers["vary"] = "Accept"
+
+
+class ContentNegotiationMiddleware:
+    """
+    ASGI middleware negotiating the response media type from the `Accept` header
+    for `NegotiatedResponse` instances created while handling the request.
+    """
+
+    def __init__(self, app):
+        """
+        Initialize middleware.
+        :param app: ASGI app.
+        """
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        token = _MEDIA_TYPE.set(negotiate(scope))
+        try:
+            return await self.app(scope, receive, send)
+        finally:
+            _MEDIA_TYPE.reset(token)
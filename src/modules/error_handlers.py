@@ -1,38 +1,108 @@
-import traceback
+from functools import lru_cache
+from typing import Any
 
 from fastapi import HTTPException, Request
 from fastapi.encoders import jsonable_encoder
-from fastapi.responses import ORJSONResponse as JSONResponse
+from fastapi.exceptions import RequestValidationError
 from pydantic import ValidationError
 
 from generic import models as generic_models
 
+from .content_negotiation import NegotiatedResponse, PrerenderedResponse, prerender
+from .error_reporting import fingerprint, internal_error_bodies
+from .mysql_driver import DatabaseUnavailableError
 
-async def generic_error_handler(_: Request, exc: HTTPException):
+# Errors listed in 422 responses to malformed requests and length of echoed input values,
+# bounds the work spent on requests stuffed with invalid parameters
+MAX_VALIDATION_ERRORS = 10
+MAX_INPUT_LENGTH = 100
+
+
+def _http_error_content(status_code: int, detail: Any) -> dict:
     """
-    FastAPI error handler.
-    :param _: FastAPI Request.
-    :param exc: FastAPI HTTPException.
-    :return: Respective error class.
+    Build the response content of an HTTP exception.
+    :param status_code: HTTP status code.
+    :param detail: Exception detail.
+    :return: JSON compatible content.
     """
-    exc_class = getattr(generic_models, f"Error{exc.status_code}Response", None)
+    exc_class = getattr(generic_models, f"Error{status_code}Response", None)
     if exc_class:
         kwargs = {"ok": False}
-        if exc.detail:
-            kwargs["message"] = exc.detail
+        if detail:
+            kwargs["message"] = detail
     else:
         exc_class = generic_models.BaseErrorResponse
         kwargs = {
-            "message": exc.detail
+            "message": detail
             or "No description, you should report this error to developers."
         }
-    return JSONResponse(
-        jsonable_encoder(exc_class(**kwargs)),
+    return jsonable_encoder(exc_class(**kwargs))
+
+
+@lru_cache(maxsize=1024)
+def http_error_bodies(status_code: int, detail: str) -> dict[str, bytes]:
+    """
+    Serialized bodies of an HTTP exception, rendered once per status code and detail.
+    :param status_code: HTTP status code.
+    :param detail: Exception detail.
+    :return: Media type to serialized body mapping.
+    """
+    return prerender(_http_error_content(status_code, detail))
+
+
+async def generic_error_handler(_: Request, exc: HTTPException):
+    """
+    FastAPI error handler.
+    :param _: FastAPI Request.
+    :param exc: FastAPI HTTPException.
+    :return: Respective error class.
+    """
+    if isinstance(exc.detail, str):
+        return PrerenderedResponse(
+            http_error_bodies(exc.status_code, exc.detail),
+            status_code=exc.status_code,
+            headers=exc.headers,
+        )
+    return NegotiatedResponse(
+        _http_error_content(exc.status_code, exc.detail),
         status_code=exc.status_code,
         headers=exc.headers,
     )
 
 
+def _scalar(value: Any) -> Any:
+    """
+    Make a value of a validation error serializable.
+    """
+    if isinstance(value, str):
+        return value[:MAX_INPUT_LENGTH]
+    if value is None or isinstance(value, (bool, int, float, list, dict)):
+        return value
+    return str(value)[:MAX_INPUT_LENGTH]
+
+
+async def request_validation_error_handler(_: Request, exc: RequestValidationError):
+    """
+    Request validation error handler, keeps the response of FastAPI's default handler but lists
+    at most `MAX_VALIDATION_ERRORS` errors and truncates echoed inputs.
+    :param _: FastAPI Request.
+    :param exc: RequestValidationError object.
+    :return: 422 error.
+    """
+    detail = []
+    for error in exc.errors()[:MAX_VALIDATION_ERRORS]:
+        item = {
+            "type": error["type"],
+            "loc": error["loc"],
+            "msg": error["msg"],
+            "input": _scalar(error.get("input")),
+        }
+        if error.get("ctx"):
+            item["ctx"] = {k: _scalar(v) for k, v in error["ctx"].items()}
+        detail.append(item)
+    return NegotiatedResponse({"detail": detail}, status_code=422)
+
+
 async def validation_error_handler(_: Request, exc: ValidationError):
     """
     Pydantic validation error handler.
@@ -40,26 +110,32 @@ async def validation_error_handler(_: Request, exc: ValidationError):
     :param exc: ValidationError object.
     :return: 422 error class.
     """
-    return JSONResponse(
-        jsonable_encoder(
-            generic_models.Error422Response(
-                message='Validation Error', traceback=str(exc).split('\n')
-            )
-        ),
+    return NegotiatedResponse(
+        {"ok": False, "message": "Validation Error", "traceback": str(exc).split("\n")},
         status_code=422,
     )
 
 
-async def error_500_handler(_: Request, __: Exception):
+async def error_500_handler(_: Request, exc: Exception):
     """
-    Python error handler that transforms exceptions to 500.
+    Python error handler that transforms exceptions to 500. The traceback is left to
+    `ErrorReportingMiddleware`, the response carries the error fingerprint to report.
     :param _: FastAPI Request.
-    :param __: Any Exception.
+    :param exc: Any Exception.
     :return: Respective error class.
     """
-    response_body = generic_models.Error500Response(
-        message="You encountered an internal error. Report your HTTP request and value of `traceback` to developer.",
-        traceback=traceback.format_exc().strip().replace('"', "`").split("\n"),
-    )
+    return PrerenderedResponse(internal_error_bodies(fingerprint(exc)), status_code=500)
+
 
-    return JSONResponse(jsonable_encoder(response_body), status_code=500)
+async def database_unavailable_handler(_: Request, exc: DatabaseUnavailableError):
+    """
+    Database outage handler, kept cheap since it fires for every request during an outage.
+    :param _: FastAPI Request.
+    :param exc: DatabaseUnavailableError object.
+    :return: 503 error class.
+    """
+    return NegotiatedResponse(
+        {"ok": False, "message": exc.message, "traceback": None},
+        status_code=503,
+        headers={"Retry-After": str(exc.retry_after)},
+    )
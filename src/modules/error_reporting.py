@@ -0,0 +1,169 @@
+import hashlib
+import logging
+import time
+import traceback
+from collections import OrderedDict
+from contextlib import suppress
+from functools import lru_cache
+
+from .attr_dict import AttrDict
+from .content_negotiation import negotiate, prerender
+
+LOGGER = logging.getLogger("app.errors")
+
+
+def fingerprint(exc: BaseException) -> str:
+    """
+    Identify an internal error by its type and the code locations it passed through,
+    so that repeated failures of the same bug share a fingerprint whatever their message.
+    Reads frame metadata only, no source lines are loaded. The fingerprint is kept on the exception,
+    whose traceback grows while it is re-raised through the stack.
+    :param exc: Exception.
+    :return: Short hexadecimal fingerprint.
+    """
+    error_id = getattr(exc, "_fingerprint", None)
+    if error_id:
+        return error_id
+    digest = hashlib.blake2b(digest_size=6)
+    digest.update(f"{type(exc).__module__}.{type(exc).__qualname__}".encode())
+    for frame, line in traceback.walk_tb(exc.__traceback__):
+        digest.update(
+            f"|{frame.f_code.co_filename}:{frame.f_code.co_name}:{line}".encode()
+        )
+    error_id = digest.hexdigest()
+    with suppress(AttributeError):
+        exc._fingerprint = error_id  # pylint: disable=W0212
+    return error_id
+
+
+@lru_cache(maxsize=1024)
+def internal_error_bodies(error_id: str) -> dict[str, bytes]:
+    """
+    Serialized 500 response bodies of an internal error, rendered once per fingerprint.
+    :param error_id: Error fingerprint.
+    :return: Media type to serialized body mapping.
+    """
+    return prerender(
+        {
+            "ok": False,
+            "message": "You encountered an internal error. "
+            f"Report your HTTP request and error ID `{error_id}` to developers.",
+            "traceback": None,
+        }
+    )
+
+
+class ErrorReporter:
+    """
+    Deduplicating log of internal errors. Every error is counted by fingerprint, the full traceback
+    is only formatted and logged for its first occurrences and then sampled,
+    so a failure repeated by every request costs a fingerprint and a counter update.
+    """
+
+    def __init__(
+        self,
+        log_first: int = 5,
+        log_every: int = 1000,
+        max_fingerprints: int = 1000,
+        logger: logging.Logger = LOGGER,
+    ):
+        """
+        Initialize reporter.
+        :param log_first: Number of occurrences of a fingerprint logged with their traceback.
+        :param log_every: Later occurrences are logged once per this many, 0 to never log them.
+        :param max_fingerprints: Max number of tracked fingerprints, least recently seen ones are evicted.
+        :param logger: Logger receiving tracebacks.
+        """
+        self.log_first: int = log_first
+        self.log_every: int = log_every
+        self.max_fingerprints: int = max_fingerprints
+        self.logger: logging.Logger = logger
+        self.errors: OrderedDict[str, AttrDict] = OrderedDict()
+        self.reported: int = 0
+        self.logged: int = 0
+
+    def report(self, exc: BaseException) -> str:
+        """
+        Count an internal error and log it when due.
+        :param exc: Exception.
+        :return: Error fingerprint.
+        """
+        error_id = fingerprint(exc)
+        error = self.errors.get(error_id)
+        if error is None:
+            if len(self.errors) >= self.max_fingerprints:
+                self.errors.popitem(last=False)
+            error = AttrDict(
+                id=error_id,
+                type=type(exc).__qualname__,
+                message=str(exc)[:200],
+                count=0,
+                first_seen=time.time(),
+            )
+            self.errors[error_id] = error
+        else:
+            self.errors.move_to_end(error_id)
+        error.count += 1
+        error.last_seen = time.time()
+        self.reported += 1
+
+        if error.count <= self.log_first or (
+            self.log_every and error.count % self.log_every == 0
+        ):
+            self.logged += 1
+            self.logger.error(
+                "Internal error %s, occurrence %d", error_id, error.count, exc_info=exc
+            )
+        return error_id
+
+
+class ErrorReportingMiddleware:
+    """
+    ASGI middleware reporting exceptions that escape the app to an `ErrorReporter` and answering
+    them with a pre-rendered 500, instead of re-raising them for the server to log with a full traceback.
+    Exceptions of requests whose response already started are reported and swallowed.
+    """
+
+    def __init__(self, app, reporter: ErrorReporter):
+        """
+        Initialize middleware.
+        :param app: ASGI app.
+        :param reporter: Error reporter.
+        """
+        self.app = app
+        self.reporter: ErrorReporter = reporter
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        started = False
+
+        async def send_wrapper(message):
+            nonlocal started
+            if message["type"] == "http.response.start":
+                started = True
+            await send(message)
+
+        try:
+            return await self.app(scope, receive, send_wrapper)
+        except Exception as exc:  # pylint: disable=W0718
+            error_id = self.reporter.report(exc)
+            if started:
+                return None
+
+        media_type = negotiate(scope)
+        body = internal_error_bodies(error_id)[media_type]
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 500,
+                "headers": [
+                    (b"content-type", media_type.encode()),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"vary", b"Accept"),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
+        return None
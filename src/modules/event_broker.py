@@ -0,0 +1,179 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager, suppress
+from typing import Any, AsyncIterator, Optional, Protocol
+
+from .attr_dict import AttrDict
+
+# Delivered instead of events when some of them were lost, subscribers must resync
+RESET = AttrDict(id=None, type="reset", data={})
+
+
+class EventBackend(Protocol):
+    """
+    Cross-worker event transport, e.g. Redis Streams.
+    The backend assigns monotonically increasing integer IDs
+    and delivers every published event to every worker, the publishing one included.
+    """
+
+    async def publish(self, event_type: str, data: dict[str, Any]):
+        """
+        Publish event to all workers.
+        """
+
+    def listen(self) -> AsyncIterator[AttrDict]:
+        """
+        Iterate over events (`id`, `type`, `data`) published by any worker.
+        """
+
+
+class LocalEventBackend:
+    """
+    In-process stand-in for a cross-worker backend,
+    delivers events to every broker of the current process that listens to it.
+    """
+
+    def __init__(self):
+        # Starts from the current time so IDs from before a restart are detected as lost
+        self.last_id: int = time.time_ns() // 1000
+        self._listeners: set[asyncio.Queue] = set()
+
+    async def publish(self, event_type: str, data: dict[str, Any]):
+        """
+        Publish event to all listening brokers.
+        :param event_type: Event type.
+        :param data: Event payload.
+        """
+        self.last_id += 1
+        event = AttrDict(id=self.last_id, type=event_type, data=data)
+        for queue in self._listeners:
+            queue.put_nowait(event)
+
+    async def listen(self) -> AsyncIterator[AttrDict]:
+        """
+        Iterate over published events.
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+        self._listeners.add(queue)
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            self._listeners.discard(queue)
+
+
+class EventBroker:
+    """
+    In-process fan-out of events to subscribers with a bounded history for resuming.
+    Without a backend events are only delivered within the worker that published them,
+    which is enough for a single worker. With a backend, `start` must be awaited to receive events.
+    Subscribers that fall behind by more than `queue_size` events are sent `RESET` and dropped.
+    """
+
+    def __init__(
+        self,
+        backend: Optional[EventBackend] = None,
+        history_size: int = 1000,
+        queue_size: int = 256,
+    ):
+        """
+        Initialize broker.
+        :param backend: Cross-worker backend, None to dispatch events locally.
+        :param history_size: Number of recent events kept for resuming subscribers.
+        :param queue_size: Max number of undelivered events per subscriber.
+        """
+        self.backend: Optional[EventBackend] = backend
+        self.queue_size: int = queue_size
+        self.history: deque[AttrDict] = deque(maxlen=history_size)
+        # Starts from the current time so IDs from before a restart are detected as lost
+        self.last_id: int = time.time_ns() // 1000
+        self.subscribers: set[asyncio.Queue] = set()
+        self._task: Optional[asyncio.Task] = None
+
+    async def publish(self, event_type: str, data: dict[str, Any]):
+        """
+        Publish event.
+        :param event_type: Event type.
+        :param data: JSON compatible event payload.
+        """
+        if self.backend:
+            await self.backend.publish(event_type, data)
+        else:
+            self._dispatch(AttrDict(id=self.last_id + 1, type=event_type, data=data))
+
+    def _dispatch(self, event: AttrDict):
+        """
+        Record event and deliver it to subscribers.
+        :param event: Event.
+        """
+        self.last_id = event.id
+        self.history.append(event)
+        for queue in list(self.subscribers):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                self.subscribers.discard(queue)
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(RESET)
+
+    def _replay(self, last_event_id: int) -> list[AttrDict]:
+        """
+        Collect events published after the given one.
+        :param last_event_id: ID of the last event seen by the subscriber.
+        :return: Missed events, `[RESET]` if some of them are no longer in history.
+        """
+        if last_event_id == self.last_id:
+            return []
+        if (
+            last_event_id > self.last_id
+            or not self.history
+            or self.history[0].id > last_event_id + 1
+        ):
+            return [RESET]
+        return [e for e in self.history if e.id > last_event_id]
+
+    @asynccontextmanager
+    async def subscribe(
+        self, last_event_id: Optional[int] = None
+    ) -> AsyncIterator[asyncio.Queue]:
+        """
+        Subscribe to events.
+        :param last_event_id: Resume after this event, None to receive new events only.
+        :return: Queue of events, `RESET` is always the last one.
+        """
+        replayed = [] if last_event_id is None else self._replay(last_event_id)
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size + len(replayed))
+        for event in replayed:
+            queue.put_nowait(event)
+        if replayed != [RESET]:
+            self.subscribers.add(queue)
+        try:
+            yield queue
+        finally:
+            self.subscribers.discard(queue)
+
+    async def _listen(self):
+        """
+        Dispatch events received from the backend.
+        """
+        async for event in self.backend.listen():
+            self._dispatch(event)
+
+    async def start(self):
+        """
+        Start receiving events from the backend.
+        """
+        if self.backend:
+            self._task = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        """
+        Stop receiving events from the backend.
+        """
+        if self._task:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
@@ -0,0 +1,338 @@
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from functools import partial
+from typing import Callable, Collection, Optional, Protocol
+
+from .attr_dict import AttrDict
+from .content_negotiation import negotiate, prerender
+from .query_accounting import track_query_stats
+from .rate_limiting import client_identity
+
+KEY_MISMATCH_BODIES = prerender(
+    {
+        "ok": False,
+        "message": "Idempotency key was already used for a different request",
+        "traceback": None,
+    }
+)
+IN_PROGRESS_BODIES = prerender(
+    {
+        "ok": False,
+        "message": "Request with this idempotency key is still in progress",
+        "traceback": None,
+    }
+)
+INVALID_KEY_BODIES = prerender(
+    {"ok": False, "message": "Invalid idempotency key", "traceback": None}
+)
+FAILED_BODIES = prerender(
+    {
+        "ok": False,
+        "message": "Request failed after it may have taken effect, do not retry it",
+        "traceback": None,
+    }
+)
+TOO_LARGE_BODIES = prerender(
+    {
+        "ok": False,
+        "message": "Request body is too large for an idempotent request",
+        "traceback": None,
+    }
+)
+
+MAX_KEY_LENGTH = 255
+
+
+class IdempotencyBackend(Protocol):
+    """
+    Storage of completed responses by idempotency key, e.g. Redis shared by all workers.
+    """
+
+    async def get(self, key: str) -> Optional[AttrDict]:
+        """
+        Get the stored response (`fingerprint`, `status`, `headers`, `body`) of a key.
+        """
+
+    async def claim(self, key: str, ttl: float) -> bool:
+        """
+        Mark a key in progress unless it already is, e.g. `SET NX`.
+        :return: True if this worker should execute the request.
+        """
+
+    async def complete(self, key: str, response: AttrDict, ttl: float):
+        """
+        Store the response of a claimed key.
+        """
+
+    async def release(self, key: str):
+        """
+        Drop the claim of a key whose request failed, so that a retry executes it again.
+        """
+
+
+class LocalIdempotencyBackend:
+    """
+    In-process backend, keys are only deduplicated within a single worker.
+    """
+
+    def __init__(self, max_entries: int = 100_000):
+        """
+        Initialize backend.
+        :param max_entries: Max number of stored responses, least recently used ones are evicted.
+        """
+        self.max_entries: int = max_entries
+        # Key -> (expiration time, response or None while in progress)
+        self.entries: OrderedDict[str, tuple[float, Optional[AttrDict]]] = OrderedDict()
+
+    def _entry(self, key: str) -> Optional[tuple[float, Optional[AttrDict]]]:
+        """
+        Get an unexpired entry.
+        """
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return entry
+
+    async def get(self, key: str) -> Optional[AttrDict]:
+        entry = self._entry(key)
+        return entry[1] if entry else None
+
+    async def claim(self, key: str, ttl: float) -> bool:
+        if self._entry(key):
+            return False
+        self.entries[key] = (time.monotonic() + ttl, None)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return True
+
+    async def complete(self, key: str, response: AttrDict, ttl: float):
+        self.entries[key] = (time.monotonic() + ttl, response)
+
+    async def release(self, key: str):
+        self.entries.pop(key, None)
+
+
+class IdempotencyMiddleware:
+    """
+    ASGI middleware deduplicating writes that carry an `Idempotency-Key` header.
+    The status, headers and body of the first execution are stored for `ttl` seconds and replayed
+    to retries of the same client with the same key, method, path and payload without running
+    the app again, keys of different clients never collide. Concurrent duplicates wait for the
+    in-flight execution, which runs to completion even if its client goes away or times out.
+    Responses with 5xx status of requests that wrote nothing are not stored, so that retries
+    execute again. Request and response bodies are buffered, request bodies to be fingerprinted,
+    bodies above `max_body_bytes` are rejected with 413.
+    """
+
+    METHODS = ("POST", "PUT", "PATCH", "DELETE")
+
+    def __init__(
+        self,
+        app,
+        paths: tuple[str, ...],
+        backend: Optional[IdempotencyBackend] = None,
+        ttl: float = 86400.0,
+        wait_timeout: float = 10.0,
+        poll_interval: float = 0.05,
+        max_body_bytes: int = 8 << 20,
+        identify: Optional[Callable[[dict], str]] = None,
+        api_keys: Collection[str] = (),
+    ):
+        """
+        Initialize middleware.
+        :param app: ASGI app.
+        :param paths: Path prefixes of deduplicated writes.
+        :param backend: Response storage, None for in-process storage.
+        :param ttl: Seconds responses are stored for.
+        :param wait_timeout: Seconds duplicates wait for an in-flight execution before 409.
+        :param poll_interval: Seconds between checks for executions in other workers.
+        :param max_body_bytes: Max size of a buffered request body.
+        :param identify: Callable returning the client key of a request,
+            `client_identity` with `api_keys` by default.
+        :param api_keys: API keys identifying clients, other keys are ignored.
+        """
+        self.app = app
+        self.paths: tuple[str, ...] = paths
+        self.backend: IdempotencyBackend = backend or LocalIdempotencyBackend()
+        self.ttl: float = ttl
+        self.wait_timeout: float = wait_timeout
+        self.poll_interval: float = poll_interval
+        self.max_body_bytes: int = max_body_bytes
+        self.identify: Callable[[dict], str] = identify or partial(
+            client_identity, api_keys=frozenset(api_keys)
+        )
+        self._in_flight: dict[str, asyncio.Task] = {}
+
+    @staticmethod
+    async def _reply(send, status: int, headers: list, body: bytes):
+        """
+        Send a complete response.
+        """
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+
+    async def _reject(self, scope, send, status: int, bodies: dict[str, bytes]):
+        """
+        Send an error response in the negotiated media type.
+        """
+        media_type = negotiate(scope)
+        body = bodies[media_type]
+        await self._reply(
+            send,
+            status,
+            [
+                (b"content-type", media_type.encode()),
+                (b"content-length", str(len(body)).encode()),
+                (b"vary", b"Accept"),
+            ],
+            body,
+        )
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or scope["method"] not in self.METHODS
+            or not scope["path"].startswith(self.paths)
+        ):
+            return await self.app(scope, receive, send)
+
+        idempotency_key = content_length = None
+        for name, value in scope["headers"]:
+            if name == b"idempotency-key":
+                idempotency_key = value
+            elif name == b"content-length":
+                content_length = value
+        if idempotency_key is None:
+            return await self.app(scope, receive, send)
+        if not idempotency_key or len(idempotency_key) > MAX_KEY_LENGTH:
+            return await self._reject(scope, send, 400, INVALID_KEY_BODIES)
+        if content_length and content_length.isdigit():
+            if int(content_length) > self.max_body_bytes:
+                return await self._reject(scope, send, 413, TOO_LARGE_BODIES)
+
+        chunks, size = [], 0
+        while True:
+            message = await receive()
+            if message["type"] != "http.request":
+                return None  # Client went away before sending the body
+            chunk = message.get("body", b"")
+            size += len(chunk)
+            if size > self.max_body_bytes:
+                return await self._reject(scope, send, 413, TOO_LARGE_BODIES)
+            chunks.append(chunk)
+            if not message.get("more_body"):
+                break
+        body = b"".join(chunks)
+        fingerprint = hashlib.sha256(
+            scope["query_string"] + b"\n" + body, usedforsecurity=False
+        ).hexdigest()
+        key = (
+            f'{self.identify(scope)} {scope["method"]} {scope["path"]} '
+            f"{idempotency_key.hex()}"
+        )
+
+        deadline = time.monotonic() + self.wait_timeout
+        while True:
+            stored = await self.backend.get(key)
+            if stored is not None:
+                if stored.fingerprint != fingerprint:
+                    return await self._reject(scope, send, 422, KEY_MISMATCH_BODIES)
+                return await self._reply(
+                    send,
+                    stored.status,
+                    stored.headers + [(b"idempotent-replayed", b"true")],
+                    stored.body,
+                )
+
+            remaining = deadline - time.monotonic()
+            in_flight = self._in_flight.get(key)
+            if in_flight is not None:
+                # Duplicate of a request running in this worker, re-check once it finishes
+                try:
+                    await asyncio.wait_for(asyncio.shield(in_flight), max(remaining, 0))
+                except asyncio.TimeoutError:
+                    return await self._reject(scope, send, 409, IN_PROGRESS_BODIES)
+                continue
+            if await self.backend.claim(key, self.ttl):
+                break
+            if remaining <= 0:  # Running in another worker for too long
+                return await self._reject(scope, send, 409, IN_PROGRESS_BODIES)
+            await asyncio.sleep(self.poll_interval)
+
+        return await self._execute(key, fingerprint, body, scope, receive, send)
+
+    async def _execute(
+        self, key: str, fingerprint: str, body: bytes, scope, receive, send
+    ):
+        """
+        Run the app for a claimed key and reply with its response.
+        The app runs in a task of its own, so that a request timeout or a client going away
+        cannot interrupt a write whose response is about to be stored.
+        """
+        task = asyncio.ensure_future(self._run(key, fingerprint, body, scope))
+        self._in_flight[key] = task
+        response = await asyncio.shield(task)
+        if isinstance(response, BaseException):
+            raise response
+        await self._reply(send, response.status, response.headers, response.body)
+
+    async def _run(self, key: str, fingerprint: str, body: bytes, scope):
+        """
+        Run the app for a claimed key, capture and store its response.
+        5xx responses are stored too once the request wrote to the database, so that a retry
+        cannot apply it twice. Otherwise the claim is dropped for the retry to execute again.
+        Never raises, exceptions of the app are returned.
+        """
+        response = AttrDict(fingerprint=fingerprint, status=500, headers=[], body=b"")
+        chunks = []
+        request_sent = False
+        stats = track_query_stats()
+        writes = stats.writes
+
+        async def replay_receive():
+            nonlocal request_sent
+            if not request_sent:
+                request_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            await asyncio.Event().wait()  # The client is never seen leaving
+
+        async def capture(message):
+            if message["type"] == "http.response.start":
+                response.status = message["status"]
+                response.headers = list(message.get("headers", []))
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+
+        completed = False
+        try:
+            await self.app(scope, replay_receive, capture)
+            response.body = b"".join(chunks)
+            if response.status < 500 or stats.writes > writes:
+                await self.backend.complete(key, response, self.ttl)
+                completed = True
+            return response
+        except asyncio.CancelledError:  # Shutting down, the claim expires with its ttl
+            completed = True
+            raise
+        except Exception as e:  # pylint: disable=W0718
+            if stats.writes > writes:
+                media_type = negotiate(scope)
+                response.status = 500
+                response.body = FAILED_BODIES[media_type]
+                response.headers = [
+                    (b"content-type", media_type.encode()),
+                    (b"content-length", str(len(response.body)).encode()),
+                ]
+                await self.backend.complete(key, response, self.ttl)
+                completed = True
+            return e
+        finally:
+            if not completed:
+                await self.backend.release(key)
+            del self._in_flight[key]
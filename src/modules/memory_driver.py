@@ -0,0 +1,523 @@
+import asyncio
+import re
+import sqlite3
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from enum import Enum
+from functools import lru_cache
+from math import floor
+from typing import Any, Optional
+
+from pymysql import err as mysql_errors
+
+from .mysql_driver import MySQLDatabase
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
+# Tables of `migrations/`, keep in sync with them
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS products (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        description TEXT NOT NULL,
+        price REAL NOT NULL,
+        image_url TEXT DEFAULT NULL,
+        updated_at TIMESTAMP NOT NULL DEFAULT (now_us(0)),
+        description_compressed BLOB DEFAULT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_products_updated_at ON products (updated_at, id);
+    -- ON UPDATE CURRENT_TIMESTAMP(6)
+    CREATE TRIGGER IF NOT EXISTS products_updated_at
+        AFTER UPDATE OF name, description, price, image_url, description_compressed ON products
+        FOR EACH ROW WHEN NEW.updated_at IS OLD.updated_at AND (
+            NEW.name IS NOT OLD.name OR NEW.description IS NOT OLD.description
+            OR NEW.price IS NOT OLD.price OR NEW.image_url IS NOT OLD.image_url
+            OR NEW.description_compressed IS NOT OLD.description_compressed
+        )
+    BEGIN
+        UPDATE products SET updated_at = now_us(0) WHERE id = NEW.id;
+    END;
+
+    CREATE TABLE IF NOT EXISTS product_tombstones (
+        id INTEGER PRIMARY KEY,
+        deleted_at TIMESTAMP NOT NULL DEFAULT (now_us(0))
+    );
+    CREATE INDEX IF NOT EXISTS idx_product_tombstones_deleted_at
+        ON product_tombstones (deleted_at, id);
+
+    CREATE TABLE IF NOT EXISTS product_imports (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        status TEXT NOT NULL DEFAULT 'pending'
+            CHECK (status IN ('pending', 'validating', 'loading', 'completed', 'failed')),
+        format TEXT NOT NULL,
+        total_rows INTEGER NOT NULL DEFAULT 0,
+        valid_rows INTEGER NOT NULL DEFAULT 0,
+        failed_rows INTEGER NOT NULL DEFAULT 0,
+        imported_rows INTEGER NOT NULL DEFAULT 0,
+        message TEXT DEFAULT NULL,
+        created_at TIMESTAMP NOT NULL DEFAULT (now_us(0)),
+        started_at TIMESTAMP DEFAULT NULL,
+        finished_at TIMESTAMP DEFAULT NULL
+    );
+    CREATE TABLE IF NOT EXISTS product_import_rows (
+        import_id INTEGER NOT NULL,
+        row_no INTEGER NOT NULL,
+        name TEXT NOT NULL,
+        description TEXT NOT NULL,
+        price REAL NOT NULL,
+        image_url TEXT DEFAULT NULL,
+        PRIMARY KEY (import_id, row_no)
+    );
+    CREATE TABLE IF NOT EXISTS product_import_errors (
+        import_id INTEGER NOT NULL,
+        row_no INTEGER NOT NULL,
+        message TEXT NOT NULL,
+        PRIMARY KEY (import_id, row_no)
+    );
+
+    CREATE TABLE IF NOT EXISTS id_sequences (
+        name TEXT PRIMARY KEY,
+        next_id INTEGER NOT NULL
+    );
+"""
+
+sqlite3.register_converter(
+    "TIMESTAMP", lambda value: datetime.strptime(value.decode(), TIMESTAMP_FORMAT)
+)
+
+
+def _literal(value: Any) -> str:
+    """
+    Render a query argument as an SQLite literal, like pymysql interpolates arguments.
+    """
+    if value is None:
+        return "NULL"
+    if isinstance(value, Enum):
+        value = value.value
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, (int, float, Decimal)):
+        return str(value)
+    if isinstance(value, (bytes, bytearray)):
+        return f"X'{value.hex()}'"
+    if isinstance(value, datetime):
+        value = value.strftime(TIMESTAMP_FORMAT)
+    elif isinstance(value, (date, time, timedelta)):
+        value = str(value)
+    if isinstance(value, (tuple, list, set, frozenset)):
+        return f"({', '.join(_literal(v) for v in value)})"
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def _top_level(text: str, pattern: str) -> list[int]:
+    """
+    Find positions of a pattern outside of parentheses.
+    """
+    depth, positions = 0, []
+    for match in re.finditer(rf"\(|\)|{pattern}", text, re.IGNORECASE):
+        if match.group() == "(":
+            depth += 1
+        elif match.group() == ")":
+            depth -= 1
+        elif depth == 0:
+            positions.append(match.start())
+    return positions
+
+
+def _rollup(query: str, column: str) -> str:
+    """
+    Emulate `GROUP BY column WITH ROLLUP` of a `SELECT` by appending the total row.
+    """
+    head = query.strip()[len("SELECT") :]
+    source_at = _top_level(head, r"\bFROM\b")[0]
+    items, source = head[:source_at], head[source_at + len("FROM") :]
+    bounds = [0] + [i + 1 for i in _top_level(items, ",")] + [len(items) + 1]
+    totals = ", ".join(
+        f"NULL AS {column}" if item.strip() == column else item.strip()
+        for item in (items[a : b - 1] for a, b in zip(bounds, bounds[1:]))
+    )
+    return (
+        f"SELECT * FROM (SELECT {items} FROM {source} GROUP BY {column} ORDER BY {column}) "
+        f"UNION ALL SELECT {totals} FROM {source} HAVING COUNT(*) > 0"
+    )
+
+
+@lru_cache(maxsize=1024)
+def translate(query: str) -> str:
+    """
+    Rewrite the MySQL dialect used by the app into SQLite, placeholders are left as is.
+    :param query: MySQL query.
+    :return: SQLite query.
+    """
+    query = re.sub(
+        r"NOW\(6\)\s*-\s*INTERVAL\s+(%\(\w+\)s|%s|\d+)\s+MICROSECOND",
+        r"now_us(-(\1))",
+        query,
+        flags=re.IGNORECASE,
+    )
+    query = re.sub(
+        r"^\s*SET\s+STATEMENT\s+max_statement_time\s*=\s*[\d.]+\s+FOR\s+",
+        "",
+        query,
+        flags=re.IGNORECASE,
+    )
+    query = re.sub(r"NOW\(6\)", "now_us(0)", query, flags=re.IGNORECASE)
+    query = re.sub(r"\bINSERT\s+IGNORE\b", "INSERT OR IGNORE", query, flags=re.IGNORECASE)
+    rollup = re.search(r"GROUP\s+BY\s+(\w+)\s+WITH\s+ROLLUP\s*$", query, re.IGNORECASE)
+    if rollup:
+        query = _rollup(query[: rollup.start()], rollup.group(1))
+    return query
+
+
+def _interpolate(query: str, args: Any) -> str:
+    """
+    Translate a query and interpolate its arguments.
+    """
+    query = translate(query)
+    if args is None:
+        return query
+    if isinstance(args, dict):
+        return query % {k: _literal(v) for k, v in args.items()}
+    return query % tuple(_literal(v) for v in args)
+
+
+def _now_us(offset: int) -> str:
+    return (datetime.now() + timedelta(microseconds=offset)).strftime(TIMESTAMP_FORMAT)
+
+
+def _interval(value: Optional[float], *edges: float) -> int:
+    if value is None:
+        return -1
+    return sum(1 for edge in edges if edge <= value)
+
+
+def _least(*values: Any) -> Any:
+    return None if None in values else min(values)
+
+
+def _greatest(*values: Any) -> Any:
+    return None if None in values else max(values)
+
+
+def _floor(value: Optional[float]) -> Optional[int]:
+    return None if value is None else floor(value)
+
+
+class MemoryCursor:
+    """
+    Dict cursor with the aiomysql interface, rows are fetched eagerly like pymysql does.
+    """
+
+    def __init__(self, connection: "MemoryConnection"):
+        self.connection: MemoryConnection = connection
+        self.rowcount: int = -1
+        self.lastrowid: Optional[int] = None
+        self.description: Optional[tuple] = None
+        self._rows: tuple[dict[str, Any], ...] = ()
+        self._position: int = 0
+
+    async def __aenter__(self) -> "MemoryCursor":
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        self._rows = ()
+
+    def _run(self, query: str, args: Any) -> int:
+        """
+        Execute a single statement.
+        :return: Number of affected or selected rows.
+        """
+        try:
+            cursor = self.connection.database.connection.execute(
+                _interpolate(query, args)
+            )
+        except sqlite3.IntegrityError as e:
+            raise mysql_errors.IntegrityError(1062, str(e)) from e
+        except sqlite3.Error as e:
+            raise mysql_errors.ProgrammingError(1064, str(e)) from e
+        self.lastrowid = cursor.lastrowid
+        if self.lastrowid and cursor.rowcount > 1:
+            # MySQL reports the ID of the first row of a multi-row insert
+            self.lastrowid -= cursor.rowcount - 1
+        self.description = cursor.description
+        if cursor.description is None:
+            self._rows = ()
+            return cursor.rowcount
+        names = [column[0] for column in cursor.description]
+        self._rows = tuple(dict(zip(names, row)) for row in cursor.fetchall())
+        return len(self._rows)
+
+    async def execute(self, query: str, args: Any = None) -> int:
+        """
+        Execute a statement within the transaction of the connection.
+        """
+        await self.connection.begin()
+        self._position = 0
+        self.rowcount = self._run(query, args)
+        return self.rowcount
+
+    async def executemany(self, query: str, args: Any) -> int:
+        """
+        Execute a statement for every item of `args` within the transaction of the connection.
+        """
+        await self.connection.begin()
+        self._position = 0
+        self.rowcount = sum(self._run(query, item) for item in args)
+        return self.rowcount
+
+    async def fetchone(self) -> Optional[dict[str, Any]]:
+        """
+        Fetch the next row, None past the last one.
+        """
+        if self._position >= len(self._rows):
+            return None
+        self._position += 1
+        return self._rows[self._position - 1]
+
+    async def fetchall(self) -> list[dict[str, Any]]:
+        """
+        Fetch the remaining rows.
+        """
+        rows = list(self._rows[self._position :])
+        self._position = len(self._rows)
+        return rows
+
+
+class MemoryConnection:
+    """
+    Pool connection with the aiomysql interface.
+    Transactions of all connections are serialized, a transaction starts with its first statement
+    and holds the database until it is committed, rolled back or the connection is released.
+    """
+
+    def __init__(self, database: "MemoryDatabase"):
+        self.database: MemoryDatabase = database
+        self.closed: bool = False
+        self._in_transaction: bool = False
+
+    def cursor(self, *_) -> MemoryCursor:
+        """
+        Open a dict cursor, the cursor class is ignored.
+        """
+        return MemoryCursor(self)
+
+    def thread_id(self) -> int:
+        """
+        Identify the connection, like the server thread ID of MySQL connections.
+        """
+        return id(self)
+
+    async def begin(self):
+        """
+        Start a transaction unless one is running.
+        """
+        if self.closed:
+            raise mysql_errors.InterfaceError(0, "Connection is closed")
+        if not self._in_transaction:
+            await self.database.transaction_lock.acquire()
+            self._in_transaction = True
+
+    def _end(self, commit: bool):
+        """
+        End the running transaction.
+        """
+        if not self._in_transaction:
+            return
+        if commit:
+            self.database.connection.commit()
+        else:
+            self.database.connection.rollback()
+        self._in_transaction = False
+        self.database.transaction_lock.release()
+
+    async def commit(self):
+        """
+        Commit the running transaction.
+        """
+        self._end(commit=True)
+
+    async def rollback(self):
+        """
+        Roll back the running transaction.
+        """
+        self._end(commit=False)
+
+    def close(self):
+        """
+        Roll back the running transaction and close the connection.
+        """
+        self._end(commit=False)
+        self.closed = True
+
+
+class _AcquireContext:
+    """
+    Result of `MemoryPool.acquire`, awaitable and usable as an async context manager.
+    """
+
+    def __init__(self, pool: "MemoryPool"):
+        self.pool: MemoryPool = pool
+        self.connection: Optional[MemoryConnection] = None
+
+    async def _acquire(self) -> MemoryConnection:
+        return MemoryConnection(self.pool.database)
+
+    def __await__(self):
+        return self._acquire().__await__()
+
+    async def __aenter__(self) -> MemoryConnection:
+        self.connection = await self._acquire()
+        return self.connection
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        self.pool.release(self.connection)
+
+
+class MemoryPool:
+    """
+    Connection pool with the aiomysql interface, connections are free and unlimited.
+    """
+
+    def __init__(self, database: "MemoryDatabase"):
+        self.database: MemoryDatabase = database
+
+    def acquire(self) -> _AcquireContext:
+        """
+        Acquire a connection, await the result or use it as an async context manager.
+        """
+        return _AcquireContext(self)
+
+    @staticmethod
+    def release(connection: MemoryConnection):
+        """
+        Release a connection, rolling back its unfinished transaction.
+        """
+        connection.close()
+
+    def close(self):
+        """
+        Nothing to close, connections are closed on release.
+        """
+
+
+class MemoryDatabase(MySQLDatabase):
+    """
+    Drop-in replacement of `MySQLDatabase` keeping the tables in an in-process SQLite database.
+    Pool connections speak the aiomysql interface, so `MySQLStorage` and everything built on it
+    runs unchanged. Queries are translated from the MySQL dialect the app uses. Data lives as long
+    as the database object and is not shared across workers, meant for tests and benchmarks
+    of the app layer without a database server.
+    """
+
+    def __init__(self, database: str = "app", shards=(), **kwargs):
+        """
+        Initialize database.
+        :param database: Database name, for reference only.
+        :param shards: Names of additional shards, each is a separate SQLite database.
+        :param kwargs: Other `MySQLDatabase` parameters, connection parameters are ignored.
+        """
+        super().__init__(database, **kwargs)
+        self.shards = [self] + [MemoryDatabase(name, **kwargs) for name in shards]
+        self.connection: sqlite3.Connection = self._connect()
+        self.transaction_lock: asyncio.Lock = asyncio.Lock()
+        self._last_insert_id: int = 0
+        self._locks: set[str] = set()
+
+    def _connect(self) -> sqlite3.Connection:
+        """
+        Open an empty SQLite database with the MySQL functions the app uses.
+        """
+        connection = sqlite3.connect(
+            ":memory:", detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False
+        )
+        connection.create_function("now_us", 1, _now_us)
+        connection.create_function("INTERVAL", -1, _interval, deterministic=True)
+        connection.create_function("LEAST", -1, _least, deterministic=True)
+        connection.create_function("GREATEST", -1, _greatest, deterministic=True)
+        connection.create_function("FLOOR", 1, _floor, deterministic=True)
+        connection.create_function("LAST_INSERT_ID", -1, self._last_insert)
+        connection.create_function("GET_LOCK", 2, self._get_lock)
+        connection.create_function("RELEASE_LOCK", 1, self._release_lock)
+        # Transactions run one at a time, so none is open while another statement runs
+        connection.execute("ATTACH DATABASE ':memory:' AS information_schema")
+        connection.execute(
+            "CREATE TABLE information_schema.innodb_trx (trx_started TIMESTAMP)"
+        )
+        return connection
+
+    def _get_lock(self, name: str, _timeout: float) -> int:
+        """
+        `GET_LOCK(name, timeout)` takes a named lock without waiting, it is not tied to
+        the connection and must be released explicitly.
+        """
+        if name in self._locks:
+            return 0
+        self._locks.add(name)
+        return 1
+
+    def _release_lock(self, name: str) -> Optional[int]:
+        """
+        `RELEASE_LOCK(name)` releases a named lock, NULL if nobody holds it.
+        """
+        if name not in self._locks:
+            return None
+        self._locks.discard(name)
+        return 1
+
+    def _last_insert(self, *value: int) -> int:
+        """
+        `LAST_INSERT_ID(expr)` remembers expr, `LAST_INSERT_ID()` returns it
+        or the last generated ID.
+        """
+        if value:
+            self._last_insert_id = value[0]
+            return value[0]
+        return (
+            self._last_insert_id
+            or self.connection.execute("SELECT last_insert_rowid()").fetchone()[0]
+        )
+
+    def init_db(self):
+        """
+        Creates the tables of the database and its shards if they don't exist.
+        """
+        for shard in self.shards[1:]:
+            shard.init_db()
+        self.connection.executescript(SCHEMA)
+
+    def teardown_db(self):
+        """
+        Drops all data of the database and its shards.
+        """
+        for shard in self.shards[1:]:
+            shard.teardown_db()
+        self.connection.close()
+        self.connection = self._connect()
+
+    async def acquire_pool(self) -> bool:
+        """
+        Creates pools of the database and its shards, creating missing tables.
+        """
+        for shard in self.shards[1:]:
+            await shard.acquire_pool()
+        if self.pool is None:
+            self.init_db()
+        if not self.transaction_lock.locked():
+            # Bound to the running loop on first contention
+            self.transaction_lock = asyncio.Lock()
+        self.pool = MemoryPool(self)
+        return True
+
+    async def kill_query(self, thread_id: int):
+        """
+        Statements run synchronously, there is never one to kill.
+        """
+
+    async def close_pool(self) -> bool:
+        """
+        Closes pools of the database and its shards, data is kept.
+        """
+        for shard in self.shards[1:]:
+            await shard.close_pool()
+        self.pool = None
+        return True
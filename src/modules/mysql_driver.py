@@ -1,13 +1,55 @@
-from contextlib import suppress
-from typing import Any, AsyncGenerator, Dict, List, Optional, Tuple, Union
+import asyncio
+from contextlib import asynccontextmanager, suppress
+from typing import (
+    Any,
+    AsyncGenerator,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
 
 import aiomysql
 import pymysql
 from aiomysql.cursors import DictCursor
 from pymysql import err as mysql_errors
+from pymysql.constants import CLIENT
 from pymysql.cursors import DictCursor as SyncDictCursor
 
 from .attr_dict import AttrDict
+from .circuit_breaker import CircuitBreaker
+from .prepared_statements import PreparedDictCursor
+from .query_accounting import current_query_stats
+from .tracing import trace_span
+
+_BACKGROUND_TASKS: set = set()  # Strong references to fire-and-forget tasks
+# Statement interrupted by `max_statement_time` (MariaDB) or `MAX_EXECUTION_TIME` (MySQL)
+STATEMENT_TIMEOUT_ERRORS = (1969, 3024)
+# Lock wait timeout and deadlock, contention on a healthy server
+LOCK_CONTENTION_ERRORS = (1205, 1213)
+
+
+class DatabaseUnavailableError(Exception):
+    """
+    Raised when the database cannot serve a request in time or the circuit breaker is open.
+    """
+
+    def __init__(self, message: str, retry_after: int = 1):
+        super().__init__(message)
+        self.message: str = message
+        self.retry_after: int = retry_after
+
+
+class StatementTimeoutError(Exception):
+    """
+    Raised when the server interrupted a statement that exceeded its time budget.
+    The database is healthy and the connection stays usable.
+    """
 
 
 class _PoolContextManager:
@@ -54,6 +96,13 @@ class MySQLDatabase:
         port: int = 3306,
         user: str = "root",
         password: Optional[str] = None,
+        query_timeout: Optional[float] = None,
+        acquire_timeout: Optional[float] = None,
+        breaker_threshold: int = 5,
+        breaker_reset_timeout: float = 10.0,
+        shards: Sequence[str] = (),
+        id_block_size: int = 100,
+        prepared_statements: bool = False,
         **kwargs,
     ):
         """
@@ -63,6 +112,15 @@ class MySQLDatabase:
         :param port: Database port.
         :param user: Database user.
         :param password: Database password.
+        :param query_timeout: Seconds a single statement may run, None to wait forever.
+        :param acquire_timeout: Seconds to wait for a free pool connection, None to wait forever.
+        :param breaker_threshold: Consecutive failures that open the circuit breaker.
+        :param breaker_reset_timeout: Seconds the breaker stays open before probing.
+        :param shards: Database names of additional shards on the same server,
+            this database is the first shard.
+        :param id_block_size: Number of IDs reserved at once for rows of sharded tables.
+        :param prepared_statements: Whether to execute `PreparedQuery` statements
+            as server-side prepared statements.
         """
 
         self.pool: Optional[aiomysql.Pool] = None
@@ -71,7 +129,32 @@ class MySQLDatabase:
         self.user: str = user
         self.password: str = password
         self.database = database
+        self.query_timeout: Optional[float] = query_timeout
+        self.acquire_timeout: Optional[float] = acquire_timeout
+        self.breaker: CircuitBreaker = CircuitBreaker(
+            failure_threshold=breaker_threshold, reset_timeout=breaker_reset_timeout
+        )
+        self.acquire_waiters: int = 0  # Requests currently waiting for a pool connection
+        self.prepared_statements: bool = prepared_statements
         self.extra = kwargs
+        self.shards: List[MySQLDatabase] = [self] + [
+            MySQLDatabase(
+                database=name,
+                host=host,
+                port=port,
+                user=user,
+                password=password,
+                query_timeout=query_timeout,
+                acquire_timeout=acquire_timeout,
+                breaker_threshold=breaker_threshold,
+                breaker_reset_timeout=breaker_reset_timeout,
+                prepared_statements=prepared_statements,
+                **kwargs,
+            )
+            for name in shards
+        ]
+        self.id_block_size: int = id_block_size
+        self.id_allocators: Dict[str, Any] = {}  # `IdAllocator` per sharded table
 
     def __del__(self):
         if self.pool:
@@ -79,8 +162,10 @@ class MySQLDatabase:
 
     def init_db(self):
         """
-        Creates the database if it doesn't exist.
+        Creates the database and its shards if they don't exist.
         """
+        for shard in self.shards[1:]:
+            shard.init_db()
         connection = pymysql.connect(
             host=self.host, user=self.user, password=self.password, port=self.port
         )
@@ -94,8 +179,10 @@ class MySQLDatabase:
 
     def teardown_db(self):
         """
-        Destroys the database if it exists.
+        Destroys the database and its shards if they exist.
         """
+        for shard in self.shards[1:]:
+            shard.teardown_db()
         connection = pymysql.connect(
             host=self.host, user=self.user, password=self.password, port=self.port
         )
@@ -106,8 +193,10 @@ class MySQLDatabase:
 
     async def acquire_pool(self) -> bool:
         """
-        Creates a new MySQL pool.
+        Creates new MySQL pools of the database and its shards.
         """
+        for shard in self.shards[1:]:
+            await shard.acquire_pool()
         if isinstance(self.pool, aiomysql.Pool):
             with suppress(Exception):
                 self.pool.close()
@@ -120,14 +209,38 @@ class MySQLDatabase:
             db=self.database,
             maxsize=30,
             pool_recycle=60,
+            # UPDATE reports matched rows, so unchanged rows are told apart from missing ones
+            client_flag=CLIENT.FOUND_ROWS,
         )
         return True
 
+    async def kill_query(self, thread_id: int):
+        """
+        Kills a running statement through a side connection.
+        :param thread_id: Server thread ID of the connection running the statement.
+        """
+        with suppress(Exception):
+            connection = await aiomysql.connect(
+                host=self.host,
+                port=self.port,
+                user=self.user,
+                password=self.password,
+                db=self.database,
+                connect_timeout=self.acquire_timeout or 5,
+            )
+            try:
+                async with connection.cursor() as cursor:
+                    await cursor.execute("KILL QUERY %s", (thread_id,))
+            finally:
+                connection.close()
+
     async def close_pool(self) -> bool:
         """
-        Closes existing MySQL pool.
+        Closes existing MySQL pools of the database and its shards.
         :return: True if the pool was successfully closed, False otherwise.
         """
+        for shard in self.shards[1:]:
+            await shard.close_pool()
         with suppress(Exception):
             self.pool.close()
             return True
@@ -137,8 +250,20 @@ class MySQLDatabase:
 class MySQLStorage:
     """Database connection wrapper class with helper methods for making queries"""
 
-    def __init__(self, connection):
+    def __init__(
+        self,
+        connection,
+        query_timeout: Optional[float] = None,
+        breaker: Optional[CircuitBreaker] = None,
+        killer: Optional[Callable[[int], Awaitable[Any]]] = None,
+        prepare: bool = False,
+    ):
         self.connection = connection
+        self.query_timeout: Optional[float] = query_timeout
+        self.breaker: Optional[CircuitBreaker] = breaker
+        self.killer: Optional[Callable[[int], Awaitable[Any]]] = killer
+        # Executes `PreparedQuery` statements over the binary protocol
+        self.cursor_class = PreparedDictCursor if prepare else DictCursor
 
     @staticmethod
     def _verify_args(args: Any) -> Tuple[Any, ...]:
@@ -151,6 +276,78 @@ class MySQLStorage:
             args = (args,)
         return args
 
+    def _abort(self):
+        """
+        Kills the interrupted statement server-side and discards the connection.
+        The protocol state is unknown after an interrupted statement,
+        closed connections are dropped by the pool on release.
+        """
+        if self.killer and not self.connection.closed:
+            task = asyncio.ensure_future(self.killer(self.connection.thread_id()))
+            _BACKGROUND_TASKS.add(task)
+            task.add_done_callback(_BACKGROUND_TASKS.discard)
+        self.connection.close()
+
+    async def _commit(self):
+        """
+        Commits the transaction of the connection.
+        A cancelled commit leaves the transaction and protocol state unknown,
+        so the connection is discarded instead of going back to the pool.
+        """
+        try:
+            await self.connection.commit()
+        except asyncio.CancelledError:
+            self.connection.close()
+            raise
+
+    async def _execute(
+        self,
+        cursor: DictCursor,
+        query: str,
+        args: Union[Tuple[Any, ...], Dict[str, Any], List[Any]],
+        many: bool = False,
+    ):
+        """
+        Executes SQL query within the configured timeout and reports the outcome to the breaker.
+        :param cursor: Cursor to execute the query with.
+        :param query: SQL query to execute.
+        :param args: Normalized query arguments, a list of them if `many` is set.
+        :param many: Whether to execute the query for every item of `args`.
+        """
+        execute = cursor.executemany if many else cursor.execute
+        try:
+            with trace_span("db.query") as span:
+                if span:
+                    # Statement shape only, arguments are never recorded
+                    span.set("statement", " ".join(query.split())[:1000])
+                await asyncio.wait_for(execute(query, args), self.query_timeout)
+        except asyncio.TimeoutError:
+            self._abort()
+            if self.breaker:
+                self.breaker.record_failure()
+            raise DatabaseUnavailableError("Database query timed out")
+        except asyncio.CancelledError:  # Client went away or the request timed out
+            self._abort()
+            raise
+        except mysql_errors.Error as e:
+            code = e.args[0] if e.args else None
+            if self.breaker:
+                if isinstance(
+                    e, (mysql_errors.OperationalError, mysql_errors.InterfaceError)
+                ) and code not in (STATEMENT_TIMEOUT_ERRORS + LOCK_CONTENTION_ERRORS):
+                    self.breaker.record_failure()
+                else:  # The server answered, which also settles a half-open probe
+                    self.breaker.record_success()
+            if code in STATEMENT_TIMEOUT_ERRORS:
+                raise StatementTimeoutError(e.args[-1]) from e
+            raise e
+
+        if self.breaker:
+            self.breaker.record_success()
+        stats = current_query_stats()
+        if stats is not None:
+            stats.record(query, cursor)
+
     async def apply(
         self, query: str, args: Union[Tuple[Any, ...], Dict[str, Any], Any] = ()
     ) -> Any:
@@ -162,10 +359,10 @@ class MySQLStorage:
         """
         args = self._verify_args(args)
         conn = self.connection
-        async with conn.cursor(DictCursor) as cursor:
+        async with conn.cursor(self.cursor_class) as cursor:
             try:
-                await cursor.execute(query, args)
-                await conn.commit()
+                await self._execute(cursor, query, args)
+                await self._commit()
             except mysql_errors.Error as e:
                 await conn.rollback()
                 raise e
@@ -176,20 +373,50 @@ class MySQLStorage:
                 return cursor.rowcount
 
     async def apply_many(
-        self, queries: List[Tuple[str, Union[Tuple[Any, ...], Dict[str, Any], Any]]]
+        self,
+        queries: List[Tuple[str, Union[Tuple[Any, ...], Dict[str, Any], Any]]],
+        fetch_all: bool = False,
     ) -> Any:
         """
-        Executes SQL query and returns the number of affected rows.
+        Executes SQL queries in a single transaction.
         :param queries: A list of SQL queries and arguments to execute.
-        :return: Number of affected rows.
+        :param fetch_all: Set True to get the rows of the last query, e.g. `... RETURNING`.
+        :return: Number of rows affected by the last query, its first inserted ID for an insert,
+            or its rows if `fetch_all` is set.
         """
         conn = self.connection
-        async with conn.cursor(DictCursor) as cursor:
+        async with conn.cursor(self.cursor_class) as cursor:
             try:
                 for query, args in queries:
                     args = self._verify_args(args)
-                    await cursor.execute(query, args)
-                await conn.commit()
+                    await self._execute(cursor, query, args)
+                await self._commit()
+            except mysql_errors.Error as e:
+                await conn.rollback()
+                raise e
+
+            if fetch_all:
+                return [AttrDict(row) for row in await cursor.fetchall()]
+            if "insert into" in queries[-1][0].lower():
+                return cursor.lastrowid
+            else:
+                return cursor.rowcount
+
+    async def apply_batch(
+        self, query: str, args_list: List[Union[Tuple[Any, ...], Dict[str, Any]]]
+    ) -> int:
+        """
+        Executes SQL query for every item of `args_list` in a single transaction.
+        `INSERT ... VALUES` queries are sent as multi-row statements.
+        :param query: SQL query to execute.
+        :param args_list: A list of arguments passed to the SQL query.
+        :return: Number of affected rows.
+        """
+        conn = self.connection
+        async with conn.cursor(self.cursor_class) as cursor:
+            try:
+                await self._execute(cursor, query, args_list, many=True)
+                await self._commit()
                 return cursor.rowcount
             except mysql_errors.Error as e:
                 await conn.rollback()
@@ -206,10 +433,10 @@ class MySQLStorage:
         """
         args = self._verify_args(args)
         conn = self.connection
-        async with conn.cursor(DictCursor) as cursor:
+        async with conn.cursor(self.cursor_class) as cursor:
             try:
-                await cursor.execute(query, args)
-                await conn.commit()
+                await self._execute(cursor, query, args)
+                await self._commit()
                 while True:
                     item = await cursor.fetchone()
                     if item:
@@ -236,10 +463,10 @@ class MySQLStorage:
         """
         args = self._verify_args(args)
         conn = self.connection
-        async with conn.cursor(DictCursor) as cursor:
+        async with conn.cursor(self.cursor_class) as cursor:
             try:
-                await cursor.execute(query, args)
-                await conn.commit()
+                await self._execute(cursor, query, args)
+                await self._commit()
 
                 if fetch_all:
                     if use_attr_dict:
@@ -264,11 +491,73 @@ class MySQLStorage:
         """
         args = self._verify_args(args)
         conn = self.connection
-        async with conn.cursor(DictCursor) as cursor:
+        async with conn.cursor(self.cursor_class) as cursor:
             try:
-                await cursor.execute(query, args)
-                await conn.commit()
+                await self._execute(cursor, query, args)
+                await self._commit()
 
                 return cursor.rowcount
             except mysql_errors.Error as e:
                 raise e
+
+
+@asynccontextmanager
+async def acquire_storage(database: MySQLDatabase) -> AsyncIterator[MySQLStorage]:
+    """
+    Acquire storage on a pool connection of a database.
+    Fails fast with `DatabaseUnavailableError` while the circuit breaker is open.
+    :param database: Database or one of its shards.
+    :return: Storage instance.
+    """
+    breaker = database.breaker
+    if not breaker.allow_request():
+        raise DatabaseUnavailableError(
+            "Database is unavailable", retry_after=breaker.retry_after
+        )
+    is_probe = breaker.state == breaker.HALF_OPEN
+
+    database.acquire_waiters += 1
+    try:
+        with trace_span("pool.acquire"):
+            connection = await asyncio.wait_for(
+                database.pool.acquire(), database.acquire_timeout
+            )
+    except asyncio.TimeoutError:
+        # The pool is busy, not the database: shed load without tripping the breaker
+        if is_probe:
+            breaker.release_probe()
+        raise DatabaseUnavailableError("Database connection pool is exhausted")
+    except mysql_errors.OperationalError as e:  # The server refused a new connection
+        breaker.record_failure()
+        raise DatabaseUnavailableError(
+            "Database is unavailable", retry_after=breaker.retry_after
+        ) from e
+    finally:
+        database.acquire_waiters -= 1
+
+    try:
+        db = MySQLStorage(
+            connection,
+            query_timeout=database.query_timeout,
+            breaker=breaker,
+            killer=database.kill_query,
+            prepare=database.prepared_statements,
+        )
+        if is_probe:
+            try:
+                await db.check("SELECT 1")
+            except BaseException as e:
+                # Cancelled probes must not leave the breaker half-open
+                breaker.record_failure()
+                if isinstance(e, mysql_errors.Error):
+                    raise DatabaseUnavailableError(
+                        "Database is unavailable", retry_after=breaker.retry_after
+                    ) from e
+                raise
+        yield db
+    except asyncio.CancelledError:
+        # Cancelled mid-statement or mid-transaction, closed connections are dropped on release
+        connection.close()
+        raise
+    finally:
+        database.pool.release(connection)
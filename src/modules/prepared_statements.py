@@ -0,0 +1,406 @@
+# pylint: disable=W0212  # aiomysql has no public API for the binary protocol
+import re
+import struct
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from enum import Enum
+from functools import lru_cache
+from typing import Any, Optional, Sequence
+from weakref import WeakKeyDictionary
+
+from aiomysql.cursors import DictCursor
+from pymysql import err as mysql_errors
+from pymysql.connections import EOFPacketWrapper, FieldDescriptorPacket, OKPacketWrapper
+from pymysql.constants import COMMAND, ER, FIELD_TYPE, FLAG
+
+# Max number of statements kept prepared per connection, least recently used ones are closed
+MAX_STATEMENTS = 64
+
+# Fixed-width binary protocol types: (signed, unsigned) struct formats
+_FIXED_FORMATS = {
+    FIELD_TYPE.TINY: ("<b", "<B"),
+    FIELD_TYPE.SHORT: ("<h", "<H"),
+    FIELD_TYPE.YEAR: ("<h", "<H"),
+    FIELD_TYPE.INT24: ("<i", "<I"),
+    FIELD_TYPE.LONG: ("<i", "<I"),
+    FIELD_TYPE.LONGLONG: ("<q", "<Q"),
+    FIELD_TYPE.FLOAT: ("<f", "<f"),
+    FIELD_TYPE.DOUBLE: ("<d", "<d"),
+}
+_DATETIME_TYPES = (FIELD_TYPE.DATETIME, FIELD_TYPE.TIMESTAMP, FIELD_TYPE.DATE)
+_DECIMAL_TYPES = (FIELD_TYPE.DECIMAL, FIELD_TYPE.NEWDECIMAL)
+_BINARY_CHARSET = 63
+
+
+class PreparedQuery(str):
+    """
+    SQL text executed as a server-side prepared statement by storages created with `prepare`,
+    and as a plain query otherwise. Meant for fixed statements run over and over,
+    arguments must be scalars.
+    """
+
+    __slots__ = ()
+
+
+class PreparedStatement:
+    """
+    Statement prepared on a connection.
+    """
+
+    __slots__ = ("statement_id", "param_count")
+
+    def __init__(self, statement_id: int, param_count: int):
+        self.statement_id: int = statement_id
+        self.param_count: int = param_count
+
+
+class _BinaryResult:
+    """
+    Result of a prepared statement with the attributes aiomysql cursors read from `MySQLResult`.
+    """
+
+    def __init__(self):
+        self.affected_rows: int = 0
+        self.insert_id: int = 0
+        self.server_status: Optional[int] = None
+        self.warning_count: int = 0
+        self.message: Optional[bytes] = None
+        self.has_next: bool = False
+        self.unbuffered_active: bool = False
+        self.fields: list[FieldDescriptorPacket] = []
+        self.description: Optional[tuple] = None
+        self.rows: Optional[tuple] = None
+
+
+class _StatementCache:
+    """
+    Statements prepared on a connection by SQL text, valid for a single server session.
+    """
+
+    def __init__(self, thread_id: int):
+        self.thread_id: int = thread_id
+        self.statements: OrderedDict[str, PreparedStatement] = OrderedDict()
+
+
+# Statement caches die with their connections, e.g. when `pool_recycle` replaces them
+_CACHES: "WeakKeyDictionary[Any, _StatementCache]" = WeakKeyDictionary()
+
+
+@lru_cache(maxsize=1024)
+def _positional(query: str) -> tuple[str, Optional[tuple[str, ...]]]:
+    """
+    Turn pyformat placeholders into `?`.
+    :return: Query and names of `%(name)s` placeholders in order, None for `%s` placeholders.
+    """
+    names = []
+
+    def replace(match: re.Match) -> str:
+        if match.group() == "%%":
+            return "%"
+        if match.group(1):
+            names.append(match.group(1))
+        return "?"
+
+    query = re.sub(r"%\((\w+)\)s|%s|%%", replace, query)
+    return query, tuple(names) if names else None
+
+
+def _lenenc(length: int) -> bytes:
+    """
+    Encode a length-encoded integer.
+    """
+    if length < 251:
+        return bytes((length,))
+    if length < 1 << 16:
+        return b"\xfc" + struct.pack("<H", length)
+    if length < 1 << 24:
+        return b"\xfd" + length.to_bytes(3, "little")
+    return b"\xfe" + struct.pack("<Q", length)
+
+
+def _encode_params(args: Sequence[Any], encoding: str) -> bytes:
+    """
+    Encode arguments of `COM_STMT_EXECUTE`: NULL bitmap, types and values.
+    """
+    null_bitmap = bytearray((len(args) + 7) // 8)
+    types, values = bytearray(), bytearray()
+    for i, value in enumerate(args):
+        if isinstance(value, Enum):
+            value = value.value
+        if value is None:
+            null_bitmap[i // 8] |= 1 << (i % 8)
+            types += bytes((FIELD_TYPE.NULL, 0))
+        elif isinstance(value, (bool, int)):
+            unsigned = value >= 1 << 63
+            types += bytes((FIELD_TYPE.LONGLONG, 0x80 if unsigned else 0))
+            values += struct.pack("<Q" if unsigned else "<q", value)
+        elif isinstance(value, float):
+            types += bytes((FIELD_TYPE.DOUBLE, 0))
+            values += struct.pack("<d", value)
+        elif isinstance(value, datetime):
+            types += bytes((FIELD_TYPE.DATETIME, 0))
+            values += b"\x0b" + struct.pack(
+                "<HBBBBBI",
+                value.year,
+                value.month,
+                value.day,
+                value.hour,
+                value.minute,
+                value.second,
+                value.microsecond,
+            )
+        elif isinstance(value, date):
+            types += bytes((FIELD_TYPE.DATE, 0))
+            values += b"\x04" + struct.pack("<HBB", value.year, value.month, value.day)
+        elif isinstance(value, timedelta):
+            negative = value < timedelta(0)
+            value = abs(value)
+            hours, seconds = divmod(value.seconds, 3600)
+            types += bytes((FIELD_TYPE.TIME, 0))
+            values += b"\x0c" + struct.pack(
+                "<BIBBBI",
+                negative,
+                value.days,
+                hours,
+                seconds // 60,
+                seconds % 60,
+                value.microseconds,
+            )
+        elif isinstance(value, (bytes, bytearray)):
+            types += bytes((FIELD_TYPE.BLOB, 0))
+            values += _lenenc(len(value)) + value
+        else:
+            raw = str(value).encode(encoding)
+            types += bytes((FIELD_TYPE.VAR_STRING, 0))
+            values += _lenenc(len(raw)) + raw
+    return bytes(null_bitmap) + b"\x01" + bytes(types) + bytes(values)
+
+
+def _read_lenenc(data: bytes, position: int) -> tuple[int, int]:
+    """
+    Decode a length-encoded integer.
+    :return: Value and the position after it.
+    """
+    first = data[position]
+    if first < 251:
+        return first, position + 1
+    if first == 252:
+        return struct.unpack_from("<H", data, position + 1)[0], position + 3
+    if first == 253:
+        return int.from_bytes(data[position + 1 : position + 4], "little"), position + 4
+    return struct.unpack_from("<Q", data, position + 1)[0], position + 9
+
+
+def _decode_row(
+    data: bytes, fields: list[FieldDescriptorPacket], encoding: str
+) -> tuple[Any, ...]:
+    """
+    Decode a binary protocol result row into the values the text protocol decoders produce.
+    """
+    bitmap_at, position = 1, 1 + (len(fields) + 9) // 8
+    row = []
+    for i, field in enumerate(fields):
+        bit = i + 2  # The first two bits of the NULL bitmap are reserved
+        if data[bitmap_at + bit // 8] & (1 << (bit % 8)):
+            row.append(None)
+            continue
+
+        type_code = field.type_code
+        formats = _FIXED_FORMATS.get(type_code)
+        if formats:
+            fmt = formats[1 if field.flags & FLAG.UNSIGNED else 0]
+            row.append(struct.unpack_from(fmt, data, position)[0])
+            position += struct.calcsize(fmt)
+        elif type_code in _DATETIME_TYPES:
+            length = data[position]
+            parts = data[position + 1 : position + 1 + length]
+            position += 1 + length
+            year, month, day = struct.unpack_from("<HBB", parts) if length else (0, 0, 0)
+            if not year:  # Zero dates decode to None like in the text protocol
+                row.append(None)
+            elif type_code == FIELD_TYPE.DATE:
+                row.append(date(year, month, day))
+            else:
+                hour, minute, second = parts[4:7] if length >= 7 else (0, 0, 0)
+                microsecond = struct.unpack_from("<I", parts, 7)[0] if length == 11 else 0
+                row.append(datetime(year, month, day, hour, minute, second, microsecond))
+        elif type_code == FIELD_TYPE.TIME:
+            length = data[position]
+            parts = data[position + 1 : position + 1 + length]
+            position += 1 + length
+            if not length:
+                row.append(timedelta(0))
+                continue
+            negative, days, hours, minutes, seconds = struct.unpack_from("<BIBBB", parts)
+            microseconds = struct.unpack_from("<I", parts, 8)[0] if length == 12 else 0
+            value = timedelta(
+                days=days,
+                hours=hours,
+                minutes=minutes,
+                seconds=seconds,
+                microseconds=microseconds,
+            )
+            row.append(-value if negative else value)
+        else:
+            length, position = _read_lenenc(data, position)
+            raw = data[position : position + length]
+            position += length
+            if type_code in _DECIMAL_TYPES:
+                row.append(Decimal(raw.decode("ascii")))
+            elif field.charsetnr == _BINARY_CHARSET and type_code != FIELD_TYPE.JSON:
+                row.append(bytes(raw))
+            else:
+                row.append(raw.decode(encoding))
+    return tuple(row)
+
+
+async def _read_fields(connection, count: int) -> list[FieldDescriptorPacket]:
+    """
+    Read column definitions followed by an EOF packet.
+    """
+    if not count:
+        return []
+    fields = [await connection._read_packet(FieldDescriptorPacket) for _ in range(count)]
+    await connection._read_packet()  # EOF
+    return fields
+
+
+async def _prepare(connection, query: str) -> PreparedStatement:
+    """
+    Prepare a statement with `COM_STMT_PREPARE`.
+    """
+    await connection._execute_command(COMMAND.COM_STMT_PREPARE, query)
+    packet = await connection._read_packet()
+    packet.read_uint8()  # OK
+    statement_id = packet.read_uint32()
+    column_count = packet.read_uint16()
+    param_count = packet.read_uint16()
+    await _read_fields(connection, param_count)
+    await _read_fields(connection, column_count)
+    return PreparedStatement(statement_id, param_count)
+
+
+async def _execute(connection, statement: PreparedStatement, args: Sequence[Any]):
+    """
+    Execute a prepared statement with `COM_STMT_EXECUTE` and read its whole result.
+    """
+    if len(args) != statement.param_count:
+        raise mysql_errors.ProgrammingError(
+            f"Statement takes {statement.param_count} arguments, {len(args)} given"
+        )
+    # No cursor, a single iteration
+    payload = struct.pack("<IBI", statement.statement_id, 0, 1)
+    if args:
+        payload += _encode_params(args, connection.encoding)
+    await connection._execute_command(COMMAND.COM_STMT_EXECUTE, payload)
+
+    result = _BinaryResult()
+    first_packet = await connection._read_packet()
+    if first_packet.is_ok_packet():
+        ok_packet = OKPacketWrapper(first_packet)
+        result.affected_rows = ok_packet.affected_rows
+        result.insert_id = ok_packet.insert_id
+        result.server_status = ok_packet.server_status
+        result.warning_count = ok_packet.warning_count
+        result.message = ok_packet.message
+        result.has_next = ok_packet.has_next
+        return result
+
+    result.fields = await _read_fields(
+        connection, first_packet.read_length_encoded_integer()
+    )
+    result.description = tuple(field.description() for field in result.fields)
+    rows = []
+    while True:
+        packet = await connection._read_packet()
+        if packet.is_eof_packet():
+            eof_packet = EOFPacketWrapper(packet)
+            result.server_status = eof_packet.server_status
+            result.warning_count = eof_packet.warning_count
+            result.has_next = eof_packet.has_next
+            break
+        rows.append(
+            _decode_row(packet.get_all_data(), result.fields, connection.encoding)
+        )
+    result.rows = tuple(rows)
+    result.affected_rows = len(rows)
+    return result
+
+
+async def _close(connection, statement: PreparedStatement):
+    """
+    Deallocate a statement with `COM_STMT_CLOSE`, the server sends no response.
+    """
+    await connection._execute_command(
+        COMMAND.COM_STMT_CLOSE, struct.pack("<I", statement.statement_id)
+    )
+
+
+async def _statement(connection, cache: _StatementCache, sql: str) -> PreparedStatement:
+    """
+    Get a cached statement or prepare it, closing the least recently used one past the limit.
+    """
+    statement = cache.statements.get(sql)
+    if statement is not None:
+        cache.statements.move_to_end(sql)
+        return statement
+    statement = cache.statements[sql] = await _prepare(connection, sql)
+    while len(cache.statements) > MAX_STATEMENTS:
+        await _close(connection, cache.statements.popitem(last=False)[1])
+    return statement
+
+
+async def execute_prepared(connection, query: str, args: Any) -> _BinaryResult:
+    """
+    Execute a query as a prepared statement, preparing it on first use on the connection.
+    Statements are prepared again when the connection reconnected to a new server session.
+    :param connection: aiomysql connection.
+    :param query: SQL query with pyformat placeholders.
+    :param args: Scalar arguments, a dict for `%(name)s` placeholders.
+    :return: Result in the shape aiomysql cursors read.
+    """
+    sql, names = _positional(query)
+    if names is not None:
+        args = [args[name] for name in names]
+
+    cache = _CACHES.get(connection)
+    if cache is None or cache.thread_id != connection.thread_id():
+        cache = _CACHES[connection] = _StatementCache(connection.thread_id())
+
+    try:
+        return await _execute(connection, await _statement(connection, cache, sql), args)
+    except mysql_errors.DatabaseError as e:
+        # Deallocated behind our back, prepare it again once
+        if e.args[0] != ER.UNKNOWN_STMT_HANDLER:
+            raise
+        del cache.statements[sql]
+    return await _execute(connection, await _statement(connection, cache, sql), args)
+
+
+class PreparedDictCursor(DictCursor):
+    """
+    Dict cursor executing `PreparedQuery` statements over the binary protocol.
+    Other queries and queries with sequence arguments, e.g. for `IN %s`, use the text protocol.
+    """
+
+    async def execute(self, query, args=None):
+        values = args.values() if isinstance(args, dict) else args
+        if (
+            not isinstance(query, PreparedQuery)
+            or args is None
+            or any(isinstance(v, (tuple, list, set, frozenset, dict)) for v in values)
+        ):
+            return await super().execute(query, args)
+
+        connection = self._get_db()
+        while await self.nextset():
+            pass
+        result = await execute_prepared(connection, query, args)
+        connection._result = result
+        connection._affected_rows = result.affected_rows
+        if result.server_status is not None:
+            connection.server_status = result.server_status
+        await self._do_get_result()
+        self._executed = query
+        return self._rowcount
@@ -0,0 +1,186 @@
+import asyncio
+import cProfile
+import os
+import secrets
+import time
+import tracemalloc
+from collections import OrderedDict
+from contextlib import suppress
+from datetime import datetime
+from typing import Optional
+
+from .attr_dict import AttrDict
+
+PROFILE_KINDS = ("pstats", "tracemalloc")
+
+
+class RequestProfiler:
+    """
+    Captures cProfile and tracemalloc snapshots of selected requests into `output_dir`.
+    A request is selected by sending the privileged `X-Profile` header with `token`
+    or by arming its path for the next N requests.
+    Both profilers are process-wide, so one request is profiled at a time
+    and the profile also contains other requests running concurrently on the event loop.
+    """
+
+    def __init__(
+        self,
+        output_dir: str,
+        token: Optional[str] = None,
+        max_profiles: int = 20,
+        traceback_frames: int = 10,
+    ):
+        """
+        Initialize profiler.
+        :param output_dir: Directory to save profiles to.
+        :param token: Value of the `X-Profile` header selecting a request, None to only profile armed paths.
+        :param max_profiles: Max number of kept profiles, older ones are removed.
+        :param traceback_frames: Number of frames tracemalloc stores per allocation.
+        """
+        self.output_dir: str = output_dir
+        self.token: Optional[bytes] = token.encode() if token else None
+        self.max_profiles: int = max_profiles
+        self.traceback_frames: int = traceback_frames
+        self.armed: dict[str, int] = {}
+        self.profiles: OrderedDict[str, AttrDict] = OrderedDict()
+        self.active: bool = False
+        os.makedirs(output_dir, exist_ok=True)
+
+    def arm(self, path: str, count: int):
+        """
+        Profile the next requests to a path.
+        :param path: Request path, e.g. `/v1/products`.
+        :param count: Number of requests to profile, 0 to disarm.
+        """
+        path = path.rstrip("/")
+        if count > 0:
+            self.armed[path] = count
+        else:
+            self.armed.pop(path, None)
+
+    def select(self, scope: dict) -> bool:
+        """
+        Check whether a request should be profiled, consuming an armed slot if so.
+        :param scope: ASGI scope.
+        :return: True to profile the request.
+        """
+        if self.active:
+            return False
+        if self.token:
+            for name, value in scope["headers"]:
+                if name == b"x-profile" and secrets.compare_digest(value, self.token):
+                    return True
+
+        path = scope["path"].rstrip("/")
+        remaining = self.armed.get(path)
+        if not remaining:
+            return False
+        if remaining > 1:
+            self.armed[path] = remaining - 1
+        else:
+            del self.armed[path]
+        return True
+
+    def path(self, profile_id: str, kind: str) -> str:
+        """
+        Get profile file path.
+        :param profile_id: Profile ID.
+        :param kind: One of `PROFILE_KINDS`.
+        :return: File path.
+        """
+        return os.path.join(self.output_dir, f"{profile_id}.{kind}")
+
+    def _save(
+        self,
+        info: AttrDict,
+        profile: cProfile.Profile,
+        snapshot: Optional[tracemalloc.Snapshot],
+    ):
+        """
+        Write profile files and summarize top allocations, runs in a worker thread.
+        """
+        profile.dump_stats(self.path(info.id, "pstats"))
+        if snapshot:
+            snapshot = snapshot.filter_traces(
+                (tracemalloc.Filter(False, tracemalloc.__file__),)
+            )
+            snapshot.dump(self.path(info.id, "tracemalloc"))
+            info.top_allocations = [str(s) for s in snapshot.statistics("lineno")[:10]]
+
+    async def capture(self, scope: dict, run) -> str:
+        """
+        Profile a request.
+        :param scope: ASGI scope.
+        :param run: Coroutine function handling the request.
+        :return: Profile ID.
+        """
+        info = AttrDict(
+            id=f"{datetime.now():%Y%m%d%H%M%S}-{secrets.token_hex(4)}",
+            method=scope["method"],
+            path=scope["path"],
+            created_at=datetime.now(),
+            duration=None,
+            top_allocations=[],
+        )
+        self.active = True
+        # Allocations are only traced if nothing else is tracing them already
+        trace_memory = not tracemalloc.is_tracing()
+        if trace_memory:
+            tracemalloc.start(self.traceback_frames)
+        profile = cProfile.Profile()
+        started = time.perf_counter()
+        profile.enable()
+        try:
+            await run(info.id)
+        finally:
+            profile.disable()
+            info.duration = time.perf_counter() - started
+            snapshot = tracemalloc.take_snapshot() if trace_memory else None
+            if trace_memory:
+                tracemalloc.stop()
+            self.active = False
+
+            await asyncio.to_thread(self._save, info, profile, snapshot)
+            self.profiles[info.id] = info
+            while len(self.profiles) > self.max_profiles:
+                old_id, _ = self.profiles.popitem(last=False)
+                for kind in PROFILE_KINDS:
+                    with suppress(OSError):
+                        os.remove(self.path(old_id, kind))
+        return info.id
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware profiling requests selected by `RequestProfiler`,
+    the profile ID is returned in the `X-Profile-Id` response header.
+    Not installed at all unless profiling is enabled, so it costs nothing by default.
+    """
+
+    def __init__(self, app, profiler: RequestProfiler):
+        """
+        Initialize middleware.
+        :param app: ASGI app.
+        :param profiler: Request profiler.
+        """
+        self.app = app
+        self.profiler: RequestProfiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.profiler.select(scope):
+            return await self.app(scope, receive, send)
+
+        async def run(profile_id: str):
+            async def send_wrapper(message):
+                if message["type"] == "http.response.start":
+                    message = {
+                        **message,
+                        "headers": list(message.get("headers", []))
+                        + [(b"x-profile-id", profile_id.encode())],
+                    }
+                await send(message)
+
+            await self.app(scope, receive, send_wrapper)
+
+        await self.profiler.capture(scope, run)
+        return None
@@ -0,0 +1,104 @@
+import re
+from contextvars import ContextVar
+from typing import Any, Optional
+
+# Statements that change no rows, optionally run with a `SET STATEMENT ... FOR` prefix
+READ_STATEMENT = re.compile(
+    r"\s*(SET\s+STATEMENT\s+.*?\s+FOR\s+)?(SELECT|WITH|SHOW|EXPLAIN)\b",
+    re.IGNORECASE | re.DOTALL,
+)
+
+
+class QueryStats:
+    """
+    Database usage of a single request.
+    """
+
+    __slots__ = ("statements", "writes", "rows", "bytes")
+
+    def __init__(self):
+        self.statements: int = 0
+        self.writes: int = 0  # Statements that may have changed rows
+        self.rows: int = 0
+        # Approximate size of sent statements and received values
+        self.bytes: int = 0
+
+    def record(self, query: str, cursor: Any):
+        """
+        Account an executed statement.
+        :param query: Executed SQL query.
+        :param cursor: Cursor the query was executed with.
+        """
+        self.statements += 1
+        if not READ_STATEMENT.match(query):
+            self.writes += 1
+        self.rows += max(cursor.rowcount, 0)
+        self.bytes += len(query)
+        for row in getattr(cursor, "_rows", None) or ():  # pylint: disable=W0212
+            for value in row.values() if isinstance(row, dict) else row:
+                if isinstance(value, (str, bytes)):
+                    self.bytes += len(value)
+                elif value is not None:
+                    self.bytes += 8
+
+    def __str__(self) -> str:
+        return f"statements={self.statements}, rows={self.rows}, bytes={self.bytes}"
+
+
+_QUERY_STATS: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+
+def current_query_stats() -> Optional[QueryStats]:
+    """
+    Get database usage of the current request.
+    :return: Query stats, None when accounting is disabled.
+    """
+    return _QUERY_STATS.get()
+
+
+def track_query_stats() -> QueryStats:
+    """
+    Get database usage of the current request, starting to account it if disabled.
+    Meant to be called within a task of its own, whose context the stats are bound to.
+    :return: Query stats.
+    """
+    stats = _QUERY_STATS.get()
+    if stats is None:
+        stats = QueryStats()
+        _QUERY_STATS.set(stats)
+    return stats
+
+
+class QueryAccountingMiddleware:
+    """
+    ASGI middleware counting statements, rows and bytes per request,
+    reported in the `X-Query-Stats` response header. Meant for debug mode and tests.
+    """
+
+    def __init__(self, app):
+        """
+        Initialize middleware.
+        :param app: ASGI app.
+        """
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        stats = QueryStats()
+        token = _QUERY_STATS.set(stats)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message = {
+                    **message,
+                    "headers": list(message.get("headers", []))
+                    + [(b"x-query-stats", str(stats).encode())],
+                }
+            await send(message)
+
+        try:
+            return await self.app(scope, receive, send_wrapper)
+        finally:
+            _QUERY_STATS.reset(token)
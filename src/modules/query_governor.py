@@ -0,0 +1,154 @@
+import asyncio
+from contextlib import suppress
+from typing import Optional, Sequence
+
+from .attr_dict import AttrDict
+from .mysql_driver import MySQLDatabase, acquire_storage
+
+DECISIONS = ("admitted", "downgraded", "rejected")
+
+
+class QueryGovernor:
+    """
+    Admits list queries by their estimated cost, in rows examined per shard, before they run.
+    Queries whose page statement exceeds `max_cost` are rejected, queries whose exact count
+    exceeds `max_count_cost` are downgraded to skip it. Costs are estimated by the caller
+    from the filter shape and the table sizes kept here, which are refreshed in the background
+    from the primary key, so estimating takes no round trip.
+    Every statement also runs with a MariaDB `max_statement_time` budget of its query class,
+    which bounds whatever the estimates miss.
+    """
+
+    def __init__(
+        self,
+        database: MySQLDatabase,
+        tables: Sequence[str],
+        max_cost: int = 1_000_000,
+        max_count_cost: int = 100_000,
+        statement_times: Optional[dict[str, float]] = None,
+        refresh_interval: float = 60.0,
+    ):
+        """
+        Initialize governor.
+        :param database: Database configured with its shards.
+        :param tables: Tables whose sizes are estimated, must have an `id` primary key.
+        :param max_cost: Max estimated rows examined by a page statement per shard.
+        :param max_count_cost: Max estimated rows examined by an exact count per shard.
+        :param statement_times: Seconds statements of a query class may run, 0 for no limit.
+        :param refresh_interval: Seconds between table size estimates.
+        """
+        self.database: MySQLDatabase = database
+        self.tables: tuple[str, ...] = tuple(tables)
+        self.max_cost: int = max_cost
+        self.max_count_cost: int = max_count_cost
+        self.statement_times: dict[str, float] = dict(statement_times or {})
+        self.refresh_interval: float = refresh_interval
+        self.table_rows: dict[str, int] = {}  # Estimated rows per shard
+        self.decisions: dict[str, int] = dict.fromkeys(DECISIONS, 0)
+        self.timeouts: dict[str, int] = dict.fromkeys(self.statement_times, 0)
+        self._prefixes: dict[str, str] = {
+            query_class: f"SET STATEMENT max_statement_time={seconds:g} FOR "
+            for query_class, seconds in self.statement_times.items()
+            if seconds
+        }
+        self._task: Optional[asyncio.Task] = None
+
+    def limit(self, query: str, query_class: str) -> str:
+        """
+        Bound the execution time of a statement by its query class.
+        :param query: SQL query.
+        :param query_class: Query class, e.g. `page` or `count`.
+        :return: SQL query run with the time budget of its class.
+        """
+        prefix = self._prefixes.get(query_class)
+        return prefix + query if prefix else query
+
+    def decide(self, page_cost: int, count_cost: int) -> str:
+        """
+        Admit, downgrade or reject a list query.
+        :param page_cost: Estimated rows examined by the page statement per shard.
+        :param count_cost: Estimated rows examined by the exact count per shard.
+        :return: One of `DECISIONS`.
+        """
+        if page_cost > self.max_cost:
+            decision = "rejected"
+        elif count_cost > self.max_count_cost:
+            decision = "downgraded"
+        else:
+            decision = "admitted"
+        self.decisions[decision] += 1
+        return decision
+
+    def decide_aggregate(self, cost: int) -> str:
+        """
+        Admit or reject an aggregate over all filtered rows, e.g. facets. Aggregates examine
+        rows like an exact count but cannot skip it, so they are rejected above its budget.
+        :param cost: Estimated rows examined by the aggregate per shard.
+        :return: `admitted` or `rejected`.
+        """
+        decision = "rejected" if cost > self.max_count_cost else "admitted"
+        self.decisions[decision] += 1
+        return decision
+
+    def record_timeout(self, query_class: str):
+        """
+        Count a statement interrupted by the time budget of its class.
+        :param query_class: Query class.
+        """
+        self.timeouts[query_class] = self.timeouts.get(query_class, 0) + 1
+
+    async def refresh(self):
+        """
+        Estimate table sizes from the highest ID of every shard, a primary key lookup.
+        Deleted rows are counted, which errs on the expensive side.
+        """
+        shards = self.database.shards
+        for table in self.tables:
+            query = f"SELECT MAX(id) AS max_id FROM {table}"  # nosec B608
+            highest = 0
+            for shard in shards:
+                async with acquire_storage(shard) as storage:
+                    row = await storage.get(query)
+                highest = max(highest, row.max_id or 0)
+            # IDs of sharded tables are spread over all shards
+            self.table_rows[table] = highest // len(shards)
+
+    def stats(self) -> AttrDict:
+        """
+        Summarize governor decisions.
+        :return: Decision and timeout counters, limits and table size estimates.
+        """
+        return AttrDict(
+            **self.decisions,
+            timeouts=dict(self.timeouts),
+            max_cost=self.max_cost,
+            max_count_cost=self.max_count_cost,
+            table_rows=dict(self.table_rows),
+        )
+
+    async def _refresh_loop(self):
+        """
+        Refresh table sizes periodically.
+        """
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            with suppress(Exception):
+                await self.refresh()
+
+    async def start(self):
+        """
+        Estimate table sizes and start refreshing them in the background.
+        """
+        with suppress(Exception):  # Queries are admitted unchecked until estimated
+            await self.refresh()
+        self._task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        """
+        Stop background refresh.
+        """
+        if self._task:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
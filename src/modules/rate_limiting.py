@@ -0,0 +1,175 @@
+import time
+from collections import OrderedDict
+from functools import partial
+from math import ceil
+from typing import Callable, Collection, Container, Optional, Protocol
+
+from .admission_control import PRIORITY_HIGH, PRIORITY_NORMAL, classify_request
+from .content_negotiation import negotiate, prerender
+
+RATE_LIMITED_BODIES = prerender(
+    {"ok": False, "message": "Too many requests", "traceback": None}
+)
+
+# Listed items per cost unit, a default page of 100 items costs as much as two point reads
+ITEMS_PER_COST_UNIT = 100
+MAX_API_KEY_LENGTH = 128
+
+
+class RateLimitBackend(Protocol):
+    """
+    Token bucket storage, e.g. a Redis script shared by all workers.
+    """
+
+    async def take(self, key: str, cost: float) -> float:
+        """
+        Take tokens from the bucket of a client.
+        :return: 0 if the tokens were taken, otherwise seconds until enough of them accumulate.
+        """
+
+
+class LocalRateLimitBackend:
+    """
+    In-process token buckets, every worker limits its clients on its own.
+    """
+
+    def __init__(self, rate: float, burst: float, max_clients: int = 100_000):
+        """
+        Initialize backend.
+        :param rate: Tokens added to every bucket per second.
+        :param burst: Bucket capacity, costlier requests are charged the full capacity.
+        :param max_clients: Max number of tracked clients, least recently seen ones are evicted
+            past it.
+        """
+        self.rate: float = rate
+        self.burst: float = burst
+        self.max_clients: int = max_clients
+        # Client key -> [tokens, monotonic time of the last update], least recently seen first
+        self.buckets: OrderedDict[str, list[float]] = OrderedDict()
+
+    async def take(self, key: str, cost: float) -> float:
+        """
+        Take tokens from the bucket of a client.
+        :param key: Client key.
+        :param cost: Number of tokens.
+        :return: 0 if the tokens were taken, otherwise seconds until enough of them accumulate.
+        """
+        now = time.monotonic()
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            while len(self.buckets) >= self.max_clients:
+                self.buckets.popitem(last=False)
+            bucket = self.buckets[key] = [self.burst, now]
+        else:
+            self.buckets.move_to_end(key)
+
+        cost = min(cost, self.burst)
+        tokens = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+        bucket[1] = now
+        if tokens >= cost:
+            bucket[0] = tokens - cost
+            return 0.0
+        bucket[0] = tokens
+        return (cost - tokens) / self.rate
+
+
+def client_identity(scope: dict, api_keys: Container[str] = frozenset()) -> str:
+    """
+    Identify the client of a request by its `X-API-Key` header if it is a known key,
+    otherwise by IP address, so that clients cannot pick a fresh identity per request.
+    :param scope: ASGI scope.
+    :param api_keys: Known API keys.
+    :return: Client key.
+    """
+    for name, value in scope["headers"]:
+        if name == b"x-api-key" and value:
+            key = value[:MAX_API_KEY_LENGTH].decode("latin-1")
+            if key in api_keys:
+                return f"key:{key}"
+            break
+    client = scope.get("client")
+    return f"ip:{client[0] if client else ''}"
+
+
+def request_cost(scope: dict) -> Optional[float]:
+    """
+    Weigh a request: point reads cost 1, writes 2, lists 1 plus 1 per 100 requested items.
+    :param scope: ASGI scope.
+    :return: Number of tokens, None for requests exempt from rate limiting.
+    """
+    priority = classify_request(scope)
+    if priority is None:
+        return None
+    if priority == PRIORITY_HIGH:
+        return 1.0
+    if priority == PRIORITY_NORMAL:
+        return 2.0
+
+    items = ITEMS_PER_COST_UNIT
+    query_string = scope["query_string"]
+    if query_string:
+        for param in query_string.split(b"&"):
+            name, _, value = param.partition(b"=")
+            if name in (b"items_per_page", b"limit") and value.isdigit():
+                items = int(value)
+                break
+    return 1.0 + items / ITEMS_PER_COST_UNIT
+
+
+class RateLimitMiddleware:
+    """
+    ASGI middleware limiting the request rate of every client with token buckets,
+    requests over the limit are rejected with 429 and `Retry-After`.
+    """
+
+    def __init__(
+        self,
+        app,
+        backend: RateLimitBackend,
+        cost: Callable[[dict], Optional[float]] = request_cost,
+        identify: Optional[Callable[[dict], str]] = None,
+        api_keys: Collection[str] = (),
+    ):
+        """
+        Initialize middleware.
+        :param app: ASGI app.
+        :param backend: Token bucket storage.
+        :param cost: Callable weighing a request, returns None for exempt requests.
+        :param identify: Callable returning the client key of a request,
+            `client_identity` with `api_keys` by default.
+        :param api_keys: API keys identifying clients, other keys are ignored.
+        """
+        self.app = app
+        self.backend: RateLimitBackend = backend
+        self.cost: Callable[[dict], Optional[float]] = cost
+        self.identify: Callable[[dict], str] = identify or partial(
+            client_identity, api_keys=frozenset(api_keys)
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        cost = self.cost(scope)
+        if cost is None:
+            return await self.app(scope, receive, send)
+        wait = await self.backend.take(self.identify(scope), cost)
+        if not wait:
+            return await self.app(scope, receive, send)
+
+        media_type = negotiate(scope)
+        body = RATE_LIMITED_BODIES[media_type]
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 429,
+                "headers": [
+                    (b"content-type", media_type.encode()),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"retry-after", str(ceil(wait)).encode()),
+                    (b"vary", b"Accept"),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
+        return None
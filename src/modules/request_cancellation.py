@@ -0,0 +1,106 @@
+import asyncio
+from contextlib import suppress
+from typing import Optional
+
+from .content_negotiation import negotiate, prerender
+
+TIMEOUT_BODIES = prerender(
+    {"ok": False, "message": "Request timed out", "traceback": None}
+)
+
+
+class RequestCancellationMiddleware:
+    """
+    ASGI middleware that cancels the handler when the client disconnects or the request times out,
+    so abandoned requests stop holding pool connections and running statements.
+    The timeout starts once the request body was read, so slow uploads are not cut off.
+    Responses that already started, e.g. event streams, are only cancelled on disconnect.
+    """
+
+    def __init__(self, app, timeout: Optional[float] = None, queue_size: int = 16):
+        """
+        Initialize middleware.
+        :param app: ASGI app.
+        :param timeout: Seconds a request may run after its body was read before being cancelled,
+            None to never time out.
+        :param queue_size: Max number of buffered request messages,
+            body chunks arriving while it is full are dropped.
+        """
+        self.app = app
+        self.timeout: Optional[float] = timeout
+        self.queue_size: int = queue_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        # The middleware is the only reader of `receive`, the app reads from the queue
+        messages: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        response = {"started": False, "complete": False}
+        body_read = asyncio.Event()
+
+        async def watch():
+            while True:
+                message = await receive()
+                if messages.full():
+                    if message["type"] != "http.disconnect":
+                        continue  # The app stopped reading the body, keep watching
+                    messages.get_nowait()  # Make room so the app still sees the disconnect
+                messages.put_nowait(message)
+                if message["type"] == "http.request" and not message.get("more_body"):
+                    body_read.set()
+                elif message["type"] == "http.disconnect":
+                    return
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                response["started"] = True
+            elif message["type"] == "http.response.body" and not message.get("more_body"):
+                response["complete"] = True
+            await send(message)
+
+        app_task = asyncio.ensure_future(self.app(scope, messages.get, send_wrapper))
+        watcher = asyncio.ensure_future(watch())
+        reading = asyncio.ensure_future(body_read.wait())
+        try:
+            done, _ = await asyncio.wait(
+                {app_task, watcher, reading}, return_when=asyncio.FIRST_COMPLETED
+            )
+            if not done & {app_task, watcher}:
+                done, _ = await asyncio.wait(
+                    {app_task, watcher},
+                    timeout=self.timeout,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+            if not done and response["started"]:
+                # Streaming responses only time out before they start
+                done, _ = await asyncio.wait(
+                    {app_task, watcher}, return_when=asyncio.FIRST_COMPLETED
+                )
+            if app_task in done or response["complete"]:
+                return await app_task
+
+            app_task.cancel()
+            with suppress(asyncio.CancelledError):
+                await app_task
+            if watcher not in done and not response["started"]:
+                media_type = negotiate(scope)
+                body = TIMEOUT_BODIES[media_type]
+                await send(
+                    {
+                        "type": "http.response.start",
+                        "status": 504,
+                        "headers": [
+                            (b"content-type", media_type.encode()),
+                            (b"content-length", str(len(body)).encode()),
+                            (b"vary", b"Accept"),
+                        ],
+                    }
+                )
+                await send({"type": "http.response.body", "body": body})
+            return None
+        finally:
+            reading.cancel()
+            watcher.cancel()
+            if not app_task.done():
+                app_task.cancel()
@@ -0,0 +1,214 @@
+import asyncio
+import time
+from collections import OrderedDict
+from contextlib import suppress
+from typing import Optional
+from urllib.parse import parse_qsl, urlencode
+
+from .content_negotiation import negotiate
+
+_BACKGROUND_TASKS: set = set()  # Strong references to fire-and-forget tasks
+
+
+class ResponseCache:
+    """
+    Byte-capped LRU cache of serialized responses with TTL and stale-while-revalidate windows.
+    """
+
+    FRESH = "fresh"
+    STALE = "stale"
+
+    def __init__(
+        self, ttl: float = 5.0, stale_ttl: float = 30.0, max_bytes: int = 64 << 20
+    ):
+        """
+        Initialize cache.
+        :param ttl: Seconds an entry is served as fresh.
+        :param stale_ttl: Seconds after `ttl` an entry is still served while being refreshed.
+        :param max_bytes: Max total size of cached bodies.
+        """
+        self.ttl: float = ttl
+        self.stale_ttl: float = stale_ttl
+        self.max_bytes: int = max_bytes
+        self.size: int = 0
+        # Bumped on invalidation to drop results computed before it
+        self.generation: int = 0
+        self._entries: OrderedDict[str, tuple[float, list, bytes]] = OrderedDict()
+
+    def get(self, key: str) -> tuple[Optional[list], Optional[bytes], Optional[str]]:
+        """
+        Get cached response.
+        :param key: Cache key.
+        :return: Headers, body and freshness, all None on miss.
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return None, None, None
+
+        stored_at, headers, body = entry
+        age = time.monotonic() - stored_at
+        if age > self.ttl + self.stale_ttl:
+            self._drop(key)
+            return None, None, None
+
+        self._entries.move_to_end(key)
+        return headers, body, self.FRESH if age <= self.ttl else self.STALE
+
+    def set(self, key: str, headers: list, body: bytes, generation: int):
+        """
+        Store response unless the cache was invalidated since it started being computed.
+        :param key: Cache key.
+        :param headers: Raw ASGI response headers.
+        :param body: Response body.
+        :param generation: Value of `generation` when computation started.
+        """
+        if generation != self.generation or len(body) > self.max_bytes:
+            return
+
+        self._drop(key)
+        self._entries[key] = (time.monotonic(), headers, body)
+        self.size += len(body)
+        while self.size > self.max_bytes:
+            self._drop(next(iter(self._entries)))
+
+    def invalidate(self):
+        """
+        Drop all entries.
+        """
+        self.generation += 1
+        self._entries.clear()
+        self.size = 0
+
+    def _drop(self, key: str):
+        """
+        Remove entry if present.
+        """
+        entry = self._entries.pop(key, None)
+        if entry:
+            self.size -= len(entry[2])
+
+
+class ResponseCacheMiddleware:
+    """
+    ASGI middleware caching successful GET responses of the given paths.
+    Cache hits never reach the app, so they do not check out pool connections.
+    Stale entries are served while a single background request refreshes them.
+    Any successful write under the given paths invalidates the whole cache.
+    """
+
+    def __init__(self, app, cache: ResponseCache, paths: tuple[str, ...]):
+        """
+        Initialize middleware.
+        :param app: ASGI app.
+        :param cache: Response cache.
+        :param paths: Exact paths whose GET responses are cached.
+        """
+        self.app = app
+        self.cache: ResponseCache = cache
+        self.paths: tuple[str, ...] = tuple(p.rstrip("/") for p in paths)
+        self._refreshing: set[str] = set()
+
+    @staticmethod
+    def cache_key(scope: dict) -> str:
+        """
+        Build cache key from path, normalized, sorted query parameters and negotiated media type.
+        :param scope: ASGI scope.
+        :return: Cache key.
+        """
+        query = sorted(
+            parse_qsl(scope["query_string"].decode("latin-1"), keep_blank_values=True)
+        )
+        return f'{scope["path"].rstrip("/")}?{urlencode(query)}#{negotiate(scope)}'
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        path = scope["path"].rstrip("/")
+        if scope["method"] != "GET":
+            if path.startswith(self.paths):
+                return await self._invalidating(scope, receive, send)
+            return await self.app(scope, receive, send)
+        if path not in self.paths:
+            return await self.app(scope, receive, send)
+
+        key = self.cache_key(scope)
+        headers, body, freshness = self.cache.get(key)
+        if body is None:
+            return await self._fill(key, scope, receive, send)
+
+        if freshness == self.cache.STALE and key not in self._refreshing:
+            self._refreshing.add(key)
+            task = asyncio.ensure_future(self._refresh(key, dict(scope)))
+            _BACKGROUND_TASKS.add(task)
+            task.add_done_callback(_BACKGROUND_TASKS.discard)
+
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 200,
+                "headers": headers + [(b"x-cache", freshness.encode())],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
+        return None
+
+    async def _fill(self, key: str, scope, receive, send):
+        """
+        Pass a cache miss through to the app and store a successful response.
+        """
+        generation = self.cache.generation
+        start: dict = {}
+        chunks: list[bytes] = []
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                start.update(message)
+                message = {
+                    **message,
+                    "headers": list(message.get("headers", [])) + [(b"x-cache", b"miss")],
+                }
+            elif message["type"] == "http.response.body" and start.get("status") == 200:
+                chunks.append(message.get("body", b""))
+                if not message.get("more_body"):
+                    self.cache.set(
+                        key, list(start["headers"]), b"".join(chunks), generation
+                    )
+            await send(message)
+
+        return await self.app(scope, receive, send_wrapper)
+
+    async def _refresh(self, key: str, scope: dict):
+        """
+        Re-run the request in the background to refresh a stale entry.
+        """
+        request_sent = False
+        never = asyncio.get_running_loop().create_future()
+
+        async def receive():
+            nonlocal request_sent
+            if not request_sent:
+                request_sent = True
+                return {"type": "http.request", "body": b"", "more_body": False}
+            return await never
+
+        async def send(_):
+            pass
+
+        try:
+            with suppress(Exception):  # The stale entry expires on its own
+                await self._fill(key, scope, receive, send)
+        finally:
+            self._refreshing.discard(key)
+
+    async def _invalidating(self, scope, receive, send):
+        """
+        Pass a write through to the app, invalidating the cache if it succeeds.
+        """
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                self.cache.invalidate()
+            await send(message)
+
+        return await self.app(scope, receive, send_wrapper)
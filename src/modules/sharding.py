@@ -0,0 +1,193 @@
+import asyncio
+import heapq
+import zlib
+from contextlib import AsyncExitStack
+from itertools import islice
+from typing import Any, AsyncContextManager, Callable, Optional
+
+from .attr_dict import AttrDict
+from .mysql_driver import MySQLDatabase, MySQLStorage
+
+
+def shard_index(key: int, shard_count: int) -> int:
+    """
+    Map a row ID onto a shard, stable across processes and restarts.
+    :param key: Row ID.
+    :param shard_count: Number of shards.
+    :return: Shard index.
+    """
+    return zlib.crc32(key.to_bytes(8, "little")) % shard_count
+
+
+async def gather_all(*aws) -> list[Any]:
+    """
+    Await all awaitables concurrently and raise the first error only once all of them finished,
+    so that no statement is left running on a connection that is about to be released.
+    """
+    results = await asyncio.gather(*aws, return_exceptions=True)
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+    return results
+
+
+class IdAllocator:
+    """
+    Hands out globally unique IDs for a sharded table from blocks
+    reserved in the `id_sequences` table of the first shard, one round trip per block.
+    IDs are unique across workers but only increasing within a worker,
+    unused IDs of a block are skipped when the worker restarts.
+    """
+
+    def __init__(self, table: str, block_size: int = 100):
+        """
+        Initialize allocator.
+        :param table: Sharded table name.
+        :param block_size: Number of IDs reserved at once.
+        """
+        self.table: str = table
+        self.block_size: int = block_size
+        self.next_id: int = 0
+        self.end_id: int = 0
+        self._lock: asyncio.Lock = asyncio.Lock()
+
+    async def _reserve(self, shards: "ShardedStorage"):
+        """
+        Reserve the next block of IDs.
+        :param shards: Request shards.
+        """
+        primary = await shards.shard(0)
+        query = "UPDATE id_sequences SET next_id = LAST_INSERT_ID(next_id + %s) WHERE name = %s"
+        if not await primary.apply(query, (self.block_size, self.table)):
+            # First use, continue after the highest ID on any shard
+            rows = await shards.gather(
+                f"SELECT COALESCE(MAX(id), 0) + 1 AS next_id FROM {self.table}"  # nosec B608
+            )
+            await primary.apply(
+                "INSERT IGNORE INTO id_sequences (name, next_id) VALUES (%s, %s)",
+                (self.table, max(r[0].next_id for r in rows)),
+            )
+            await primary.apply(query, (self.block_size, self.table))
+        end_id = (await primary.get("SELECT LAST_INSERT_ID() AS end_id")).end_id
+        self.next_id, self.end_id = end_id - self.block_size, end_id
+
+    async def allocate(self, shards: "ShardedStorage") -> int:
+        """
+        Allocate a new ID.
+        :param shards: Request shards.
+        :return: ID.
+        """
+        if self.next_id >= self.end_id:
+            async with self._lock:
+                if self.next_id >= self.end_id:
+                    await self._reserve(shards)
+        item_id = self.next_id
+        self.next_id += 1
+        return item_id
+
+
+class ShardedStorage:
+    """
+    Request-scoped access to the shards of a database.
+    A connection to a shard is acquired on its first use and released with the request,
+    so routes touching a single shard hold a single connection.
+    """
+
+    def __init__(
+        self,
+        database: MySQLDatabase,
+        acquire: Callable[[MySQLDatabase], AsyncContextManager[MySQLStorage]],
+        stack: AsyncExitStack,
+    ):
+        """
+        Initialize sharded storage.
+        :param database: Database configured with its shards.
+        :param acquire: Context manager factory acquiring storage of a shard.
+        :param stack: Exit stack releasing acquired storages at the end of the request.
+        """
+        self.database: MySQLDatabase = database
+        self._acquire = acquire
+        self._stack: AsyncExitStack = stack
+        self._storages: dict[int, MySQLStorage] = {}
+
+    def __len__(self) -> int:
+        return len(self.database.shards)
+
+    async def shard(self, index: int) -> MySQLStorage:
+        """
+        Get storage of a shard.
+        :param index: Shard index.
+        :return: MySQLStorage instance.
+        """
+        storage = self._storages.get(index)
+        if storage is None:
+            storage = await self._stack.enter_async_context(
+                self._acquire(self.database.shards[index])
+            )
+            self._storages[index] = storage
+        return storage
+
+    async def for_id(self, item_id: int) -> MySQLStorage:
+        """
+        Get storage of the shard holding a row.
+        :param item_id: Row ID.
+        :return: MySQLStorage instance.
+        """
+        return await self.shard(shard_index(item_id, len(self)))
+
+    async def all(self) -> list[MySQLStorage]:
+        """
+        Get storages of all shards, acquiring missing connections concurrently.
+        :return: MySQLStorage instance per shard.
+        """
+        return await gather_all(*(self.shard(i) for i in range(len(self))))
+
+    async def scatter(self, run: Callable[[MySQLStorage], Any]) -> list[Any]:
+        """
+        Run a coroutine function against every shard concurrently.
+        :param run: Coroutine function taking shard storage.
+        :return: Result per shard.
+        """
+        return await gather_all(*(run(storage) for storage in await self.all()))
+
+    async def gather(self, query: str, args: Any = ()) -> list[list[AttrDict]]:
+        """
+        Run a query on every shard concurrently.
+        :param query: SQL query to execute.
+        :param args: Arguments passed to the SQL query.
+        :return: Rows per shard.
+        """
+        return await self.scatter(lambda s: s.get(query, args, fetch_all=True))
+
+    async def merge(
+        self,
+        query: str,
+        args: Any,
+        key: Callable[[AttrDict], Any],
+        limit: Optional[int] = None,
+        offset: int = 0,
+    ) -> list[AttrDict]:
+        """
+        Run an ordered query on every shard concurrently and k-way merge the results.
+        Every shard must return its rows sorted by `key` and at least `offset + limit` of them.
+        :param query: SQL query to execute.
+        :param args: Arguments passed to the SQL query.
+        :param key: Sort key of the query order.
+        :param limit: Max number of merged rows, None for all.
+        :param offset: Number of merged rows to skip.
+        :return: Merged rows.
+        """
+        merged = heapq.merge(*await self.gather(query, args), key=key)
+        return list(islice(merged, offset, None if limit is None else offset + limit))
+
+    async def allocate_id(self, table: str) -> int:
+        """
+        Allocate a globally unique ID for a new row of a sharded table.
+        :param table: Table name.
+        :return: ID.
+        """
+        allocator = self.database.id_allocators.get(table)
+        if allocator is None:
+            allocator = IdAllocator(table, self.database.id_block_size)
+            self.database.id_allocators[table] = allocator
+        return await allocator.allocate(self)
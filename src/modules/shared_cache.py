@@ -0,0 +1,169 @@
+import fcntl
+import mmap
+import os
+import struct
+import time
+import zlib
+from typing import Any, Optional
+
+import orjson
+
+# Slot header: version, key, expiry time, payload length, payload CRC-32
+_SLOT_HEADER = struct.Struct("<IQdII")
+_VERSION = struct.Struct("<I")
+_FIBONACCI = (
+    11400714819323198485  # 2**64 / golden ratio, spreads sequential IDs over slots
+)
+
+
+class SharedRowCache:
+    """
+    Cache of serialized rows by integer ID in a memory-mapped file, shared by all worker processes
+    of a host. The file holds fixed-size slots, an ID maps to a single slot and evicts its previous
+    occupant. Readers take no lock: a slot version that is odd while written and changes with every
+    write (a seqlock), plus a payload checksum, tell torn reads apart, which count as misses.
+    Writers lock the slot with `fcntl` byte-range locks.
+
+    A miss reads the slot `version` before querying the database and passes it to `put`, which
+    drops the row if the slot was invalidated meanwhile, so a concurrent update in another worker
+    is never overwritten by the stale row. Rows expire after `ttl` seconds, which bounds staleness
+    from writes bypassing `invalidate`, e.g. by other hosts.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        slots: int = 16384,
+        slot_size: int = 2048,
+        ttl: float = 5.0,
+    ):
+        """
+        Initialize cache, creating the file if missing. The layout is part of the file name,
+        so workers with different settings never share a file.
+        :param path: File path prefix, preferably on a tmpfs such as /dev/shm.
+        :param slots: Number of slots.
+        :param slot_size: Bytes per slot, including a 28 bytes header. Larger rows are not cached.
+        :param ttl: Seconds rows are served for.
+        """
+        self.slots: int = slots
+        self.slot_size: int = slot_size
+        self.payload_size: int = slot_size - _SLOT_HEADER.size
+        self.ttl: float = ttl
+        self.path: str = f"{path}.{slots}x{slot_size}"
+        self.hits: int = 0
+        self.misses: int = 0
+        self.stores: int = 0
+        self.oversized: int = 0
+
+        size = slots * slot_size
+        self._fd: int = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        if os.fstat(self._fd).st_size < size:
+            # Only ever grows, shrinking would crash workers mapping the file
+            os.ftruncate(self._fd, size)
+        self._map: mmap.mmap = mmap.mmap(self._fd, size)
+        self._view: memoryview = memoryview(self._map)
+
+    def _offset(self, key: int) -> int:
+        return ((key * _FIBONACCI) & 0xFFFFFFFFFFFFFFFF) % self.slots * self.slot_size
+
+    def get(self, key: int) -> Optional[Any]:
+        """
+        Get a row, deserialized straight from shared memory.
+        :param key: Row ID.
+        :return: Row, None on a miss.
+        """
+        offset = self._offset(key)
+        version, stored_key, expires, length, crc = _SLOT_HEADER.unpack_from(
+            self._map, offset
+        )
+        if version & 1 or stored_key != key or expires < time.time():
+            self.misses += 1
+            return None
+        payload = self._view[
+            offset + _SLOT_HEADER.size : offset + _SLOT_HEADER.size + length
+        ]
+        try:
+            row = orjson.loads(payload)
+        except orjson.JSONDecodeError:
+            row = None
+        if (
+            row is None
+            or zlib.crc32(payload) != crc
+            or _VERSION.unpack_from(self._map, offset)[0] != version
+        ):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return row
+
+    def version(self, key: int) -> int:
+        """
+        Read the version of the slot of a row, before loading the row on a miss.
+        :param key: Row ID.
+        :return: Slot version.
+        """
+        return _VERSION.unpack_from(self._map, self._offset(key))[0]
+
+    def _locked(self, offset: int, lock: int):
+        fcntl.lockf(self._fd, lock, self.slot_size, offset)
+
+    def put(self, key: int, row: Any, version: int) -> bool:
+        """
+        Store a row unless its slot changed since `version` was read.
+        :param key: Row ID.
+        :param row: JSON compatible row.
+        :param version: Slot version read before loading the row.
+        :return: Whether the row was stored.
+        """
+        payload = orjson.dumps(row)
+        if len(payload) > self.payload_size:
+            self.oversized += 1
+            return False
+        offset = self._offset(key)
+        self._locked(offset, fcntl.LOCK_EX)
+        try:
+            if version & 1 or _VERSION.unpack_from(self._map, offset)[0] != version:
+                return False
+            _VERSION.pack_into(self._map, offset, (version + 1) & 0xFFFFFFFF)
+            start = offset + _SLOT_HEADER.size
+            self._map[start : start + len(payload)] = payload
+            _SLOT_HEADER.pack_into(
+                self._map,
+                offset,
+                (version + 1) & 0xFFFFFFFF,
+                key,
+                time.time() + self.ttl,
+                len(payload),
+                zlib.crc32(payload),
+            )
+            _VERSION.pack_into(self._map, offset, (version + 2) & 0xFFFFFFFF)
+        finally:
+            self._locked(offset, fcntl.LOCK_UN)
+        self.stores += 1
+        return True
+
+    def invalidate(self, key: int):
+        """
+        Drop a row after it changed. Always bumps the slot version, so that loads of the row
+        started before the change are not stored.
+        :param key: Row ID.
+        """
+        offset = self._offset(key)
+        self._locked(offset, fcntl.LOCK_EX)
+        try:
+            version, stored_key = _SLOT_HEADER.unpack_from(self._map, offset)[:2]
+            if stored_key == key:
+                _SLOT_HEADER.pack_into(
+                    self._map, offset, (version + 1) & 0xFFFFFFFF, 0, 0.0, 0, 0
+                )
+            _VERSION.pack_into(self._map, offset, (version + 2) & 0xFFFFFFFF)
+        finally:
+            self._locked(offset, fcntl.LOCK_UN)
+
+    def close(self):
+        """
+        Unmap the file, it is kept for other workers.
+        """
+        self._view.release()
+        self._map.close()
+        os.close(self._fd)
@@ -0,0 +1,192 @@
+import asyncio
+import struct
+import zlib
+from contextlib import suppress
+from typing import Optional
+
+from .mysql_driver import MySQLDatabase, MySQLStorage
+
+
+def inflate(compressed: bytes) -> str:
+    """
+    Decompress a value written by `TextCompressor.compress` or by SQL `COMPRESS()`.
+    :param compressed: Compressed UTF-8 text.
+    :return: Text.
+    """
+    return zlib.decompress(compressed[4:]).decode() if compressed else ""
+
+
+class TextCompressor:
+    """
+    Compresses a large text column into a companion BLOB column, e.g. `description` into
+    `description_compressed`, in the format of MariaDB `COMPRESS()`: uncompressed length
+    followed by a zlib stream, so SQL can read it with `UNCOMPRESS()`.
+    Compressed rows keep an empty string in the text column, rows with a NULL BLOB are plain,
+    so both kinds can be read side by side while `backfill` converts existing rows in batches.
+    """
+
+    def __init__(
+        self,
+        column: str = "description",
+        min_length: int = 256,
+        level: int = 6,
+        batch_size: int = 500,
+        batch_pause: float = 0.05,
+    ):
+        """
+        Initialize compressor.
+        :param column: Text column, the BLOB column is named `<column>_compressed`.
+        :param min_length: Texts shorter than this many bytes are stored plain.
+        :param level: zlib compression level.
+        :param batch_size: Number of rows converted per transaction by `backfill`.
+        :param batch_pause: Seconds between backfill batches, leaves room for the app.
+        """
+        self.column: str = column
+        self.compressed_column: str = f"{column}_compressed"
+        self.min_length: int = min_length
+        self.level: int = level
+        self.batch_size: int = batch_size
+        self.batch_pause: float = batch_pause
+        self.converted: int = 0  # Rows compressed by background backfills
+        self._task: Optional[asyncio.Task] = None
+
+    def compress(self, text: str) -> tuple[str, Optional[bytes]]:
+        """
+        Encode a text for storage.
+        :param text: Text.
+        :return: Values of the text and BLOB columns.
+        """
+        raw = text.encode()
+        if len(raw) < self.min_length:
+            return text, None
+        compressed = struct.pack("<I", len(raw)) + zlib.compress(raw, self.level)
+        if len(compressed) >= len(raw):
+            return text, None  # Incompressible
+        return "", compressed
+
+    async def _backfill_batch(
+        self, storage: MySQLStorage, table: str, after_id: int
+    ) -> tuple[Optional[int], int]:
+        """
+        Compress a batch of plain rows.
+        :return: Last scanned ID, None once the table is exhausted, and number of converted rows.
+        """
+        rows = await storage.get(
+            f"SELECT id, {self.column}, updated_at FROM {table} "  # nosec B608
+            f"WHERE id > %s AND {self.compressed_column} IS NULL "
+            f"AND LENGTH({self.column}) >= %s ORDER BY id LIMIT %s",
+            (after_id, self.min_length, self.batch_size),
+            fetch_all=True,
+        )
+        if not rows:
+            return None, 0
+        updates, converted = [], 0
+        for row in rows:
+            text, compressed = self.compress(row[self.column])
+            if compressed is not None:
+                updates.append((text, compressed, row.id, row.updated_at))
+        if updates:
+            # Explicit `updated_at` keeps the change feed quiet, rows updated since
+            # the read have a newer one and are skipped
+            converted = await storage.apply_batch(
+                f"UPDATE {table} SET {self.column} = %s, "  # nosec B608
+                f"{self.compressed_column} = %s, updated_at = updated_at "
+                f"WHERE id = %s AND updated_at = %s",
+                updates,
+            )
+        return rows[-1].id, converted
+
+    async def _backfill_shard(self, shard: MySQLDatabase, table: str) -> int:
+        """
+        Compress plain rows of a shard unless another worker is already at it.
+        The advisory lock is held on its own connection and goes away with it
+        should the worker die.
+        :return: Number of converted rows.
+        """
+        lock_name = f"{shard.database}.{table}.{self.compressed_column}"[:64]
+        async with shard.pool.acquire() as connection:
+            lock = MySQLStorage(
+                connection, query_timeout=shard.query_timeout, breaker=shard.breaker
+            )
+            row = await lock.get("SELECT GET_LOCK(%s, 0) AS locked", lock_name)
+            if not row.locked:
+                return 0
+            try:
+                row = await lock.get(
+                    f"SELECT EXISTS(SELECT 1 FROM {table} "  # nosec B608
+                    f"WHERE {self.compressed_column} IS NULL "
+                    f"AND LENGTH({self.column}) >= %s) AS pending",
+                    self.min_length,
+                )
+                if not row.pending:
+                    return 0
+                converted = 0
+                after_id: Optional[int] = 0
+                while after_id is not None:
+                    async with shard.pool.acquire() as batch_connection:
+                        storage = MySQLStorage(
+                            batch_connection,
+                            query_timeout=shard.query_timeout,
+                            breaker=shard.breaker,
+                        )
+                        after_id, count = await self._backfill_batch(
+                            storage, table, after_id
+                        )
+                    converted += count
+                    await asyncio.sleep(self.batch_pause)
+                return converted
+            finally:
+                if not connection.closed:
+                    await lock.get("SELECT RELEASE_LOCK(%s) AS released", lock_name)
+
+    async def backfill(self, database: MySQLDatabase, table: str = "products") -> int:
+        """
+        Compress existing plain rows of every shard online, one small transaction per batch.
+        Safe to run concurrently with writes. Workers starting it together do not scan
+        the same shard twice: a shard another worker is compressing is skipped.
+        :param database: Database configured with its shards.
+        :param table: Table name, must have `id` and `updated_at` columns.
+        :return: Number of converted rows.
+        """
+        converted = 0
+        for shard in database.shards:
+            converted += await self._backfill_shard(shard, table)
+        return converted
+
+    async def _backfill_loop(
+        self, database: MySQLDatabase, table: str, retry_interval: float
+    ):
+        """
+        Backfill until a pass completes, retrying after failures.
+        """
+        while True:
+            with suppress(Exception):
+                self.converted += await self.backfill(database, table)
+                return
+            await asyncio.sleep(retry_interval)
+
+    async def start(
+        self,
+        database: MySQLDatabase,
+        table: str = "products",
+        retry_interval: float = 60.0,
+    ):
+        """
+        Start compressing existing rows in the background.
+        :param database: Database configured with its shards.
+        :param table: Table name.
+        :param retry_interval: Seconds before a failed backfill is resumed.
+        """
+        self._task = asyncio.create_task(
+            self._backfill_loop(database, table, retry_interval)
+        )
+
+    async def stop(self):
+        """
+        Stop the background backfill, the next start resumes it.
+        """
+        if self._task:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
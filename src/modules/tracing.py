@@ -0,0 +1,232 @@
+import random
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Any, Optional
+
+import orjson
+
+from .attr_dict import AttrDict
+
+
+class Trace:
+    """
+    Spans of a single sampled request.
+    """
+
+    __slots__ = ("trace_id", "started_at", "origin", "spans")
+
+    def __init__(self, trace_id: str):
+        self.trace_id: str = trace_id
+        self.started_at: float = time.time()
+        self.origin: float = time.perf_counter()
+        self.spans: list[Span] = []
+
+
+class Span:
+    """
+    Timed operation within a trace, used as a context manager.
+    """
+
+    __slots__ = (
+        "name",
+        "trace",
+        "span_id",
+        "parent_id",
+        "attributes",
+        "started",
+        "duration",
+        "_token",
+    )
+
+    def __init__(self, name: str, trace: Trace, parent_id: Optional[str]):
+        self.name: str = name
+        self.trace: Trace = trace
+        self.span_id: str = f"{random.getrandbits(64):016x}"
+        self.parent_id: Optional[str] = parent_id
+        self.attributes: dict[str, Any] = {}
+        self.started: float = 0.0
+        self.duration: float = 0.0
+        self._token = None
+
+    def set(self, key: str, value: Any):
+        """
+        Set span attribute.
+        """
+        self.attributes[key] = value
+
+    def __enter__(self) -> "Span":
+        self._token = _CURRENT_SPAN.set(self)
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self.started
+        if exc_type:
+            self.attributes["error"] = exc_type.__name__
+        _CURRENT_SPAN.reset(self._token)
+        self.trace.spans.append(self)
+        return False
+
+    def as_dict(self) -> AttrDict:
+        """
+        Export span with times relative to the trace start, in milliseconds.
+        """
+        return AttrDict(
+            name=self.name,
+            span_id=self.span_id,
+            parent_id=self.parent_id,
+            offset_ms=round((self.started - self.trace.origin) * 1000, 3),
+            duration_ms=round(self.duration * 1000, 3),
+            attributes=self.attributes,
+        )
+
+
+class _NoopSpan:
+    """
+    Stand-in for spans outside of sampled requests.
+    """
+
+    def __enter__(self) -> None:
+        return None
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+_CURRENT_SPAN: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def trace_span(name: str) -> Span | _NoopSpan:
+    """
+    Create a child span of the current span, a no-op outside of sampled requests.
+    Usage: `with trace_span("db.query") as span:`, `span` is None when not sampled.
+    :param name: Span name.
+    :return: Span context manager.
+    """
+    parent = _CURRENT_SPAN.get()
+    if parent is None:
+        return _NOOP_SPAN
+    return Span(name, parent.trace, parent.span_id)
+
+
+class Tracer:
+    """
+    Samples requests and keeps their finished traces in a ring buffer,
+    optionally appending them to a JSON lines file as well.
+    Upstream sampling decisions received in W3C `traceparent` headers are respected.
+    """
+
+    def __init__(
+        self,
+        sample_rate: float = 0.01,
+        buffer_size: int = 1000,
+        export_path: Optional[str] = None,
+    ):
+        """
+        Initialize tracer.
+        :param sample_rate: Share of requests without `traceparent` that are traced.
+        :param buffer_size: Number of recent traces kept in memory.
+        :param export_path: JSON lines file to append traces to, None to only keep them in memory.
+        """
+        self.sample_rate: float = sample_rate
+        self.export_path: Optional[str] = export_path
+        self.traces: deque[AttrDict] = deque(maxlen=buffer_size)
+
+    def start(self, name: str, traceparent: Optional[bytes] = None) -> Optional[Span]:
+        """
+        Start a root span if the request is sampled.
+        :param name: Span name.
+        :param traceparent: Incoming `traceparent` header.
+        :return: Root span, None if the request is not sampled.
+        """
+        trace_id, parent_id, sampled = None, None, None
+        if traceparent:
+            try:
+                _, trace_hex, parent_hex, flags = traceparent.decode("latin-1").split(
+                    "-"
+                )[:4]
+                if (
+                    len(trace_hex) == 32
+                    and len(parent_hex) == 16
+                    and int(trace_hex, 16)
+                    and int(parent_hex, 16)
+                ):
+                    sampled = bool(int(flags, 16) & 1)
+                    trace_id, parent_id = trace_hex.lower(), parent_hex.lower()
+            except ValueError:  # Malformed header, sample as if it was not sent
+                pass
+
+        if sampled is None:
+            sampled = random.random() < self.sample_rate
+        if not sampled:
+            return None
+        trace = Trace(trace_id or f"{random.getrandbits(128):032x}")
+        return Span(name, trace, parent_id)
+
+    def finish(self, root: Span):
+        """
+        Export the trace of a finished root span.
+        :param root: Root span returned by `start`.
+        """
+        trace = root.trace
+        record = AttrDict(
+            trace_id=trace.trace_id,
+            name=root.name,
+            started_at=trace.started_at,
+            duration_ms=round(root.duration * 1000, 3),
+            spans=[s.as_dict() for s in trace.spans],
+        )
+        self.traces.append(record)
+        if self.export_path:
+            with open(self.export_path, "ab") as file:
+                file.write(orjson.dumps(record) + b"\n")
+
+
+class TracingMiddleware:
+    """
+    ASGI middleware opening a root span for sampled requests,
+    child spans are created with `trace_span` anywhere down the call chain.
+    The `traceparent` response header identifies the request span.
+    """
+
+    def __init__(self, app, tracer: Tracer):
+        """
+        Initialize middleware.
+        :param app: ASGI app.
+        :param tracer: Tracer.
+        """
+        self.app = app
+        self.tracer: Tracer = tracer
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        traceparent = None
+        for name, value in scope["headers"]:
+            if name == b"traceparent":
+                traceparent = value
+                break
+        root = self.tracer.start(f'{scope["method"]} {scope["path"]}', traceparent)
+        if root is None:
+            return await self.app(scope, receive, send)
+
+        header = f"00-{root.trace.trace_id}-{root.span_id}-01".encode()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                root.set("status", message["status"])
+                message = {
+                    **message,
+                    "headers": list(message.get("headers", []))
+                    + [(b"traceparent", header)],
+                }
+            await send(message)
+
+        try:
+            with root:
+                return await self.app(scope, receive, send_wrapper)
+        finally:
+            self.tracer.finish(root)
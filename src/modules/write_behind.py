@@ -0,0 +1,294 @@
+import asyncio
+import inspect
+import time
+from collections import deque
+from contextlib import suppress
+from typing import Any, Callable, Optional
+
+from pymysql import err as mysql_errors
+
+from .attr_dict import AttrDict
+from .mysql_driver import (
+    LOCK_CONTENTION_ERRORS,
+    DatabaseUnavailableError,
+    MySQLDatabase,
+    StatementTimeoutError,
+    acquire_storage,
+)
+from .sharding import gather_all, shard_index
+
+# Updates of a batch: written, retried on the next flush and dropped, and the first error
+BatchOutcome = tuple[
+    list[tuple[int, Any]],
+    list[tuple[int, Any]],
+    list[tuple[int, Any]],
+    Optional[Exception],
+]
+
+
+def _transient(error: Exception) -> bool:
+    """
+    Check whether a failed write may succeed as is later, e.g. once the database is back.
+    Client side errors (2xxx) are lost or refused connections.
+    """
+    if isinstance(
+        error,
+        (
+            DatabaseUnavailableError,
+            StatementTimeoutError,
+            asyncio.TimeoutError,
+            mysql_errors.InterfaceError,
+        ),
+    ):
+        return True
+    code = error.args[0] if isinstance(error, mysql_errors.Error) and error.args else 0
+    return code in LOCK_CONTENTION_ERRORS or code >= 2000
+
+
+class WriteBehindBuffer:
+    """
+    Buffers updates of a single column by row ID and writes them in batches.
+    Updates of the same row are coalesced, the last accepted value wins.
+    Every `flush_interval` seconds the buffered updates are written with a single
+    `UPDATE ... CASE` statement per transaction and shard, at most `max_batch` rows each.
+    Accepted updates live in process memory only until flushed: they are lost if the worker dies,
+    a graceful `stop` flushes them. Failed batches are retried on the next flush
+    unless newer values were accepted meanwhile. Batches failing again for other reasons than
+    an unavailable database are bisected, so that a row failing on its own, e.g. with a value out
+    of the column range, is dropped and counted instead of holding back the rest of its shard.
+    Updates of nonexistent rows are dropped silently.
+    Writers of the whole row `discard` buffered updates first, so that a flush cannot revert them.
+    """
+
+    def __init__(
+        self,
+        database: MySQLDatabase,
+        table: str,
+        column: str,
+        flush_interval: float = 0.05,
+        max_pending: int = 100_000,
+        max_batch: int = 1000,
+        on_flush: Optional[Callable[[list[int]], Any]] = None,
+        latency_window: int = 1000,
+    ):
+        """
+        Initialize buffer.
+        :param database: Database configured with its shards.
+        :param table: Table name, must have an `id` column.
+        :param column: Updated column.
+        :param flush_interval: Seconds between flushes.
+        :param max_pending: Max number of buffered rows, further updates are rejected.
+        :param max_batch: Max number of rows written by a single statement.
+        :param on_flush: Called with the IDs of written rows after a flush, e.g. to invalidate caches,
+            awaited if it returns an awaitable.
+        :param latency_window: Number of recent flushes kept for latency percentiles.
+        """
+        self.database: MySQLDatabase = database
+        self.table: str = table
+        self.column: str = column
+        self.flush_interval: float = flush_interval
+        self.max_pending: int = max_pending
+        self.max_batch: int = max_batch
+        self.on_flush: Optional[Callable[[list[int]], Any]] = on_flush
+        self.pending: dict[int, Any] = {}
+        # Accepted updates coalesced into every buffered row
+        self.pending_updates: dict[int, int] = {}
+        # Acceptance time of the oldest buffered update
+        self.pending_since: Optional[float] = None
+        self.accepted: int = 0
+        self.written: int = 0
+        # Accepted updates covered by the written rows
+        self.flushed_updates: int = 0
+        self.flushes: int = 0
+        self.failures: int = 0
+        # Rows dropped after failing on their own
+        self.dropped: int = 0
+        # Buffered rows whose last write failed
+        self.failed: set[int] = set()
+        # Seconds from accepting the oldest update of a flush to its commit
+        self.latencies: deque[float] = deque(maxlen=latency_window)
+        self._lock: asyncio.Lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def submit(self, item_id: int, value: Any):
+        """
+        Buffer an update.
+        :param item_id: Row ID.
+        :param value: New column value.
+        """
+        if item_id not in self.pending and len(self.pending) >= self.max_pending:
+            raise DatabaseUnavailableError("Too many buffered updates")
+        if self.pending_since is None:
+            self.pending_since = time.perf_counter()
+        self.pending[item_id] = value
+        self.pending_updates[item_id] = self.pending_updates.get(item_id, 0) + 1
+        self.failed.discard(item_id)  # A new value gets a fresh start
+        self.accepted += 1
+
+    async def discard(self, item_id: int):
+        """
+        Drop the buffered update of a row, waiting for a running flush to write it first.
+        Called before writing the column otherwise, so that the stale value is not flushed later.
+        :param item_id: Row ID.
+        """
+        if item_id not in self.pending and not self._lock.locked():
+            return
+        async with self._lock:
+            self.pending.pop(item_id, None)
+            self.pending_updates.pop(item_id, None)
+            self.failed.discard(item_id)
+            if not self.pending:
+                self.pending_since = None
+
+    async def _write(self, shard: MySQLDatabase, batch: list[tuple[int, Any]]):
+        """
+        Write a batch of updates to a shard in a single statement.
+        :param shard: Shard holding the rows.
+        :param batch: Row ID and value pairs.
+        """
+        query = (
+            f"UPDATE {self.table} SET {self.column} = CASE id "  # nosec B608
+            f"{'WHEN %s THEN %s ' * len(batch)}END "
+            f"WHERE id IN ({', '.join(['%s'] * len(batch))})"
+        )
+        args = tuple(v for update in batch for v in update) + tuple(i for i, _ in batch)
+        async with acquire_storage(shard) as storage:
+            await storage.apply(query, args)
+
+    async def _write_batch(
+        self, shard: MySQLDatabase, batch: list[tuple[int, Any]]
+    ) -> BatchOutcome:
+        """
+        Write a batch of updates, bisecting it if its rows failed before.
+        :param shard: Shard holding the rows.
+        :param batch: Row ID and value pairs.
+        :return: Written, retried and dropped updates, and the first error.
+        """
+        try:
+            await self._write(shard, batch)
+            return batch, [], [], None
+        except Exception as e:  # pylint: disable=W0718
+            error = e
+        if _transient(error) or not any(i in self.failed for i, _ in batch):
+            return [], batch, [], error
+        if len(batch) == 1:
+            return [], [], batch, error
+        middle = len(batch) // 2
+        first, second = await gather_all(
+            self._write_batch(shard, batch[:middle]),
+            self._write_batch(shard, batch[middle:]),
+        )
+        return (
+            first[0] + second[0],
+            first[1] + second[1],
+            first[2] + second[2],
+            first[3] or second[3],
+        )
+
+    async def flush(self):
+        """
+        Write buffered updates.
+        """
+        async with self._lock:
+            if not self.pending:
+                return
+            updates, self.pending = self.pending, {}
+            counts, self.pending_updates = self.pending_updates, {}
+            since, self.pending_since = self.pending_since, None
+
+            shards = self.database.shards
+            batches: dict[int, list[tuple[int, Any]]] = {}
+            for update in updates.items():
+                batches.setdefault(shard_index(update[0], len(shards)), []).append(update)
+            outcomes = await gather_all(
+                *(
+                    self._write_batch(shards[index], batch[i : i + self.max_batch])
+                    for index, batch in batches.items()
+                    for i in range(0, len(batch), self.max_batch)
+                )
+            )
+            written = [update for outcome in outcomes for update in outcome[0]]
+            errors = [outcome[3] for outcome in outcomes if outcome[3]]
+            for _, retried, dropped, _ in outcomes:
+                # Retried on the next flush, newer values win, rewrites are idempotent
+                for item_id, value in retried:
+                    if item_id not in self.pending:
+                        self.pending[item_id] = value
+                        self.failed.add(item_id)
+                    self.pending_updates[item_id] = (
+                        self.pending_updates.get(item_id, 0) + counts[item_id]
+                    )
+                    self.pending_since = since
+                for item_id, _ in dropped:
+                    self.failed.discard(item_id)
+                self.dropped += len(dropped)
+            for item_id, _ in written:
+                self.failed.discard(item_id)
+
+            if errors:
+                self.failures += 1
+            if written:
+                self.flushes += 1
+                self.written += len(written)
+                self.flushed_updates += sum(counts[item_id] for item_id, _ in written)
+                self.latencies.append(time.perf_counter() - since)
+        if written and self.on_flush:
+            result = self.on_flush([item_id for item_id, _ in written])
+            if inspect.isawaitable(result):
+                await result
+        if errors:
+            raise errors[0]
+
+    def stats(self) -> AttrDict:
+        """
+        Summarize buffer activity.
+        :return: Counters, coalescing ratio and flush latency percentiles in milliseconds.
+        """
+        latencies = sorted(self.latencies)
+
+        def percentile(share: float) -> Optional[float]:
+            if not latencies:
+                return None
+            return round(latencies[int(share * (len(latencies) - 1))] * 1000, 3)
+
+        return AttrDict(
+            accepted=self.accepted,
+            written=self.written,
+            pending=len(self.pending),
+            flushes=self.flushes,
+            failures=self.failures,
+            dropped=self.dropped,
+            coalescing_ratio=(
+                round(self.flushed_updates / self.written, 3) if self.written else None
+            ),
+            latency_p50_ms=percentile(0.5),
+            latency_p99_ms=percentile(0.99),
+            latency_max_ms=percentile(1.0),
+        )
+
+    async def _flush_loop(self):
+        """
+        Flush buffered updates periodically.
+        """
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            with suppress(Exception):
+                await self.flush()
+
+    async def start(self):
+        """
+        Start flushing in the background.
+        """
+        self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        """
+        Stop background flushing and write the remaining updates.
+        """
+        if self._task:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+        with suppress(Exception):
+            await self.flush()
@@ -1,12 +1,28 @@
 from fastapi import FastAPI, HTTPException
-from fastapi.responses import ORJSONResponse as JSONResponse
+from fastapi.exceptions import RequestValidationError
 from pydantic import ValidationError
 
-from const import SETTINGS, STORAGE
+from const import (
+    BROKER,
+    CATALOG,
+    DESCRIPTION_COMPRESSOR,
+    ERROR_REPORTER,
+    PRICE_WRITER,
+    PRODUCT_CACHE,
+    PROFILER,
+    QUERY_GOVERNOR,
+    RESPONSE_CACHE,
+    SETTINGS,
+    STORAGE,
+    TRACER,
+)
 from generic import models as generic_models
+from modules import DatabaseUnavailableError, NegotiatedResponse
 from modules.error_handlers import (
+    database_unavailable_handler,
     error_500_handler,
     generic_error_handler,
+    request_validation_error_handler,
     validation_error_handler,
 )
 
@@ -17,16 +33,33 @@ app_: FastAPI = FastAPI(
     redoc_url=None if SETTINGS.disable_redoc_docs else "/redoc",
     title=SETTINGS.app.title,
     version=SETTINGS.app.version,
-    default_response_class=JSONResponse,
+    default_response_class=NegotiatedResponse,
     storage=STORAGE,
+    catalog=CATALOG,
+    broker=BROKER,
+    profiler=PROFILER,
+    tracer=TRACER,
+    price_writer=PRICE_WRITER,
+    description_compressor=DESCRIPTION_COMPRESSOR,
+    error_reporter=ERROR_REPORTER,
+    product_cache=PRODUCT_CACHE,
+    query_governor=QUERY_GOVERNOR,
+    response_cache=RESPONSE_CACHE,
+    admin_token=SETTINGS.admin.token,
 )
 
 app_.add_exception_handler(500, error_500_handler)
 app_.add_exception_handler(HTTPException, generic_error_handler)  # noqa
 app_.add_exception_handler(ValidationError, validation_error_handler)  # noqa
+app_.add_exception_handler(
+    RequestValidationError, request_validation_error_handler  # noqa
+)
+app_.add_exception_handler(DatabaseUnavailableError, database_unavailable_handler)  # noqa
 
 # -- ATTACH ROUTERS BELOW --
 app_.include_router(resources.products.ROUTER)
+app_.include_router(resources.imports.ROUTER)
+app_.include_router(resources.admin.ROUTER)
 
 
 @app_.get(
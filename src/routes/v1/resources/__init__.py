@@ -1 +1 @@
-from . import products
+from . import admin, imports, products
@@ -0,0 +1,114 @@
+from datetime import datetime
+from enum import Enum
+from typing import Any
+
+from pydantic import BaseModel, Field
+
+from generic import models as generic_models
+
+
+class ProfileKind(str, Enum):
+    PSTATS = 'pstats'
+    TRACEMALLOC = 'tracemalloc'
+
+
+class ProfileRequest(BaseModel):
+    path: str = Field(title='Request path to profile, e.g. /v1/products')
+    count: int = Field(default=1, ge=0, le=100, title='Number of requests, 0 to disarm')
+
+
+class Profile(BaseModel):
+    id: str = Field()
+    method: str = Field()
+    path: str = Field()
+    created_at: datetime = Field()
+    duration: float = Field(
+        title='Request duration in seconds, profiling overhead included'
+    )
+    top_allocations: list[str] = Field(
+        title='Source lines allocating most memory still held at the end of the request'
+    )
+
+
+class TraceSpan(BaseModel):
+    name: str = Field()
+    span_id: str = Field()
+    parent_id: str | None = Field(
+        title='Parent span ID, upstream span for the request span'
+    )
+    offset_ms: float = Field(title='Start relative to the request start')
+    duration_ms: float = Field()
+    attributes: dict[str, Any] = Field()
+
+
+class Trace(BaseModel):
+    trace_id: str = Field()
+    name: str = Field(title='Request method and path')
+    started_at: datetime = Field()
+    duration_ms: float = Field()
+    spans: list[TraceSpan] = Field(title='Spans in completion order')
+
+
+class TraceListResponse(generic_models.BaseResponse):
+    items: list[Trace] = Field(title='Recent sampled traces, newest first')
+
+
+class ProfileListResponse(generic_models.BaseResponse):
+    items: list[Profile] = Field(title='Captured profiles, oldest first')
+    armed: dict[str, int] = Field(
+        title='Paths armed for profiling and remaining requests'
+    )
+
+
+class WriteBehindStats(BaseModel):
+    accepted: int = Field(title='Updates accepted into the buffer')
+    written: int = Field(title='Rows written by flushes')
+    pending: int = Field(title='Rows waiting for the next flush')
+    flushes: int = Field()
+    failures: int = Field(title='Flushes with failed batches, their updates are retried')
+    dropped: int = Field(title='Rows dropped after failing to be written on their own')
+    coalescing_ratio: float | None = Field(
+        title='Flushed updates per written row, 1 when nothing was coalesced'
+    )
+    latency_p50_ms: float | None = Field(
+        title='Median time from accepting the oldest update of a flush to its commit'
+    )
+    latency_p99_ms: float | None = Field()
+    latency_max_ms: float | None = Field()
+
+
+class WriteBehindStatsResponse(generic_models.BaseResponse):
+    item: WriteBehindStats = Field()
+
+
+class QueryGovernorStats(BaseModel):
+    admitted: int = Field(title='Lists run with an exact count')
+    downgraded: int = Field(title='Lists run without an exact count')
+    rejected: int = Field(title='Lists rejected as too expensive')
+    timeouts: dict[str, int] = Field(
+        title='Statements interrupted by their time budget, by query class'
+    )
+    max_cost: int = Field(title='Max estimated rows a page may examine per shard')
+    max_count_cost: int = Field(
+        title='Max estimated rows an exact count may examine per shard'
+    )
+    table_rows: dict[str, int] = Field(title='Estimated rows per shard, by table')
+
+
+class QueryGovernorStatsResponse(generic_models.BaseResponse):
+    item: QueryGovernorStats = Field()
+
+
+class InternalError(BaseModel):
+    id: str = Field(title='Fingerprint reported to clients')
+    type: str = Field(title='Exception type')
+    message: str = Field(title='Message of the first occurrence')
+    count: int = Field(title='Occurrences')
+    first_seen: datetime = Field()
+    last_seen: datetime = Field()
+
+
+class InternalErrorListResponse(generic_models.BaseResponse):
+    items: list[InternalError] = Field(title='Internal errors, most frequent first')
+    reported: int = Field(title='Reported occurrences')
+    logged: int = Field(title='Occurrences logged with their traceback')
@@ -0,0 +1,215 @@
+import os
+
+from fastapi import APIRouter, Depends, HTTPException, Path, Query, Request
+from fastapi.responses import FileResponse
+
+from generic import dependencies as generic_deps
+from generic import models as generic_models
+from modules import (
+    ErrorReporter,
+    QueryGovernor,
+    RequestProfiler,
+    Tracer,
+    WriteBehindBuffer,
+)
+
+from . import models
+
+ROUTER = APIRouter(
+    prefix='/admin',
+    tags=['Admin'],
+    dependencies=[Depends(generic_deps.require_admin)],
+    responses={
+        403: {'model': generic_models.Error403Response, 'description': 'Forbidden'},
+    },
+)
+
+
+def get_profiler(request: Request) -> RequestProfiler:
+    """
+    Get request profiler.
+    :param request: FastAPI request.
+    :return: Request profiler.
+    """
+    profiler = request.app.extra.get('profiler')
+    if not profiler:
+        raise HTTPException(status_code=404, detail='Profiling is disabled')
+    return profiler
+
+
+def get_tracer(request: Request) -> Tracer:
+    """
+    Get tracer.
+    :param request: FastAPI request.
+    :return: Tracer.
+    """
+    tracer = request.app.extra.get('tracer')
+    if not tracer:
+        raise HTTPException(status_code=404, detail='Tracing is disabled')
+    return tracer
+
+
+def get_price_writer(request: Request) -> WriteBehindBuffer:
+    """
+    Get price update write-behind buffer.
+    :param request: FastAPI request.
+    :return: Write-behind buffer.
+    """
+    price_writer = request.app.extra.get('price_writer')
+    if not price_writer:
+        raise HTTPException(status_code=404, detail='Write-behind is disabled')
+    return price_writer
+
+
+def get_query_governor(request: Request) -> QueryGovernor:
+    """
+    Get query governor.
+    :param request: FastAPI request.
+    :return: Query governor.
+    """
+    governor = request.app.extra.get('query_governor')
+    if not governor:
+        raise HTTPException(status_code=404, detail='Query governor is disabled')
+    return governor
+
+
+def list_profiles(profiler: RequestProfiler) -> models.ProfileListResponse:
+    """
+    List captured profiles and armed paths.
+    :param profiler: Request profiler.
+    :return: Profile list.
+    """
+    return models.ProfileListResponse(
+        items=[models.Profile(**p) for p in profiler.profiles.values()],
+        armed=profiler.armed,
+    )
+
+
+@ROUTER.get(
+    '/profiles',
+    name='List Profiles',
+    description='List captured request profiles and paths armed for profiling',
+    responses={
+        200: {'model': models.ProfileListResponse, 'description': 'Success'},
+    },
+)
+async def _(profiler: RequestProfiler = Depends(get_profiler)):
+    return list_profiles(profiler)
+
+
+@ROUTER.post(
+    '/profiles',
+    name='Arm Profiling',
+    description='Profile the next requests to a path, '
+    'single requests can also be profiled by sending the admin token in the `X-Profile` header',
+    responses={
+        200: {'model': models.ProfileListResponse, 'description': 'Success'},
+    },
+)
+async def _(
+    data: models.ProfileRequest,
+    profiler: RequestProfiler = Depends(get_profiler),
+):
+    profiler.arm(data.path, data.count)
+    return list_profiles(profiler)
+
+
+@ROUTER.get(
+    '/profiles/{id}/{kind}',
+    name='Download Profile',
+    description='Download a cProfile `pstats` file (snakeviz, flameprof, gprof2dot) '
+    'or a `tracemalloc` snapshot (`tracemalloc.Snapshot.load`)',
+    response_class=FileResponse,
+    responses={
+        200: {'content': {'application/octet-stream': {}}, 'description': 'Success'},
+        404: {'model': generic_models.Error404Response, 'description': 'Not Found'},
+    },
+)
+async def _(
+    profile_id: str = Path(alias='id', title='Profile ID'),
+    kind: models.ProfileKind = Path(title='Profile file kind'),
+    profiler: RequestProfiler = Depends(get_profiler),
+):
+    if profile_id not in profiler.profiles:
+        raise HTTPException(status_code=404, detail='Profile not found')
+    path = profiler.path(profile_id, kind.value)
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail='Profile not found')
+    return FileResponse(path, filename=os.path.basename(path))
+
+
+@ROUTER.get(
+    '/traces',
+    name='List Traces',
+    description='List recent sampled request traces',
+    responses={
+        200: {'model': models.TraceListResponse, 'description': 'Success'},
+    },
+)
+async def _(
+    tracer: Tracer = Depends(get_tracer),
+    trace_id: str | None = Query(default=None, title='Trace ID filter'),
+    min_duration_ms: float = Query(default=0, title='Min request duration', ge=0),
+    limit: int = Query(default=100, title='Max number of traces', gt=0, le=1000),
+):
+    items = []
+    for trace in reversed(tracer.traces):
+        if len(items) >= limit:
+            break
+        if trace.duration_ms < min_duration_ms or (
+            trace_id and trace.trace_id != trace_id
+        ):
+            continue
+        items.append(models.Trace(**trace))
+    return models.TraceListResponse(items=items)
+
+
+@ROUTER.get(
+    '/write-behind',
+    name='Get Write-Behind Stats',
+    description='Buffered price update counters, coalescing ratio and flush latency',
+    responses={
+        200: {'model': models.WriteBehindStatsResponse, 'description': 'Success'},
+        404: {'model': generic_models.Error404Response, 'description': 'Not Found'},
+    },
+)
+async def _(price_writer: WriteBehindBuffer = Depends(get_price_writer)):
+    return models.WriteBehindStatsResponse(
+        item=models.WriteBehindStats(**price_writer.stats())
+    )
+
+
+@ROUTER.get(
+    '/query-governor',
+    name='Get Query Governor Stats',
+    description='Decisions of the query cost governor, statement timeouts and table size estimates',
+    responses={
+        200: {'model': models.QueryGovernorStatsResponse, 'description': 'Success'},
+        404: {'model': generic_models.Error404Response, 'description': 'Not Found'},
+    },
+)
+async def _(governor: QueryGovernor = Depends(get_query_governor)):
+    return models.QueryGovernorStatsResponse(
+        item=models.QueryGovernorStats(**governor.stats())
+    )
+
+
+@ROUTER.get(
+    '/errors',
+    name='List Internal Errors',
+    description='Internal errors by fingerprint, their tracebacks are in the logs',
+    responses={
+        200: {'model': models.InternalErrorListResponse, 'description': 'Success'},
+    },
+)
+async def _(
+    request: Request,
+    limit: int = Query(default=100, title='Max number of errors', gt=0, le=1000),
+):
+    reporter: ErrorReporter = request.app.extra['error_reporter']
+    errors = sorted(reporter.errors.values(), key=lambda e: e['count'], reverse=True)
+    return models.InternalErrorListResponse(
+        items=[models.InternalError(**e) for e in errors[:limit]],
+        reported=reporter.reported,
+        logged=reporter.logged,
+    )
@@ -0,0 +1,287 @@
+import asyncio
+import csv
+import json
+import os
+from contextlib import suppress
+from typing import Any, BinaryIO, Iterator, Optional
+
+from pydantic import ValidationError
+
+from modules import AttrDict, EventBroker, MySQLDatabase, MySQLStorage, ResponseCache
+
+from ..products.models import Product, ProductEventType, ProductRequest
+from .models import ImportFormat
+
+_RUNNING_JOBS: set = set()  # Strong references to running jobs
+
+
+def _undecodable(value: Any) -> bool:
+    """
+    Check for bytes that were not valid UTF-8, kept as surrogates.
+    :param value: Decoded CSV field.
+    :return: True if the field holds undecodable bytes.
+    """
+    if isinstance(value, list):  # Extra fields of a row longer than the header
+        return any(map(_undecodable, value))
+    return isinstance(value, str) and any('\udc80' <= c <= '\udcff' for c in value)
+
+
+def _error_message(exc: Exception) -> str:
+    """
+    Format row validation error.
+    :param exc: Validation or decoding error.
+    :return: Error message.
+    """
+    if isinstance(exc, ValidationError):
+        return '; '.join(
+            f"{'.'.join(map(str, e['loc'])) or 'row'}: {e['msg']}" for e in exc.errors()
+        )
+    return str(exc)
+
+
+class ProductImportJob:
+    """
+    Imports products from an uploaded CSV/NDJSON file in the background.
+    Rows are validated against `ProductRequest` in chunks off the event loop,
+    valid rows are written to `product_import_rows` with multi-row inserts
+    and merged into `products` in transactions of up to `CHUNK_SIZE` rows, each bounded by the
+    query timeout, so that no long transaction holds back concurrent inserts or the change feed.
+    A failed import keeps the chunks merged before, counted in `imported_rows`.
+    Invalid rows, including undecodable and malformed ones, are counted and the first
+    `MAX_STORED_ERRORS` of them are kept for the status endpoint.
+    Once a chunk is merged the response cache is invalidated and `created` events are published
+    with the IDs returned by `INSERT ... RETURNING` (MariaDB 10.5+).
+    """
+
+    CHUNK_SIZE = 1000
+    MAX_STORED_ERRORS = 1000
+
+    def __init__(
+        self,
+        import_id: int,
+        path: str,
+        file_format: ImportFormat,
+        database: MySQLDatabase,
+        broker: Optional[EventBroker] = None,
+        response_cache: Optional[ResponseCache] = None,
+    ):
+        """
+        Initialize job.
+        :param import_id: ID of the `product_imports` row.
+        :param path: Path of the uploaded file, removed once the job finishes.
+        :param file_format: Uploaded file format.
+        :param database: Database to acquire the job connection from.
+        :param broker: Broker to publish `created` events of imported products to.
+        :param response_cache: Response cache to invalidate once products are imported.
+        """
+        self.import_id: int = import_id
+        self.path: str = path
+        self.file_format: ImportFormat = file_format
+        self.database: MySQLDatabase = database
+        self.broker: Optional[EventBroker] = broker
+        self.response_cache: Optional[ResponseCache] = response_cache
+        self.row_no: int = 0
+        self._file: Optional[BinaryIO] = None
+        self._records: Optional[Iterator[Any]] = None
+
+    def start(self) -> asyncio.Task:
+        """
+        Run the job in the background.
+        :return: Job task.
+        """
+        task = asyncio.create_task(self.run())
+        _RUNNING_JOBS.add(task)
+        task.add_done_callback(_RUNNING_JOBS.discard)
+        return task
+
+    def _open(self):
+        """
+        Open the uploaded file and create a record iterator.
+        Lines are decoded one by one, so that invalid UTF-8 fails its row only:
+        CSV lines keep undecodable bytes as surrogates, NDJSON lines are decoded by `json.loads`.
+        """
+        self._file = open(self.path, 'rb')
+        if self.file_format == ImportFormat.CSV:
+            lines = (line.decode('utf-8', 'surrogateescape') for line in self._file)
+            self._records = iter(csv.DictReader(lines))
+        else:
+            self._records = (line for line in self._file if line.strip())
+
+    def _read_chunk(self) -> list[Any]:
+        """
+        Read the next chunk of records, malformed ones are replaced by their parsing error.
+        :return: Records or errors.
+        """
+        chunk = []
+        while len(chunk) < self.CHUNK_SIZE:
+            try:
+                chunk.append(next(self._records))
+            except StopIteration:
+                break
+            except csv.Error as e:
+                chunk.append(e)
+        return chunk
+
+    def _validate_chunk(self) -> tuple[list[tuple], list[tuple], int]:
+        """
+        Read and validate the next chunk of records, runs in a worker thread.
+        :return: Staging rows, error rows and the number of records read.
+        """
+        valid, errors = [], []
+        chunk = self._read_chunk()
+        for record in chunk:
+            self.row_no += 1
+            try:
+                if isinstance(record, csv.Error):
+                    raise ValueError(f'Malformed CSV: {record}')
+                if self.file_format == ImportFormat.CSV:
+                    data = {k: v or None for k, v in record.items() if k is not None}
+                    if any(_undecodable(v) for v in data.values()):
+                        raise ValueError('Invalid UTF-8')
+                else:
+                    data = json.loads(record)
+                item = ProductRequest.model_validate(data)
+            except (ValidationError, ValueError) as e:
+                errors.append((self.import_id, self.row_no, _error_message(e)[:500]))
+                continue
+            valid.append(
+                (
+                    self.import_id,
+                    self.row_no,
+                    item.name,
+                    item.description,
+                    item.price,
+                    str(item.image_url) if item.image_url else None,
+                )
+            )
+        return valid, errors, len(chunk)
+
+    async def _load(self, storage: MySQLStorage):
+        """
+        Validate, stage and merge the uploaded rows.
+        :param storage: MySQLStorage instance.
+        """
+        await storage.apply(
+            "UPDATE product_imports SET status = 'validating', started_at = NOW(6) WHERE id = %s",
+            self.import_id,
+        )
+        await asyncio.to_thread(self._open)
+
+        stored_errors = 0
+        while True:
+            valid, errors, count = await asyncio.to_thread(self._validate_chunk)
+            if not count:
+                break
+
+            if valid:
+                await storage.apply_batch(
+                    'INSERT INTO product_import_rows '
+                    '(import_id, row_no, name, description, price, image_url) '
+                    'VALUES (%s, %s, %s, %s, %s, %s)',
+                    valid,
+                )
+            kept_errors = errors[: max(self.MAX_STORED_ERRORS - stored_errors, 0)]
+            if kept_errors:
+                await storage.apply_batch(
+                    'INSERT INTO product_import_errors (import_id, row_no, message) '
+                    'VALUES (%s, %s, %s)',
+                    kept_errors,
+                )
+                stored_errors += len(kept_errors)
+            await storage.apply(
+                'UPDATE product_imports SET total_rows = total_rows + %s, '
+                'valid_rows = valid_rows + %s, failed_rows = failed_rows + %s WHERE id = %s',
+                (count, len(valid), len(errors), self.import_id),
+            )
+
+        await storage.apply(
+            "UPDATE product_imports SET status = 'loading' WHERE id = %s", self.import_id
+        )
+        for first_row in range(1, self.row_no + 1, self.CHUNK_SIZE):
+            last_row = first_row + self.CHUNK_SIZE - 1
+            products = await storage.apply_many(
+                [
+                    (
+                        'UPDATE product_imports SET imported_rows = imported_rows + '
+                        '(SELECT COUNT(*) FROM product_import_rows '
+                        'WHERE import_id = %s AND row_no BETWEEN %s AND %s) WHERE id = %s',
+                        (self.import_id, first_row, last_row, self.import_id),
+                    ),
+                    # Last, so that the imported products are returned
+                    (
+                        'INSERT INTO products (name, description, price, image_url) '
+                        'SELECT name, description, price, image_url FROM product_import_rows '
+                        'WHERE import_id = %s AND row_no BETWEEN %s AND %s ORDER BY row_no '
+                        'RETURNING id, name, description, price, image_url',
+                        (self.import_id, first_row, last_row),
+                    ),
+                ],
+                fetch_all=True,
+            )
+            if products:
+                await self._announce(products)
+        await storage.apply_many(
+            [
+                (
+                    "UPDATE product_imports SET status = 'completed', finished_at = NOW(6) "
+                    'WHERE id = %s',
+                    self.import_id,
+                ),
+                ('DELETE FROM product_import_rows WHERE import_id = %s', self.import_id),
+            ]
+        )
+
+    async def _announce(self, products: list[AttrDict]):
+        """
+        Invalidate cached responses and publish `created` events of imported products.
+        :param products: Imported products.
+        """
+        if self.response_cache:
+            self.response_cache.invalidate()
+        if not self.broker:
+            return
+        for product in products:
+            await self.broker.publish(
+                ProductEventType.CREATED.value, Product(**product).model_dump(mode='json')
+            )
+
+    async def _fail(self, error: Exception):
+        """
+        Mark the import failed and drop its staged rows, on a fresh pool connection,
+        since the error may have been the loss of the job connection.
+        :param error: Error the job failed with.
+        """
+        async with self.database.pool.acquire() as connection:
+            await MySQLStorage(
+                connection, query_timeout=self.database.query_timeout
+            ).apply_many(
+                [
+                    (
+                        "UPDATE product_imports SET status = 'failed', message = %s, "
+                        'finished_at = NOW(6) WHERE id = %s',
+                        (str(error)[:250] or type(error).__name__, self.import_id),
+                    ),
+                    (
+                        'DELETE FROM product_import_rows WHERE import_id = %s',
+                        self.import_id,
+                    ),
+                ]
+            )
+
+    async def run(self):
+        """
+        Run the job on a dedicated pool connection, marking the import failed on any error.
+        """
+        try:
+            async with self.database.pool.acquire() as connection:
+                storage = MySQLStorage(
+                    connection, query_timeout=self.database.query_timeout
+                )
+                await self._load(storage)
+        except Exception as e:  # pylint: disable=W0718
+            await self._fail(e)
+        finally:
+            if self._file:
+                self._file.close()
+            with suppress(OSError):
+                os.remove(self.path)
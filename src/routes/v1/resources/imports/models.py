@@ -0,0 +1,46 @@
+from datetime import datetime
+from enum import Enum
+
+from pydantic import BaseModel, Field
+
+from generic import models as generic_models
+
+
+class ImportFormat(str, Enum):
+    CSV = 'csv'
+    NDJSON = 'ndjson'
+
+
+class ImportStatus(str, Enum):
+    PENDING = 'pending'
+    VALIDATING = 'validating'
+    LOADING = 'loading'
+    COMPLETED = 'completed'
+    FAILED = 'failed'
+
+
+class ImportRowError(BaseModel):
+    row_no: int = Field(title='1-based data row number')
+    message: str = Field(title='Validation error')
+
+
+class ProductImport(BaseModel):
+    id: int = Field()
+    status: ImportStatus = Field()
+    format: ImportFormat = Field()
+    total_rows: int = Field(title='Number of rows read so far')
+    valid_rows: int = Field(title='Number of rows that passed validation')
+    failed_rows: int = Field(title='Number of rows that failed validation')
+    imported_rows: int = Field(title='Number of rows merged into products')
+    rows_per_second: float | None = Field(default=None, title='Processing throughput')
+    message: str | None = Field(default=None, title='Failure reason')
+    created_at: datetime = Field()
+    started_at: datetime | None = Field(default=None)
+    finished_at: datetime | None = Field(default=None)
+    errors: list[ImportRowError] = Field(
+        default=[], title='Per-row errors, only the first ones are kept'
+    )
+
+
+class ProductImportResponse(generic_models.BaseResponse):
+    item: ProductImport = Field(title='Import')
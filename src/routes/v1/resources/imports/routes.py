@@ -0,0 +1,136 @@
+import os
+import tempfile
+from datetime import datetime
+
+from fastapi import APIRouter, Depends, HTTPException, Path, Query, Request
+from fastapi.concurrency import run_in_threadpool
+
+from generic import dependencies as generic_deps
+from generic import models as generic_models
+from modules import MySQLStorage
+
+from . import models
+from .jobs import ProductImportJob
+
+ROUTER = APIRouter(prefix='/imports', tags=['Imports'])
+
+MAX_UPLOAD_BYTES = 1 << 30  # 1 GiB
+MAX_LISTED_ERRORS = 100
+
+
+async def require_unsharded(request: Request):
+    """
+    Reject imports into sharded storage, the final merge is a single-database transaction.
+    Declared before `save_upload` so that nothing is uploaded in vain.
+    :param request: FastAPI request.
+    """
+    if len(request.app.extra['storage'].shards) > 1:
+        raise HTTPException(
+            status_code=501, detail='Imports are not supported with sharded storage'
+        )
+
+
+async def save_upload(request: Request) -> str:
+    """
+    Stream request body into a temporary file, written off the event loop.
+    Declared before `get_storage` so that no pool connection is held during the upload.
+    :param request: FastAPI request.
+    :return: Temporary file path.
+    """
+    size = 0
+    with tempfile.NamedTemporaryFile(prefix='import-', delete=False) as file:
+        try:
+            async for chunk in request.stream():
+                size += len(chunk)
+                if size > MAX_UPLOAD_BYTES:
+                    raise HTTPException(
+                        status_code=413, detail='Uploaded file is too large'
+                    )
+                await run_in_threadpool(file.write, chunk)
+        except BaseException:
+            file.close()
+            os.remove(file.name)
+            raise
+    return file.name
+
+
+async def get_import(storage: MySQLStorage, import_id: int) -> models.ProductImport:
+    """
+    Get import status with throughput and the first per-row errors.
+    :param storage: MySQLStorage instance.
+    :param import_id: Import ID.
+    :return: Import.
+    """
+    item = await storage.get(
+        'SELECT id, status, format, total_rows, valid_rows, failed_rows, imported_rows, '
+        'message, created_at, started_at, finished_at FROM product_imports WHERE id = %s',
+        import_id,
+    )
+    if not item:
+        raise HTTPException(status_code=404, detail='Import not found')
+
+    if item.started_at:
+        elapsed = ((item.finished_at or datetime.now()) - item.started_at).total_seconds()
+        item.rows_per_second = (
+            round(item.total_rows / elapsed, 2) if elapsed > 0 else None
+        )
+    item.errors = await storage.get(
+        'SELECT row_no, message FROM product_import_errors WHERE import_id = %s '
+        'ORDER BY row_no LIMIT %s',
+        (import_id, MAX_LISTED_ERRORS),
+        fetch_all=True,
+    )
+    return models.ProductImport(**item)
+
+
+@ROUTER.post(
+    '',
+    name='Create Import',
+    description='Upload a CSV (with a header row) or NDJSON file of products to import in the background',
+    responses={
+        202: {'model': models.ProductImportResponse, 'description': 'Accepted'},
+    },
+    status_code=202,
+)
+async def _(
+    request: Request,
+    file_format: models.ImportFormat = Query(
+        default=models.ImportFormat.CSV, alias='format', title='Uploaded file format'
+    ),
+    _: None = Depends(require_unsharded),
+    path: str = Depends(save_upload),
+    storage: MySQLStorage = Depends(generic_deps.get_storage),
+):
+    try:
+        import_id = await storage.apply(
+            'INSERT INTO product_imports (format) VALUES (%s)', file_format.value
+        )
+    except BaseException:
+        os.remove(path)
+        raise
+
+    ProductImportJob(
+        import_id,
+        path,
+        file_format,
+        request.app.extra['storage'],
+        broker=request.app.extra['broker'],
+        response_cache=request.app.extra.get('response_cache'),
+    ).start()
+    return models.ProductImportResponse(item=await get_import(storage, import_id))
+
+
+@ROUTER.get(
+    '/{id}',
+    name='Get Import',
+    description='Get import status, progress, throughput and per-row errors',
+    responses={
+        200: {'model': models.ProductImportResponse, 'description': 'Success'},
+        404: {'model': generic_models.Error404Response, 'description': 'Not Found'},
+    },
+)
+async def _(
+    import_id: int = Path(alias='id', title='Import ID', gt=0),
+    storage: MySQLStorage = Depends(generic_deps.get_storage),
+):
+    return models.ProductImportResponse(item=await get_import(storage, import_id))
@@ -1,6 +1,10 @@
-from pydantic import AnyUrl, BaseModel, Field
+from datetime import datetime
+from enum import Enum
+
+from pydantic import AnyUrl, BaseModel, Field, model_validator
 
 from generic import models as generic_models
+from modules import inflate
 
 
 class ProductRequest(BaseModel):
@@ -8,11 +12,29 @@ class ProductRequest(BaseModel):
     description: str = Field(
         min_length=10, max_length=65_535
     )  # In accordance with https://mariadb.com/kb/en/text/
-    price: float = Field(gt=0)
+    price: float = Field(gt=0, allow_inf_nan=False)
     image_url: AnyUrl | None = Field(default=None, max_length=250)
 
 
-class Product(ProductRequest):
+class StoredDescription(BaseModel):
+    """
+    Model read from `products` rows, whose descriptions may be compressed.
+    """
+
+    @model_validator(mode='before')
+    @classmethod
+    def _(cls, data):
+        """
+        Inflates `description_compressed` into `description`.
+        :param data: Object values.
+        :return: Object values with a plain description.
+        """
+        if isinstance(data, dict) and data.get('description_compressed') is not None:
+            data = {**data, 'description': inflate(data['description_compressed'])}
+        return data
+
+
+class Product(ProductRequest, StoredDescription):
     id: int = Field()
 
 
@@ -22,3 +44,68 @@ class ProductResponse(generic_models.BaseResponse):
 
 class ProductListResponse(generic_models.BasePaginatedResponse):
     items: list[Product] = Field(title='Products')
+
+
+class ProductBatchRequest(BaseModel):
+    items: list[ProductRequest] = Field(min_length=1, max_length=100, title='Products')
+
+
+class ProductBatchResponse(generic_models.BaseResponse):
+    items: list[Product] = Field(title='Products')
+
+
+class ProductPriceRequest(BaseModel):
+    price: float = Field(gt=0, allow_inf_nan=False)
+
+
+class ProductPrice(ProductPriceRequest):
+    id: int = Field()
+
+
+class ProductPriceResponse(generic_models.BaseResponse):
+    item: ProductPrice = Field(title='Product price')
+
+
+class ProductChange(StoredDescription):
+    id: int = Field()
+    deleted: bool = Field(title='Whether the product was deleted')
+    updated_at: datetime = Field(title='Modification time')
+    name: str | None = Field(default=None)
+    description: str | None = Field(default=None)
+    price: float | None = Field(default=None)
+    image_url: AnyUrl | None = Field(default=None)
+
+
+class ProductChangesResponse(generic_models.BaseResponse):
+    items: list[ProductChange] = Field(title='Changed products in modification order')
+    cursor: str | None = Field(
+        title='Cursor to pass as `since` to continue after the last item'
+    )
+    has_more: bool = Field(title='Whether more changes are immediately available')
+
+
+class ProductEventType(str, Enum):
+    CREATED = 'created'
+    UPDATED = 'updated'
+    DELETED = 'deleted'
+    PRICE_UPDATED = 'price_updated'
+
+
+class PriceBucket(BaseModel):
+    lower: float | None = Field(title='Inclusive lower bound, none for unbounded')
+    upper: float | None = Field(
+        title='Exclusive upper bound (inclusive for the last equal-width bucket), none for unbounded'
+    )
+    count: int = Field(title='Number of products in the bucket')
+
+
+class ProductFacets(BaseModel):
+    total: int = Field(title='Number of matching products')
+    min_price: float | None = Field(title='Lowest price')
+    max_price: float | None = Field(title='Highest price')
+    avg_price: float | None = Field(title='Average price')
+    price_histogram: list[PriceBucket] = Field(title='Price histogram')
+
+
+class ProductFacetsResponse(generic_models.BaseResponse):
+    item: ProductFacets = Field(title='Facets')
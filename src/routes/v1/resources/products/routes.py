@@ -1,154 +1,502 @@
-from fastapi import APIRouter, Depends, HTTPException, Path, Query
+import asyncio
+import base64
+import binascii
+from contextlib import AsyncExitStack
+from datetime import datetime
+from itertools import chain
+from typing import AsyncIterator
+
+import orjson
+from fastapi import (
+    APIRouter,
+    Depends,
+    Header,
+    HTTPException,
+    Path,
+    Query,
+    Request,
+    Response,
+)
+from fastapi.responses import StreamingResponse
 
 from generic import dependencies as generic_deps
 from generic import models as generic_models
-from modules import MySQLStorage, SQLQueryUtil
+from generic.resources import Filter, Resource
+from modules import (
+    AttrDict,
+    EventBroker,
+    MySQLDatabase,
+    PreparedQuery,
+    QueryGovernor,
+    ShardedStorage,
+    StatementTimeoutError,
+)
+from modules.event_broker import RESET
+from modules.mysql_driver import acquire_storage
 
 from . import models
 
 ROUTER = APIRouter(prefix='/products', tags=['Products'])
 
+# Time changes are held back from the feed on top of open transactions, which
+# `information_schema.innodb_trx` lists up to 0.1 s late, see `SELECT_CHANGES`
+CHANGES_VISIBILITY_LAG_MICROSECONDS = 1_000_000
 
-@ROUTER.get(
-    '',
-    name='List Products',
-    description='List all products',
-    responses={
-        200: {'model': models.ProductListResponse, 'description': 'Success'},
-    },
-)
-async def _(
-    storage: MySQLStorage = Depends(generic_deps.get_storage),
-    id_: int | None = Query(default=None, alias='id', gt=0, title='ID filter'),
-    id_in: list[int] | None = Query(default=None, min_length=1, title='ID list filter'),
-    name: str | None = Query(default=None, title='Name filter'),
-    name_in: list[str] | None = Query(
-        default=None, min_length=1, title='Name list filter'
-    ),
-    name_like: str | None = Query(default=None, title='Name alike filter'),
-    price_lt: float | None = Query(default=None, title='Price less filter', gt=0),
-    price_gt: float | None = Query(default=None, title='Price greater filter', ge=0),
-    price_le: float | None = Query(default=None, title='Price less equal filter', gt=0),
-    price_ge: float | None = Query(
-        default=None, title='Price greater equal filter', gt=0
-    ),
-    page: int = Query(default=1, title='Page number', gt=0),
-    items_per_page: int = Query(
-        default=100, title='Number of items per page', gt=0, le=1000
-    ),
+# Max number of products whose written prices are read back by a single statement
+SELECT_PRICES_BATCH = 1000
+
+# Comment lines sent on idle streams so that proxies keep the connection open
+STREAM_HEARTBEAT_SECONDS = 15
+STREAM_RETRY_MILLISECONDS = 3000
+
+# Fixed statements beyond the generated CRUD ones, executed as server-side
+# prepared statements when enabled
+UPDATE_PRODUCT_PRICE = PreparedQuery('UPDATE products SET price = %s WHERE id = %s')
+# Rows take their `updated_at` when a statement runs, not when its transaction commits,
+# so the feed stops short of the oldest open transaction, which may still commit earlier
+# changes than the ones already visible. Reading `innodb_trx` needs the PROCESS privilege.
+SELECT_CHANGES = PreparedQuery('''
+    SELECT * FROM (
+        SELECT id, name, description, description_compressed, price, image_url,
+            updated_at, 0 AS deleted
+        FROM products
+        WHERE (updated_at > %(updated_at)s OR (updated_at = %(updated_at)s AND id > %(id)s))
+            AND updated_at <= NOW(6) - INTERVAL %(lag)s MICROSECOND
+            AND updated_at < COALESCE(
+                (SELECT MIN(trx_started) FROM information_schema.innodb_trx), NOW(6)
+            )
+        ORDER BY updated_at, id
+        LIMIT %(limit)s
+    ) AS changed
+    UNION ALL
+    SELECT * FROM (
+        SELECT id, NULL, NULL, NULL, NULL, NULL, deleted_at, 1
+        FROM product_tombstones
+        WHERE (deleted_at > %(updated_at)s OR (deleted_at = %(updated_at)s AND id > %(id)s))
+            AND deleted_at <= NOW(6) - INTERVAL %(lag)s MICROSECOND
+            AND deleted_at < COALESCE(
+                (SELECT MIN(trx_started) FROM information_schema.innodb_trx), NOW(6)
+            )
+        ORDER BY deleted_at, id
+        LIMIT %(limit)s
+    ) AS deleted
+    ORDER BY updated_at, id
+    LIMIT %(limit)s
+    ''')
+
+
+def _encode_cursor(updated_at: datetime, item_id: int) -> str:
+    """
+    Encode change feed position into an opaque cursor.
+    :param updated_at: Modification time of the last seen change.
+    :param item_id: ID of the last seen change.
+    :return: Cursor.
+    """
+    return base64.urlsafe_b64encode(
+        f'{updated_at.isoformat()}|{item_id}'.encode()
+    ).decode()
+
+
+def _decode_cursor(cursor: str) -> tuple[datetime, int]:
+    """
+    Decode change feed position from a cursor.
+    :param cursor: Cursor produced by `_encode_cursor`.
+    :return: Modification time and ID of the last seen change.
+    """
+    try:
+        updated_at, item_id = base64.urlsafe_b64decode(cursor).decode().split('|')
+        return datetime.fromisoformat(updated_at), int(item_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(status_code=400, detail='Invalid cursor')
+
+
+async def product_events(
+    broker: EventBroker,
+    id_in: list[int] | None = None,
+    event_types: list[models.ProductEventType] | None = None,
+    last_event_id: int | None = None,
+) -> AsyncIterator[str]:
+    """
+    Format product events as a server-sent events stream.
+    :param broker: Event broker.
+    :param id_in: Product IDs to receive events of, None for all.
+    :param event_types: Event types to receive, None for all.
+    :param last_event_id: ID of the last received event to resume after.
+    :return: Stream chunks.
+    """
+    async with broker.subscribe(last_event_id) as events:
+        yield f'retry: {STREAM_RETRY_MILLISECONDS}\n\n'
+        while True:
+            try:
+                event = await asyncio.wait_for(events.get(), STREAM_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield ': keep-alive\n\n'
+                continue
+
+            if event is RESET:
+                # Events were lost, the client has to resync, e.g. from `/products/changes`
+                yield 'event: reset\ndata: {}\n\n'
+                return
+            if (event_types and event.type not in event_types) or (
+                id_in and event.data['id'] not in id_in
+            ):
+                continue
+            yield (
+                f'id: {event.id}\nevent: {event.type}\n'
+                f'data: {orjson.dumps(event.data).decode()}\n\n'
+            )
+
+
+async def publish_price_updates(
+    broker: EventBroker, database: MySQLDatabase, product_ids: list[int]
 ):
-    query, args, total_pages = await SQLQueryUtil.apply_query_filters(
-        'SELECT id, name, description, price, image_url FROM products',
-        {
-            'id': id_,
-            'id_in': id_in,
-            'name': name,
-            'name_in': name_in,
-            'name_like': name_like,
-            'price_lt': price_lt,
-            'price_gt': price_gt,
-            'price_le': price_le,
-            'price_ge': price_ge,
-        },
-        storage,
-        page,
-        items_per_page,
+    """
+    Publish `price_updated` events for prices written by the write-behind buffer.
+    Prices are read back, so that updates of nonexistent products are not announced.
+    :param broker: Event broker.
+    :param database: Database configured with its shards.
+    :param product_ids: IDs of written products.
+    """
+    async with AsyncExitStack() as stack:
+        shards = ShardedStorage(database, acquire_storage, stack)
+        for i in range(0, len(product_ids), SELECT_PRICES_BATCH):
+            batch = tuple(product_ids[i : i + SELECT_PRICES_BATCH])
+            rows = await shards.gather(
+                f'SELECT id, price FROM products WHERE id IN ({", ".join(["%s"] * len(batch))})',  # nosec B608
+                batch,
+            )
+            for row in chain.from_iterable(rows):
+                await broker.publish(
+                    models.ProductEventType.PRICE_UPDATED.value,
+                    models.ProductPrice(id=row.id, price=row.price).model_dump(
+                        mode='json'
+                    ),
+                )
+
+
+def _interval_bucket_expr(edges: list[float], args: dict) -> str:
+    """
+    Build a bucket index expression for ascending price bucket edges.
+    :param edges: Ascending bucket edges.
+    :param args: Query arguments to add the edges to.
+    :return: SQL expression.
+    """
+    if not edges:
+        return '0'
+    args.update({f'edge_{i}': edge for i, edge in enumerate(edges)})
+    # INTERVAL() returns the index of the first edge greater than the price
+    return 'INTERVAL(price, %s)' % ', '.join(  # nosec B608
+        f'%(edge_{i})s' for i in range(len(edges))
     )
 
-    return models.ProductListResponse(
-        items=[models.Product(**i) async for i in storage.select(query, args)],
-        page=page,
-        items_per_page=items_per_page,
-        total_pages=total_pages,
+
+def _merge_facet_rows(results: list[list[AttrDict]]) -> list[AttrDict]:
+    """
+    Merge bucket rows aggregated by several shards.
+    :param results: Bucket rows followed by the rollup row, per shard.
+    :return: Merged bucket rows followed by the merged rollup row.
+    """
+    merged: dict[int | None, AttrDict] = {}
+    for row in chain.from_iterable(results):
+        current = merged.get(row.bucket)
+        if current is None:
+            merged[row.bucket] = AttrDict(row)
+            continue
+        count = current['count'] + row['count']
+        current.avg_price = (
+            current.avg_price * current['count'] + row.avg_price * row['count']
+        ) / count
+        current.min_price = min(current.min_price, row.min_price)
+        current.max_price = max(current.max_price, row.max_price)
+        current['count'] = count
+
+    totals = merged.pop(None, None)  # Rollup rows have a NULL bucket
+    return [*sorted(merged.values(), key=lambda r: r.bucket), totals] if totals else []
+
+
+def pack_description(request: Request, description: str) -> tuple[str, bytes | None]:
+    """
+    Encode a description for storage, compressed when enabled.
+    :param request: FastAPI request.
+    :param description: Product description.
+    :return: Values of the `description` and `description_compressed` columns.
+    """
+    compressor = request.app.extra.get('description_compressor')
+    return compressor.compress(description) if compressor else (description, None)
+
+
+def encode_product(request: Request, values: dict) -> dict:
+    """
+    Convert a dumped product request into column values.
+    :param request: FastAPI request.
+    :param values: Product request values.
+    :return: Column values.
+    """
+    values['description'], values['description_compressed'] = pack_description(
+        request, values['description']
     )
+    return values
+
+
+PRODUCTS = Resource(
+    name='Product',
+    table='products',
+    columns=('name', 'description', 'description_compressed', 'price', 'image_url'),
+    model=models.Product,
+    request_model=models.ProductRequest,
+    response_model=models.ProductResponse,
+    list_response_model=models.ProductListResponse,
+    batch_request_model=models.ProductBatchRequest,
+    batch_response_model=models.ProductBatchResponse,
+    filters=(
+        Filter('id', int, ('eq', 'in'), title='ID', gt=0),
+        Filter('name', str, ('eq', 'in', 'like')),
+        Filter(
+            'price',
+            float,
+            ('lt', 'gt', 'le', 'ge'),
+            constraints={
+                'lt': {'gt': 0},
+                'gt': {'ge': 0},
+                'le': {'gt': 0},
+                'ge': {'gt': 0},
+            },
+        ),
+    ),
+    sortable=('id', 'name', 'price'),
+    tombstones_table='product_tombstones',
+    encode=encode_product,
+    catalog='catalog',
+    cache='product_cache',
+    governor='query_governor',
+    writers=('price_writer',),
+    events=True,
+)
 
 
 @ROUTER.get(
-    '/{id}',
-    name='Get Product',
-    description='Get a single product',
+    '/changes',
+    name='List Product Changes',
+    description='List products created, updated or deleted since the given cursor. '
+    'Changes are listed once older than the database query timeout plus one second',
     responses={
-        200: {'model': models.ProductResponse, 'description': 'Success'},
-        404: {'model': generic_models.Error404Response, 'description': 'Not Found'},
+        200: {'model': models.ProductChangesResponse, 'description': 'Success'},
     },
 )
 async def _(
-    product_id: int = Path(alias='id', title='Product ID', gt=0),
-    storage: MySQLStorage = Depends(generic_deps.get_storage),
+    shards: ShardedStorage = Depends(generic_deps.get_shards),
+    since: str | None = Query(
+        default=None, title='Cursor returned by the previous call, omit to start over'
+    ),
+    limit: int = Query(default=1000, title='Max number of changes', gt=0, le=10_000),
 ):
-    item = await storage.get(
-        'SELECT id, name, description, price, image_url FROM products WHERE id = %s',
-        product_id,
+    updated_at, item_id = _decode_cursor(since) if since else (datetime(1970, 1, 1), 0)
+    args = {
+        'updated_at': updated_at,
+        'id': item_id,
+        'lag': CHANGES_VISIBILITY_LAG_MICROSECONDS,
+        'limit': limit + 1,
+    }
+    items = [
+        models.ProductChange(**i)
+        for i in await shards.merge(
+            SELECT_CHANGES,
+            args,
+            key=lambda i: (i.updated_at, i.id),
+            limit=limit + 1,
+        )
+    ]
+
+    has_more = len(items) > limit
+    items = items[:limit]
+    return models.ProductChangesResponse(
+        items=items,
+        cursor=_encode_cursor(items[-1].updated_at, items[-1].id) if items else since,
+        has_more=has_more,
     )
-    if not item:
-        raise HTTPException(status_code=404, detail='Product not found')
-    return models.ProductResponse(item=models.Product(**item))
 
 
-@ROUTER.post(
-    '',
-    name='Create Product',
-    description='Create a single product',
+@ROUTER.get(
+    '/facets',
+    name='Get Product Facets',
+    description='Aggregate products matching the list filters: count, price stats and histogram',
     responses={
-        201: {'model': models.ProductResponse, 'description': 'Success'},
+        200: {'model': models.ProductFacetsResponse, 'description': 'Success'},
     },
-    status_code=201,
 )
 async def _(
-    data: models.ProductRequest,
-    storage: MySQLStorage = Depends(generic_deps.get_storage),
+    request: Request,
+    shards: ShardedStorage = Depends(generic_deps.get_shards),
+    filters: dict = Depends(PRODUCTS.filters),
+    buckets: int = Query(
+        default=10, title='Number of equal-width price buckets', gt=0, le=100
+    ),
+    bucket_edges: list[float] | None = Query(
+        default=None,
+        min_length=1,
+        max_length=100,
+        title='Explicit ascending price bucket boundaries, overrides `buckets`',
+    ),
 ):
-    item_id = await storage.apply(
-        'INSERT INTO products (name, description, price, image_url) VALUES (%s, %s, %s, %s)',
-        (data.name, data.description, data.price, data.image_url),
+    # Facets aggregate every filtered row, so they are admitted and bounded like exact counts
+    governor = PRODUCTS.govern_aggregate(request, filters)
+    try:
+        return await _facets(shards, filters, buckets, bucket_edges, governor)
+    except StatementTimeoutError as e:
+        if governor:
+            governor.record_timeout('count')
+        raise HTTPException(status_code=422, detail=PRODUCTS.too_expensive) from e
+
+
+async def _facets(
+    shards: ShardedStorage,
+    filters: dict,
+    buckets: int,
+    bucket_edges: list[float] | None,
+    governor: QueryGovernor | None,
+) -> models.ProductFacetsResponse:
+    def limit(query: str) -> str:
+        return governor.limit(query, 'count') if governor else query
+
+    filtered, args = PRODUCTS.filter_query('SELECT price FROM products', filters)
+
+    if bucket_edges:
+        bucket_edges = sorted(set(bucket_edges))
+        bucket_expr = _interval_bucket_expr(bucket_edges, args)
+    elif len(shards) > 1:
+        # Equal-width buckets need the price range of all shards, turned into inner edges
+        ranges = await shards.gather(
+            limit(
+                f'SELECT MIN(price) AS min_price, MAX(price) AS max_price FROM ({filtered}) AS filtered'  # nosec B608
+            ),
+            args,
+        )
+        prices = [
+            p for r in ranges for p in (r[0].min_price, r[0].max_price) if p is not None
+        ]
+        if prices and max(prices) > min(prices):
+            width = (max(prices) - min(prices)) / buckets
+            inner_edges = [min(prices) + i * width for i in range(1, buckets)]
+            bucket_expr = _interval_bucket_expr(inner_edges, args)
+        else:
+            bucket_expr = '0'
+    else:
+        args['buckets'] = buckets
+        bucket_expr = '''
+            LEAST(
+                COALESCE(
+                    FLOOR(
+                        (price - MIN(price) OVER ())
+                        / NULLIF(MAX(price) OVER () - MIN(price) OVER (), 0)
+                        * %(buckets)s
+                    ),
+                    0
+                ),
+                %(buckets)s - 1
+            )
+        '''
+
+    results = await shards.gather(
+        limit(f'''
+            SELECT bucket, COUNT(*) AS count, MIN(price) AS min_price,
+                MAX(price) AS max_price, AVG(price) AS avg_price
+            FROM (SELECT price, {bucket_expr} AS bucket FROM ({filtered}) AS filtered) AS bucketed
+            GROUP BY bucket WITH ROLLUP
+            '''),  # nosec B608
+        args,
     )
-    return models.ProductResponse(item=models.Product(id=item_id, **data.model_dump()))
+    rows = results[0] if len(results) == 1 else _merge_facet_rows(results)
 
+    totals = rows.pop() if rows else None
+    counts = {r.bucket: r['count'] for r in rows}
+    if bucket_edges:
+        bounds = list(zip([None] + bucket_edges, bucket_edges + [None]))
+    elif totals and totals.min_price is not None:
+        width = (totals.max_price - totals.min_price) / buckets
+        bounds = [
+            (totals.min_price + i * width, totals.min_price + (i + 1) * width)
+            for i in range(buckets)
+        ]
+    else:
+        bounds = []
 
-@ROUTER.put(
-    '/{id}',
-    name='Update Product',
-    description='Update a single product',
+    return models.ProductFacetsResponse(
+        item=models.ProductFacets(
+            total=totals['count'] if totals else 0,
+            min_price=totals.min_price if totals else None,
+            max_price=totals.max_price if totals else None,
+            avg_price=totals.avg_price if totals else None,
+            price_histogram=[
+                models.PriceBucket(lower=lower, upper=upper, count=counts.get(i, 0))
+                for i, (lower, upper) in enumerate(bounds)
+            ],
+        )
+    )
+
+
+@ROUTER.get(
+    '/stream',
+    name='Stream Product Events',
+    description='Server-sent events of product creations, updates, price updates and deletions. '
+    'A `reset` event means events were lost and the client has to resync',
+    response_class=StreamingResponse,
     responses={
-        200: {'model': models.ProductResponse, 'description': 'Success'},
-        404: {'model': generic_models.Error404Response, 'description': 'Not Found'},
+        200: {'content': {'text/event-stream': {}}, 'description': 'Event stream'},
     },
 )
 async def _(
-    data: models.ProductRequest,
-    product_id: int = Path(alias='id', title='Product ID', gt=0),
-    storage: MySQLStorage = Depends(generic_deps.get_storage),
+    request: Request,
+    id_in: list[int] | None = Query(default=None, min_length=1, title='ID list filter'),
+    events: list[models.ProductEventType] | None = Query(
+        default=None, min_length=1, title='Event types filter'
+    ),
+    last_event_id: int | None = Header(
+        default=None, title='ID of the last received event to resume after'
+    ),
 ):
-    if not await storage.check('SELECT id FROM products WHERE id = %s', product_id):
-        raise HTTPException(status_code=404, detail='Product not found')
-
-    await storage.apply(
-        'UPDATE products SET name = %s, description = %s, price = %s, image_url = %s WHERE id = %s',
-        (data.name, data.description, data.price, data.image_url, product_id),
+    return StreamingResponse(
+        product_events(request.app.extra['broker'], id_in, events, last_event_id),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
     )
-    return models.ProductResponse(item=models.Product(id=product_id, **data.model_dump()))
 
 
-@ROUTER.delete(
-    '/{id}',
-    name='Delete Product',
-    description='Delete a single product',
+@ROUTER.put(
+    '/{id}/price',
+    name='Update Product Price',
+    description='Update the price of a single product. With write-behind enabled the update '
+    'is acknowledged once buffered (202) and written within the flush interval, '
+    'superseded updates are coalesced and updates of nonexistent products are dropped',
     responses={
-        200: {'model': models.ProductResponse, 'description': 'Success'},
+        200: {'model': models.ProductPriceResponse, 'description': 'Success'},
+        202: {'model': models.ProductPriceResponse, 'description': 'Accepted'},
         404: {'model': generic_models.Error404Response, 'description': 'Not Found'},
     },
 )
 async def _(
+    request: Request,
+    response: Response,
+    data: models.ProductPriceRequest,
     product_id: int = Path(alias='id', title='Product ID', gt=0),
-    storage: MySQLStorage = Depends(generic_deps.get_storage),
+    shards: ShardedStorage = Depends(generic_deps.get_shards),
 ):
-    item = await storage.get(
-        'SELECT id, name, description, price, image_url FROM products WHERE id = %s',
-        product_id,
-    )
-    if not item:
-        raise HTTPException(status_code=404, detail='Product not found')
+    price_writer = request.app.extra.get('price_writer')
+    if price_writer:
+        price_writer.submit(product_id, data.price)
+        response.status_code = 202
+    else:
+        storage = await shards.for_id(product_id)
+        if not await storage.apply(UPDATE_PRODUCT_PRICE, (data.price, product_id)):
+            raise HTTPException(status_code=404, detail='Product not found')
+        PRODUCTS.invalidate(request, product_id)
+
+    item = models.ProductPrice(id=product_id, price=data.price)
+    if not price_writer:  # Buffered updates are published once flushed
+        await request.app.extra['broker'].publish(
+            models.ProductEventType.PRICE_UPDATED.value, item.model_dump(mode='json')
+        )
+    return models.ProductPriceResponse(item=item)
 
-    await storage.apply('DELETE FROM products WHERE id = %s', product_id)
 
-    return models.ProductResponse(item=models.Product(**item))
+# After the static paths above, which `/{id}` would shadow otherwise
+PRODUCTS.add_routes(ROUTER)
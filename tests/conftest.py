@@ -1,14 +1,17 @@
 import os
-from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager, contextmanager
 
 import pytest
 from fastapi.testclient import TestClient
 
+from modules.memory_driver import MemoryDatabase
 from modules.mysql_driver import MySQLDatabase
 
 BASE_DIR: str = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# `memory` runs the suite without a database server
+BACKEND = MemoryDatabase if os.getenv('TEST_DB_BACKEND') == 'memory' else MySQLDatabase
 
-storage: MySQLDatabase = MySQLDatabase(
+storage: MySQLDatabase = BACKEND(
     database='test_' + os.getenv('MYSQL_DATABASE', 'app'),
     host=os.getenv('MYSQL_HOST', 'localhost'),
     port=int(os.getenv('MYSQL_PORT', 3306)),
@@ -16,43 +19,107 @@ storage: MySQLDatabase = MySQLDatabase(
     password=os.getenv('MYSQL_PASSWORD', 'password'),
     is_test=True,
 )
+sharded_storage: MySQLDatabase = BACKEND(
+    database=f'{storage.database}_shard_0',
+    host=storage.host,
+    port=storage.port,
+    user=storage.user,
+    password=storage.password,
+    shards=[f'{storage.database}_shard_1', f'{storage.database}_shard_2'],
+    id_block_size=2,
+    is_test=True,
+)
 os.environ['APP_ENV'] = 'local'  # Trick the app to avoid running with /api prefix
+os.environ['APP__DEBUG'] = 'true'  # Report query stats for `query_budget`
 
-from main import app_
+from main import RESPONSE_CACHE, app_
 from modules import MigrationManager
 from routes import v1
 
 
 @pytest.fixture(scope='session', autouse=True)
 def setup_once(request):
-    storage.teardown_db()
-    storage.init_db()
-    MigrationManager(
-        db_user=storage.user,
-        db_password=storage.password,
-        db_host=storage.host,
-        db_name=storage.database,
-        db_port=storage.port,
-        base_dir=BASE_DIR,
-    ).apply()
+    for database in (storage, sharded_storage):
+        database.teardown_db()
+        database.init_db()
+        if BACKEND is MemoryDatabase:
+            continue  # Tables are created by `init_db`
+        for shard in database.shards:
+            MigrationManager(
+                db_user=shard.user,
+                db_password=shard.password,
+                db_host=shard.host,
+                db_name=shard.database,
+                db_port=shard.port,
+                base_dir=BASE_DIR,
+            ).apply()
 
     def teardown():
         storage.teardown_db()
+        sharded_storage.teardown_db()
 
     request.addfinalizer(teardown)
 
 
-@pytest.fixture(scope='function')
 @asynccontextmanager
-async def app():
-    app_.extra['storage'] = storage
-    v1.app_.extra['storage'] = storage
+async def _client(database: MySQLDatabase):
+    app_.extra['storage'] = database
+    v1.app_.extra['storage'] = database
+    RESPONSE_CACHE.invalidate()
 
     client = TestClient(app_)
     app_.mount('/v1', v1.app_, 'V1')
 
-    await storage.acquire_pool()
+    await database.acquire_pool()
 
     yield client
 
-    await storage.close_pool()
+    await database.close_pool()
+
+
+@pytest.fixture(scope='function')
+def app():
+    return _client(storage)
+
+
+@pytest.fixture(scope='function')
+def sharded_app():
+    """
+    Client of the app running on three shards.
+    """
+    return _client(sharded_storage)
+
+
+@pytest.fixture
+def query_budget():
+    """
+    Assert that every request made by a client within the block stays within a query budget.
+    Usage: `with query_budget(client, statements=2): client.get(...)`.
+    """
+
+    @contextmanager
+    def budget(client: TestClient, statements: int, rows: int | None = None):
+        responses = []
+        hooks = client.event_hooks
+        hooks['response'] = [*hooks['response'], responses.append]
+        client.event_hooks = hooks
+        try:
+            yield responses
+        finally:
+            hooks['response'].remove(responses.append)
+            client.event_hooks = hooks
+
+        assert responses, 'No requests were made within the query budget block'
+        for response in responses:
+            stats = dict(
+                item.split('=') for item in response.headers['X-Query-Stats'].split(', ')
+            )
+            request = f'{response.request.method} {response.request.url.path}'
+            assert (
+                int(stats['statements']) <= statements
+            ), f'{request} ran {stats["statements"]} statements, budget is {statements}'
+            assert (
+                rows is None or int(stats['rows']) <= rows
+            ), f'{request} read or wrote {stats["rows"]} rows, budget is {rows}'
+
+    return budget
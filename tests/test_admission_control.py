@@ -0,0 +1,122 @@
+import asyncio
+
+import pytest
+
+from modules import AdmissionController
+from modules.admission_control import PRIORITY_HIGH, PRIORITY_LOW, PRIORITY_NORMAL
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+@pytest.mark.asyncio
+async def test_priority_ordering():
+    """Test that freed slots go to the most important, then the oldest waiter."""
+    controller = AdmissionController(limit=1, queue_timeout=1)
+    assert await controller.acquire(PRIORITY_NORMAL)
+
+    admitted = []
+
+    async def request(name: str, priority: int):
+        assert await controller.acquire(priority)
+        admitted.append(name)
+
+    tasks = [
+        asyncio.ensure_future(request(name, priority))
+        for name, priority in (
+            ('low', PRIORITY_LOW),
+            ('normal 1', PRIORITY_NORMAL),
+            ('high', PRIORITY_HIGH),
+            ('normal 2', PRIORITY_NORMAL),
+        )
+    ]
+    await settle()
+    assert controller.queued == 4
+
+    for _ in tasks:
+        controller.release()
+        await settle()
+    await asyncio.gather(*tasks)
+    assert admitted == ['high', 'normal 1', 'normal 2', 'low']
+    assert controller.queued == 0
+    assert controller.in_flight == 1
+
+
+@pytest.mark.asyncio
+async def test_shedding():
+    """Test shedding requests past the queue, evicting less important waiters first."""
+    controller = AdmissionController(limit=1, max_queue=2, queue_timeout=1)
+    assert await controller.acquire(PRIORITY_NORMAL)
+
+    low = asyncio.ensure_future(controller.acquire(PRIORITY_LOW))
+    normal = asyncio.ensure_future(controller.acquire(PRIORITY_NORMAL))
+    await settle()
+
+    # A full queue sheds requests no more important than anything queued
+    assert not await controller.acquire(PRIORITY_LOW)
+    assert controller.shed == 1
+
+    # A more important request takes the place of the least important one
+    high = asyncio.ensure_future(controller.acquire(PRIORITY_HIGH))
+    await settle()
+    assert low.done() and not low.result()
+    assert controller.shed == 2
+    assert controller.queued == 2
+
+    controller.release()
+    await settle()
+    assert high.done() and high.result()
+    assert not normal.done()
+    controller.release()
+    assert await normal
+
+
+@pytest.mark.asyncio
+async def test_queue_timeout():
+    """Test shedding requests waiting past the queue timeout and dropping them from the queue."""
+    controller = AdmissionController(limit=1, queue_timeout=0.01)
+    assert await controller.acquire(PRIORITY_NORMAL)
+
+    assert not await controller.acquire(PRIORITY_HIGH)
+    assert controller.shed == 1
+    assert controller.queued == 0
+    assert not any(controller._waiters.values())
+
+    # Cancelled waiters leave the queue as well
+    controller.queue_timeout = 1
+    task = asyncio.ensure_future(controller.acquire(PRIORITY_LOW))
+    await settle()
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert controller.queued == 0
+    assert not any(controller._waiters.values())
+
+    controller.release()
+    assert controller.in_flight == 0
+    assert await controller.acquire(PRIORITY_LOW)
+
+
+@pytest.mark.asyncio
+async def test_adaptive_limit():
+    """Test growing the limit past its initial value while healthy and shrinking it under pressure."""
+    waiters = 0
+    controller = AdmissionController(
+        limit=2,
+        min_limit=1,
+        max_limit=4,
+        adaptive=True,
+        window=1,
+        pressure=lambda: waiters,
+    )
+    for _ in range(5):
+        assert await controller.acquire()
+        controller.release(0.01)
+    assert controller.limit == 4
+
+    waiters = 3
+    assert await controller.acquire()
+    controller.release(0.01)
+    assert controller.limit == 3
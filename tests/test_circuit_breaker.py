@@ -0,0 +1,154 @@
+import asyncio
+
+import pytest
+from pymysql import err as mysql_errors
+
+from modules import CircuitBreaker, MySQLStorage
+from modules import circuit_breaker as circuit_breaker_module
+from modules.mysql_driver import (
+    DatabaseUnavailableError,
+    StatementTimeoutError,
+    acquire_storage,
+)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(circuit_breaker_module.time, 'monotonic', clock)
+    return clock
+
+
+def test_reset_after_timeout(clock):
+    """Test opening after consecutive failures and letting requests through after the timeout."""
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10.0)
+    breaker.record_failure()
+    assert breaker.state == breaker.CLOSED
+    breaker.record_failure()
+    assert breaker.state == breaker.OPEN
+    assert not breaker.allow_request()
+    assert breaker.retry_after == 10
+
+    clock.now += 9.5
+    assert not breaker.allow_request()
+    assert breaker.retry_after == 1
+
+    clock.now += 0.5
+    assert breaker.state == breaker.HALF_OPEN
+    assert breaker.allow_request()
+    breaker.record_success()
+    assert breaker.state == breaker.CLOSED
+    assert breaker.failures == 0
+    assert breaker.retry_after == 0
+
+
+def test_half_open_probe(clock):
+    """Test letting a single probe through, a failed probe re-opens the breaker at once."""
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=10.0)
+    for _ in range(3):
+        breaker.record_failure()
+    clock.now += 10.0
+
+    assert breaker.allow_request()
+    assert not breaker.allow_request()  # Concurrent requests wait for the probe
+
+    breaker.record_failure()
+    assert breaker.state == breaker.OPEN
+    assert not breaker.allow_request()
+
+    clock.now += 10.0
+    assert breaker.allow_request()
+    breaker.record_success()
+    assert breaker.allow_request()
+    assert breaker.allow_request()
+
+
+class FailingCursor:
+    def __init__(self, error: Exception):
+        self.error = error
+
+    async def execute(self, query, args):
+        raise self.error
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    'error, expected, counted',
+    [
+        (
+            mysql_errors.OperationalError(2013, 'Lost connection'),
+            mysql_errors.Error,
+            True,
+        ),
+        (
+            mysql_errors.OperationalError(1213, 'Deadlock found'),
+            mysql_errors.Error,
+            False,
+        ),
+        (
+            mysql_errors.InternalError(1205, 'Lock wait timeout'),
+            mysql_errors.Error,
+            False,
+        ),
+        (
+            mysql_errors.OperationalError(1969, 'Query execution was interrupted'),
+            StatementTimeoutError,
+            False,
+        ),
+        (mysql_errors.IntegrityError(1062, 'Duplicate entry'), mysql_errors.Error, False),
+    ],
+)
+async def test_breaker_failures(clock, error, expected, counted):
+    """Test that only connection failures count, statements the server answered settle a probe."""
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10.0)
+    breaker.record_failure()
+    clock.now += 10.0
+    assert breaker.allow_request()
+
+    storage = MySQLStorage(None, breaker=breaker)
+    with pytest.raises(expected):
+        await storage._execute(FailingCursor(error), 'SELECT 1', ())
+    assert breaker.state == (breaker.OPEN if counted else breaker.CLOSED)
+
+
+class BusyPool:
+    async def acquire(self):
+        await asyncio.sleep(10)
+
+
+class BusyDatabase:
+    def __init__(self, breaker: CircuitBreaker):
+        self.breaker = breaker
+        self.pool = BusyPool()
+        self.acquire_timeout = 0.01
+        self.acquire_waiters = 0
+
+
+@pytest.mark.asyncio
+async def test_pool_timeouts_not_counted(clock):
+    """Test that an exhausted pool sheds load without tripping the breaker or holding a probe."""
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10.0)
+    database = BusyDatabase(breaker)
+    for _ in range(3):
+        with pytest.raises(DatabaseUnavailableError):
+            async with acquire_storage(database):
+                pass
+    assert breaker.state == breaker.CLOSED
+    assert breaker.failures == 0
+
+    breaker.record_failure()
+    breaker.record_failure()
+    clock.now += 10.0
+    with pytest.raises(DatabaseUnavailableError):
+        async with acquire_storage(database):
+            pass
+    assert breaker.state == breaker.HALF_OPEN
+    assert breaker.allow_request()  # The next request probes instead
@@ -0,0 +1,125 @@
+import pytest
+
+from modules import ColumnarCatalog, MySQLStorage
+from routes.v1.resources.products.routes import PRODUCTS
+
+FILTERS = [
+    {},
+    {'id': 2},
+    {'id_in': [1, 3, 4, 99]},
+    {'price_lt': 3.0},
+    {'price_gt': 2.0, 'price_le': 4.0},
+    {'price_ge': 2.0, 'id_in': [2, 3, 5]},
+]
+
+
+async def sql_ids(storage: MySQLStorage, filters: dict) -> list[int]:
+    query, args = PRODUCTS.filter_query('SELECT id FROM products', filters)
+    return [
+        row.id for row in await storage.get(query + ' ORDER BY id', args, fetch_all=True)
+    ]
+
+
+async def assert_same_results(catalog: ColumnarCatalog, storage: MySQLStorage, ids: list):
+    for filters in FILTERS:
+        filters = {k: ids[v - 1] if k == 'id' else v for k, v in filters.items()}
+        if 'id_in' in filters:
+            filters['id_in'] = [
+                ids[i - 1] if i <= len(ids) else i for i in filters['id_in']
+            ]
+        assert catalog.supports(filters)
+        rows, _ = catalog.query(filters, items_per_page=1000)
+        assert [row.id for row in rows] == await sql_ids(storage, filters), filters
+
+
+@pytest.mark.asyncio
+async def test_catalog_matches_sql(app):
+    """Test that the catalog returns the rows of the SQL filters, also after refreshes."""
+    async with app as client, client.app.extra['storage'].pool.acquire() as connection:
+        storage = MySQLStorage(connection)
+        catalog = ColumnarCatalog(client.app.extra['storage'], refresh_overlap=60)
+
+        try:
+            ids = [
+                client.post(
+                    '/v1/products/',
+                    json={
+                        'name': f'Café {i}',
+                        'description': f'Description {i}',
+                        'price': float(i),
+                        'image_url': None,
+                    },
+                ).json()['item']['id']
+                for i in range(1, 6)
+            ]
+            await catalog.load()
+            assert catalog.size == 5
+            await assert_same_results(catalog, storage, ids)
+
+            # Collation dependent text filters are left to SQL
+            assert not catalog.supports({'name': 'cafe 1'})
+            assert not catalog.supports({'name_like': 'caf'})
+
+            client.put(f'/v1/products/{ids[0]}/price', json={'price': 10.0})
+            client.delete(f'/v1/products/{ids[1]}')
+            ids.append(
+                client.post(
+                    '/v1/products/',
+                    json={
+                        'name': 'New product',
+                        'description': 'Description',
+                        'price': 2.5,
+                        'image_url': None,
+                    },
+                ).json()['item']['id']
+            )
+            await catalog.refresh()
+            assert catalog.size == 5
+            assert ids[1] not in catalog.columns['id'].tolist()
+            await assert_same_results(catalog, storage, ids)
+        finally:
+            await storage.apply('DELETE FROM products')
+            await storage.apply('DELETE FROM product_tombstones')
+
+
+class FailingStorage:
+    async def get(self, *args, **kwargs):
+        raise AssertionError('Cached lazy columns were fetched again')
+
+
+@pytest.mark.asyncio
+async def test_catalog_lazy_columns(app):
+    """Test loading lazy columns in a single query and serving them from the cache."""
+    async with app as client, client.app.extra['storage'].pool.acquire() as connection:
+        storage = MySQLStorage(connection)
+        catalog = ColumnarCatalog(client.app.extra['storage'], lazy_cache_size=2)
+
+        try:
+            for i in range(3):
+                client.post(
+                    '/v1/products/',
+                    json={
+                        'name': f'Product {i}',
+                        'description': f'Long text {i}',
+                        'price': 1.0,
+                        'image_url': None,
+                    },
+                )
+            await catalog.load()
+
+            rows, _ = catalog.query({}, items_per_page=2)
+            assert 'description' not in rows[0]
+            await catalog.load_lazy(rows, storage)
+            assert [row.description for row in rows] == ['Long text 0', 'Long text 1']
+
+            rows, _ = catalog.query({}, items_per_page=2)
+            await catalog.load_lazy(rows, FailingStorage())
+            assert [row.description for row in rows] == ['Long text 0', 'Long text 1']
+
+            # The least recently used row is evicted past the cache size
+            rows, _ = catalog.query({}, page=2, items_per_page=2)
+            await catalog.load_lazy(rows, storage)
+            assert rows[0].description == 'Long text 2'
+            assert len(catalog.lazy_cache) == 2
+        finally:
+            await storage.apply('DELETE FROM products')
@@ -0,0 +1,146 @@
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from enum import Enum
+
+from pymysql.constants import FIELD_TYPE, FLAG
+
+from modules import AttrDict
+from modules.prepared_statements import _decode_row, _encode_params, _positional
+
+UTF8MB4 = 45
+BINARY = 63
+
+
+def field(type_code: int, unsigned: bool = False, charsetnr: int = UTF8MB4) -> AttrDict:
+    return AttrDict(
+        type_code=type_code, flags=FLAG.UNSIGNED if unsigned else 0, charsetnr=charsetnr
+    )
+
+
+class Status(Enum):
+    ACTIVE = 'active'
+
+
+def test_positional():
+    """Test turning pyformat placeholders into question marks."""
+    assert _positional('SELECT * FROM t WHERE a = %s AND b LIKE %%x') == (
+        'SELECT * FROM t WHERE a = ? AND b LIKE %x',
+        None,
+    )
+    assert _positional('UPDATE t SET a = %(a)s, b = %(b)s WHERE c = %(a)s') == (
+        'UPDATE t SET a = ?, b = ? WHERE c = ?',
+        ('a', 'b', 'a'),
+    )
+
+
+def test_encode_params():
+    """Test encoding COM_STMT_EXECUTE parameters."""
+    assert _encode_params([None, 1, 'ab', Status.ACTIVE], 'utf8') == (
+        b'\x01'  # NULL bitmap
+        b'\x01'  # New parameters bound
+        b'\x06\x00\x08\x00\xfd\x00\xfd\x00'  # NULL, LONGLONG, VAR_STRING, VAR_STRING
+        b'\x01\x00\x00\x00\x00\x00\x00\x00'
+        b'\x02ab'
+        b'\x06active'
+    )
+    assert _encode_params([-2, 1 << 63, 1.5], 'utf8') == (
+        b'\x00\x01'
+        b'\x08\x00\x08\x80\x05\x00'  # Signed LONGLONG, unsigned LONGLONG, DOUBLE
+        b'\xfe\xff\xff\xff\xff\xff\xff\xff'
+        b'\x00\x00\x00\x00\x00\x00\x00\x80'
+        b'\x00\x00\x00\x00\x00\x00\xf8\x3f'
+    )
+    assert _encode_params(
+        [
+            datetime(2024, 1, 2, 3, 4, 5, 6),
+            date(2024, 1, 2),
+            -timedelta(days=1, hours=2, minutes=3, seconds=4, microseconds=5),
+            b'\x00\xff',
+        ],
+        'utf8',
+    ) == (
+        b'\x00\x01'
+        b'\x0c\x00\x0a\x00\x0b\x00\xfc\x00'  # DATETIME, DATE, TIME, BLOB
+        b'\x0b\xe8\x07\x01\x02\x03\x04\x05\x06\x00\x00\x00'
+        b'\x04\xe8\x07\x01\x02'
+        b'\x0c\x01\x01\x00\x00\x00\x02\x03\x04\x05\x00\x00\x00'
+        b'\x02\x00\xff'
+    )
+    # NULL bitmap of more than 8 parameters, length-encoded long strings
+    assert _encode_params([None] * 8 + ['é' * 150], 'utf8') == (
+        b'\xff\x00\x01'
+        + b'\x06\x00' * 8
+        + b'\xfd\x00'
+        + b'\xfc\x2c\x01'
+        + 'é'.encode() * 150
+    )
+
+
+def test_decode_row():
+    """Test decoding binary protocol rows."""
+    fields = [
+        field(FIELD_TYPE.LONG),
+        field(FIELD_TYPE.LONG, unsigned=True),
+        field(FIELD_TYPE.TINY, unsigned=True),
+        field(FIELD_TYPE.LONGLONG, unsigned=True),
+        field(FIELD_TYPE.VAR_STRING),
+        field(FIELD_TYPE.DATETIME),
+        field(FIELD_TYPE.BLOB, charsetnr=BINARY),
+        field(FIELD_TYPE.VAR_STRING),
+        field(FIELD_TYPE.NEWDECIMAL),
+    ]
+    row = (
+        b'\x00'  # OK header
+        b'\x40\x00'  # NULL bitmap, bits shifted by 2: the fifth column is NULL
+        b'\xfe\xff\xff\xff'
+        b'\xff\xff\xff\xff'
+        b'\xff'
+        b'\xff\xff\xff\xff\xff\xff\xff\xff'
+        b'\x0b\xe8\x07\x01\x02\x03\x04\x05\x06\x00\x00\x00'  # DATETIME(6)
+        b'\x03\x00\x01\x02'
+        b'\x05caf\xc3\xa9'
+        b'\x041.50'
+    )
+    assert _decode_row(row, fields, 'utf8') == (
+        -2,
+        4294967295,
+        255,
+        (1 << 64) - 1,
+        None,
+        datetime(2024, 1, 2, 3, 4, 5, 6),
+        b'\x00\x01\x02',
+        'café',
+        Decimal('1.50'),
+    )
+
+
+def test_decode_row_temporal():
+    """Test decoding dates and times of every length, NULLs in the second bitmap byte."""
+    fields = [
+        field(FIELD_TYPE.DATETIME),
+        field(FIELD_TYPE.DATETIME),
+        field(FIELD_TYPE.DATETIME),
+        field(FIELD_TYPE.DATE),
+        field(FIELD_TYPE.TIME),
+        field(FIELD_TYPE.TIME),
+        field(FIELD_TYPE.LONG),
+    ]
+    row = (
+        b'\x00'
+        b'\x00\x01'  # The seventh column is NULL, bit 8
+        b'\x04\xe8\x07\x01\x02'  # Date only
+        b'\x07\xe8\x07\x01\x02\x03\x04\x05'  # No microseconds
+        b'\x00'  # Zero date
+        b'\x04\xe8\x07\x01\x02'
+        b'\x0c\x01\x01\x00\x00\x00\x02\x03\x04\x05\x00\x00\x00'
+        b'\x00'  # Zero time
+    )
+    assert _decode_row(row, fields, 'utf8') == (
+        datetime(2024, 1, 2),
+        datetime(2024, 1, 2, 3, 4, 5),
+        None,
+        date(2024, 1, 2),
+        -timedelta(days=1, hours=2, minutes=3, seconds=4, microseconds=5),
+        timedelta(0),
+        None,
+    )
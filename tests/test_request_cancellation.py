@@ -0,0 +1,190 @@
+import asyncio
+
+import pytest
+
+from modules import MySQLStorage
+from modules.request_cancellation import RequestCancellationMiddleware
+
+SCOPE = {'type': 'http', 'headers': [(b'accept', b'application/json')]}
+
+
+def receiver(*messages: dict, delay: float = 0.0):
+    """
+    ASGI receive returning the given messages, then waiting forever like a connected client.
+    """
+    queue = list(messages)
+
+    async def receive():
+        if not queue:
+            await asyncio.Event().wait()
+        await asyncio.sleep(delay)
+        return queue.pop(0)
+
+    return receive
+
+
+async def respond(send, status: int = 200):
+    await send({'type': 'http.response.start', 'status': status, 'headers': []})
+    await send({'type': 'http.response.body', 'body': b''})
+
+
+@pytest.mark.asyncio
+async def test_request_timeout():
+    """Test answering requests running past the timeout with 504."""
+    cancelled = asyncio.Event()
+
+    async def app(scope, receive, send):
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    middleware = RequestCancellationMiddleware(app, timeout=0.05)
+    await middleware(SCOPE, receiver({'type': 'http.request', 'body': b''}), send)
+    assert cancelled.is_set()
+    assert sent[0]['status'] == 504
+
+
+@pytest.mark.asyncio
+async def test_request_timeout_starts_after_body():
+    """Test that reading a slow request body does not count towards the timeout."""
+
+    async def app(scope, receive, send):
+        body = b''
+        while True:
+            message = await receive()
+            body += message['body']
+            if not message.get('more_body'):
+                break
+        await respond(send, 200 if body == b'abcde' else 400)
+
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    chunks = [
+        {'type': 'http.request', 'body': c.encode(), 'more_body': c != 'e'}
+        for c in 'abcde'
+    ]
+    middleware = RequestCancellationMiddleware(app, timeout=0.05)
+    await middleware(SCOPE, receiver(*chunks, delay=0.03), send)
+    assert sent[0]['status'] == 200
+
+
+@pytest.mark.asyncio
+async def test_cancel_on_disconnect():
+    """Test cancelling the handler without a response once the client disconnects."""
+    cancelled = asyncio.Event()
+
+    async def app(scope, receive, send):
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    middleware = RequestCancellationMiddleware(app, timeout=None)
+    receive = receiver(
+        {'type': 'http.request', 'body': b''}, {'type': 'http.disconnect'}, delay=0.01
+    )
+    await asyncio.wait_for(middleware(SCOPE, receive, send), 1)
+    assert cancelled.is_set()
+    assert not sent
+
+
+class BlockingCursor:
+    async def execute(self, query, args):
+        await asyncio.sleep(10)
+
+
+class Connection:
+    closed = False
+
+    def thread_id(self) -> int:
+        return 42
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.mark.asyncio
+async def test_kill_cancelled_statement():
+    """Test that cancelling a running statement kills it server-side."""
+    killed = []
+
+    async def killer(thread_id: int):
+        killed.append(thread_id)
+
+    connection = Connection()
+    storage = MySQLStorage(connection, killer=killer)
+    task = asyncio.ensure_future(
+        storage._execute(BlockingCursor(), 'SELECT SLEEP(10)', ())
+    )
+    await asyncio.sleep(0.01)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    await asyncio.sleep(0)
+    assert killed == [42]
+    assert connection.closed
+
+
+@pytest.mark.asyncio
+async def test_disconnect_after_unread_body():
+    """Test noticing a disconnect when the app stopped reading a body that filled the queue."""
+    cancelled = asyncio.Event()
+
+    async def app(scope, receive, send):
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    chunks = [{'type': 'http.request', 'body': b'x', 'more_body': True}] * 5
+    middleware = RequestCancellationMiddleware(app, timeout=None, queue_size=2)
+    receive = receiver(*chunks, {'type': 'http.disconnect'})
+    await asyncio.wait_for(middleware(SCOPE, receive, None), 1)
+    assert cancelled.is_set()
+
+
+class BlockingConnection(Connection):
+    async def commit(self):
+        await asyncio.sleep(10)
+
+
+class Cursor:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+    async def execute(self, query, args):
+        pass
+
+
+@pytest.mark.asyncio
+async def test_discard_cancelled_commit():
+    """Test that a connection cancelled during commit is not reused."""
+    connection = BlockingConnection()
+    connection.cursor = lambda cursor_class: Cursor()
+    storage = MySQLStorage(connection)
+    task = asyncio.ensure_future(storage.apply('UPDATE products SET price = 1', ()))
+    await asyncio.sleep(0.01)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert connection.closed
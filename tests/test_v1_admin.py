@@ -0,0 +1,115 @@
+import pytest
+
+from modules import RequestProfiler
+from routes import v1
+
+
+@pytest.fixture
+def admin_token(monkeypatch):
+    monkeypatch.setitem(v1.app_.extra, 'admin_token', 'secret')
+    return 'secret'
+
+
+@pytest.fixture
+def profiler(tmp_path, monkeypatch, admin_token):
+    profiler = RequestProfiler(str(tmp_path), token=admin_token)
+    monkeypatch.setitem(v1.app_.extra, 'profiler', profiler)
+    return profiler
+
+
+@pytest.mark.asyncio
+async def test_admin_token(app, profiler):
+    """Test rejecting admin requests without the admin token."""
+    async with app as client:
+        response = client.get('/v1/admin/profiles')
+        assert response.status_code == 403
+
+        response = client.get('/v1/admin/profiles', headers={'X-Admin-Token': 'secret'})
+        assert response.status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_profiles(app, profiler):
+    """Test arming, capturing and downloading request profiles."""
+    headers = {'X-Admin-Token': 'secret'}
+    async with app as client:
+        response = client.post(
+            '/v1/admin/profiles',
+            json={'path': '/v1/products/', 'count': 1},
+            headers=headers,
+        )
+        assert response.json()['armed'] == {'/v1/products': 1}
+
+        scope = {'method': 'GET', 'path': '/v1/products', 'headers': []}
+        assert profiler.select(scope)
+        assert not profiler.select(scope)
+
+        async def run(_):
+            return [str(i) for i in range(1000)]
+
+        profile_id = await profiler.capture(scope, run)
+        response = client.get('/v1/admin/profiles', headers=headers)
+        assert [p['id'] for p in response.json()['items']] == [profile_id]
+
+        response = client.get(f'/v1/admin/profiles/{profile_id}/pstats', headers=headers)
+        assert response.status_code == 200
+        response = client.get('/v1/admin/profiles/unknown/pstats', headers=headers)
+        assert response.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_traces(app, admin_token):
+    """Test tracing requests sampled upstream and listing their spans."""
+    trace_id = '4bf92f3577b34da6a3ce929d0e0e4736'
+    async with app as client:
+        response = client.get(
+            '/v1/products/',
+            params={'price_gt': 0},
+            headers={'traceparent': f'00-{trace_id}-00f067aa0ba902b7-01'},
+        )
+        assert response.headers['traceparent'].startswith(f'00-{trace_id}-')
+
+        response = client.get(
+            '/v1/admin/traces',
+            params={'trace_id': trace_id},
+            headers={'X-Admin-Token': admin_token},
+        )
+        spans = response.json()['items'][0]['spans']
+        names = {s['name'] for s in spans}
+        assert {'pool.acquire', 'sql.render_filters', 'db.query'} <= names
+
+
+@pytest.mark.asyncio
+async def test_internal_errors(app, admin_token, monkeypatch, caplog):
+    """Test answering internal errors with their fingerprint and logging them deduplicated."""
+
+    async def fail():
+        raise RuntimeError('Failure')
+
+    reporter = v1.app_.extra['error_reporter']
+    monkeypatch.setattr(reporter, 'log_first', 2)
+    monkeypatch.setattr(reporter, 'log_every', 4)
+    v1.app_.add_api_route('/fail', fail)
+    try:
+        async with app as client:
+            with caplog.at_level('ERROR', logger='app.errors'):
+                responses = [client.get('/v1/fail') for _ in range(6)]
+            assert {r.status_code for r in responses} == {500}
+            assert len({r.text for r in responses}) == 1
+            assert responses[0].json()['traceback'] is None
+            assert len(caplog.records) == 3  # First two, then every fourth
+            assert 'Failure' in caplog.text
+
+            response = client.get(
+                '/v1/admin/errors', headers={'X-Admin-Token': admin_token}
+            )
+            (error,) = [
+                e for e in response.json()['items'] if e['id'] in responses[0].text
+            ]
+            assert (error['type'], error['message'], error['count']) == (
+                'RuntimeError',
+                'Failure',
+                6,
+            )
+    finally:
+        v1.app_.router.routes.pop()
@@ -0,0 +1,179 @@
+import os
+import tempfile
+
+import pytest
+
+from pymysql import err as mysql_errors
+
+from modules import EventBroker, MySQLStorage, ResponseCache
+from routes.v1.resources.imports.jobs import ProductImportJob
+from routes.v1.resources.imports.models import ImportFormat
+
+csv_fixture = (
+    'name,description,price,image_url\n'
+    'first product,a very long string,1.0,\n'
+    'second product,a very long string,2.5,https://example.com/image.png\n'
+    'bad,short,-1,\n'
+)
+
+
+async def cleanup(storage: MySQLStorage):
+    await storage.apply_many(
+        [
+            ('DELETE FROM products', ()),
+            ('DELETE FROM product_imports', ()),
+            ('DELETE FROM product_import_rows', ()),
+            ('DELETE FROM product_import_errors', ()),
+        ]
+    )
+
+
+@pytest.mark.asyncio
+async def test_create_import(app):
+    """Test uploading an import file."""
+    async with app as client, client.app.extra['storage'].pool.acquire() as connection:
+        storage = MySQLStorage(connection)
+
+        try:
+            response = client.post(
+                '/v1/imports', params={'format': 'csv'}, content=csv_fixture.encode()
+            )
+            assert response.status_code == 202
+            data = response.json()
+            assert data['item']['status'] == 'pending'
+            assert data['item']['format'] == 'csv'
+        finally:
+            await cleanup(storage)
+
+
+@pytest.mark.asyncio
+async def test_run_import(app):
+    """Test running an import job and reporting its status."""
+    async with app as client, client.app.extra['storage'].pool.acquire() as connection:
+        storage = MySQLStorage(connection)
+
+        try:
+            import_id = await storage.apply(
+                'INSERT INTO product_imports (format) VALUES (%s)', 'csv'
+            )
+            with tempfile.NamedTemporaryFile('w', delete=False) as file:
+                file.write(csv_fixture)
+
+            broker, cache = EventBroker(), ResponseCache()
+            job = ProductImportJob(
+                import_id,
+                file.name,
+                ImportFormat.CSV,
+                client.app.extra['storage'],
+                broker=broker,
+                response_cache=cache,
+            )
+            job.CHUNK_SIZE = 1  # Merged in a transaction per row
+            await job.run()
+            assert not os.path.exists(file.name)
+            assert cache.generation == 2
+
+            response = client.get(f'/v1/imports/{import_id}')
+            assert response.status_code == 200
+            data = response.json()['item']
+            assert data['status'] == 'completed'
+            assert data['total_rows'] == 3
+            assert data['imported_rows'] == 2
+            assert data['failed_rows'] == 1
+            assert [e['row_no'] for e in data['errors']] == [3]
+
+            response = client.get('/v1/products/')
+            items = response.json()['items']
+            assert len(items) == 2
+            assert [(e.type, e.data) for e in broker.history] == [
+                ('created', item) for item in sorted(items, key=lambda i: i['id'])
+            ]
+            assert not await storage.get(
+                'SELECT * FROM product_import_rows', fetch_all=True
+            )
+
+            response = client.get('/v1/imports/999999')
+            assert response.status_code == 404
+        finally:
+            await cleanup(storage)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    'file_format, content, failed',
+    [
+        (
+            ImportFormat.CSV,
+            csv_fixture.encode()
+            + b'caf\xe9 product,a very long string,1.0,\n'
+            + f'long product,{"x" * 200_000},1.0,\n'.encode()
+            + b'last product,a very long string,3.0,\n',
+            3,
+        ),
+        (
+            ImportFormat.NDJSON,
+            b'{"name": "first product", "description": "a very long string", "price": 1}\n'
+            b'{"name": "caf\xe9 product", "description": "a very long string", "price": 1}\n'
+            b'{"name": "bad", \n'
+            b'{"name": "last product", "description": "a very long string", "price": 3}\n',
+            2,
+        ),
+    ],
+)
+async def test_import_malformed_rows(app, file_format, content, failed):
+    """Test failing undecodable and malformed rows only, not the whole import."""
+    async with app as client, client.app.extra['storage'].pool.acquire() as connection:
+        storage = MySQLStorage(connection)
+
+        try:
+            import_id = await storage.apply(
+                'INSERT INTO product_imports (format) VALUES (%s)', file_format.value
+            )
+            with tempfile.NamedTemporaryFile('wb', delete=False) as file:
+                file.write(content)
+
+            await ProductImportJob(
+                import_id, file.name, file_format, client.app.extra['storage']
+            ).run()
+
+            data = client.get(f'/v1/imports/{import_id}').json()['item']
+            assert data['status'] == 'completed', data['message']
+            assert (
+                data['failed_rows']
+                == data['total_rows'] - data['imported_rows']
+                == failed
+            )
+            assert len(data['errors']) == failed
+            names = [i['name'] for i in client.get('/v1/products/').json()['items']]
+            assert 'last product' in names
+        finally:
+            await cleanup(storage)
+
+
+class LostConnectionJob(ProductImportJob):
+    async def _load(self, storage: MySQLStorage):
+        storage.connection.close()
+        raise mysql_errors.InterfaceError(0, 'Connection is closed')
+
+
+@pytest.mark.asyncio
+async def test_import_lost_connection(app):
+    """Test marking an import failed when its job connection died."""
+    async with app as client, client.app.extra['storage'].pool.acquire() as connection:
+        storage = MySQLStorage(connection)
+
+        try:
+            import_id = await storage.apply(
+                'INSERT INTO product_imports (format) VALUES (%s)', 'csv'
+            )
+            with tempfile.NamedTemporaryFile('w', delete=False) as file:
+                file.write(csv_fixture)
+
+            await LostConnectionJob(
+                import_id, file.name, ImportFormat.CSV, client.app.extra['storage']
+            ).run()
+            data = client.get(f'/v1/imports/{import_id}').json()['item']
+            assert data['status'] == 'failed'
+            assert data['message'] == '(0, \'Connection is closed\')'
+        finally:
+            await cleanup(storage)
@@ -1,6 +1,26 @@
+import asyncio
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
 import pytest
 
-from modules import MySQLStorage
+from const import BROKER
+from modules import (
+    AttrDict,
+    IdempotencyMiddleware,
+    LocalRateLimitBackend,
+    MemoryDatabase,
+    MySQLDatabase,
+    MySQLStorage,
+    QueryGovernor,
+    SharedRowCache,
+    TextCompressor,
+    WriteBehindBuffer,
+)
+from modules.query_accounting import track_query_stats
+from modules.rate_limiting import client_identity
+from routes import v1
+from routes.v1.resources.products import routes as product_routes
 
 product_payload_fixture = {
     'name': 'string',
@@ -95,3 +115,825 @@ async def test_delete_product(app):
             assert response.status_code == 200
         finally:
             await storage.apply('DELETE FROM products')
+            await storage.apply('DELETE FROM product_tombstones')
+
+
+@pytest.mark.asyncio
+async def test_database_unavailable(app):
+    """Test failing fast while the circuit breaker is open."""
+    async with app as client:
+        breaker = client.app.extra['storage'].breaker
+
+        try:
+            for _ in range(breaker.failure_threshold):
+                breaker.record_failure()
+
+            response = client.get('/v1/products/1')
+            assert response.status_code == 503
+            assert int(response.headers['Retry-After']) >= 1
+            assert response.json()['ok'] is False
+        finally:
+            breaker.record_success()
+
+
+@pytest.mark.asyncio
+async def test_list_product_changes(app, monkeypatch):
+    """Test incremental sync through the change feed."""
+    monkeypatch.setattr(product_routes, 'CHANGES_VISIBILITY_LAG_MICROSECONDS', 0)
+    async with app as client, client.app.extra['storage'].pool.acquire() as connection:
+        storage = MySQLStorage(connection)
+
+        try:
+            product_id = await create_product(storage)
+
+            if isinstance(client.app.extra['storage'], MemoryDatabase):
+                # Changes are held back while an older transaction may still commit
+                await storage.apply(
+                    'INSERT INTO information_schema.innodb_trx VALUES (%s)',
+                    datetime.now() - timedelta(minutes=1),
+                )
+                response = client.get('/v1/products/changes')
+                assert response.json()['items'] == []
+                await storage.apply('DELETE FROM information_schema.innodb_trx')
+
+            response = client.get('/v1/products/changes')
+            assert response.status_code == 200
+            data = response.json()
+            assert [i['id'] for i in data['items']] == [product_id]
+            assert data['items'][0]['deleted'] is False
+            cursor = data['cursor']
+
+            response = client.get('/v1/products/changes', params={'since': cursor})
+            assert response.json()['items'] == []
+
+            client.delete(f'/v1/products/{product_id}')
+            response = client.get('/v1/products/changes', params={'since': cursor})
+            data = response.json()
+            assert [i['id'] for i in data['items']] == [product_id]
+            assert data['items'][0]['deleted'] is True
+
+            response = client.get('/v1/products/changes', params={'since': 'garbage'})
+            assert response.status_code == 400
+        finally:
+            await storage.apply('DELETE FROM products')
+            await storage.apply('DELETE FROM product_tombstones')
+
+
+@pytest.mark.asyncio
+async def test_list_products_cache(app):
+    """Test caching list pages and invalidating them on writes."""
+    async with app as client, client.app.extra['storage'].pool.acquire() as connection:
+        storage = MySQLStorage(connection)
+
+        try:
+            response = client.get('/v1/products/', params={'page': 1, 'price_gt': 0})
+            assert response.headers['X-Cache'] == 'miss'
+            assert len(response.json()['items']) == 0
+
+            response = client.get('/v1/products/', params={'price_gt': 0, 'page': 1})
+            assert response.headers['X-Cache'] == 'fresh'
+
+            client.post('/v1/products/', json=product_payload_fixture)
+            response = client.get('/v1/products/', params={'page': 1, 'price_gt': 0})
+            assert response.headers['X-Cache'] == 'miss'
+            assert len(response.json()['items']) == 1
+        finally:
+            await storage.apply('DELETE FROM products')
+
+
+@pytest.mark.asyncio
+async def test_product_facets(app):
+    """Test aggregating products matching list filters."""
+    async with app as client, client.app.extra['storage'].pool.acquire() as connection:
+        storage = MySQLStorage(connection)
+        await create_product(storage)
+        await create_product(storage)
+
+        try:
+            response = client.get('/v1/products/facets', params={'buckets': 4})
+            assert response.status_code == 200
+            data = response.json()['item']
+            assert data['total'] == 2
+            assert data['min_price'] == data['max_price'] == 1.0
+            assert len(data['price_histogram']) == 4
+            assert sum(b['count'] for b in data['price_histogram']) == 2
+
+            response = client.get(
+                '/v1/products/facets', params={'bucket_edges': [0.5, 2], 'price_gt': 5}
+            )
+            data = response.json()['item']
+            assert data['total'] == 0
+            assert [b['count'] for b in data['price_histogram']] == [0, 0, 0]
+        finally:
+            await storage.apply('DELETE FROM products')
+
+
+@pytest.mark.asyncio
+async def test_msgpack_responses(app):
+    """Test negotiating MessagePack responses."""
+    msgpack = pytest.importorskip('msgpack')
+    async with app as client, client.app.extra['storage'].pool.acquire() as connection:
+        storage = MySQLStorage(connection)
+        product_id = await create_product(storage)
+
+        try:
+            headers = {'Accept': 'application/msgpack, application/json;q=0.5'}
+            response = client.get(f'/v1/products/{product_id}', headers=headers)
+            assert response.status_code == 200
+            assert response.headers['Content-Type'] == 'application/msgpack'
+            assert msgpack.unpackb(response.content)['item']['id'] == product_id
+
+            response = client.get('/v1/products/', headers=headers)
+            assert msgpack.unpackb(response.content)['items'][0]['id'] == product_id
+            response = client.get('/v1/products/')
+            assert response.json()['items'][0]['id'] == product_id
+
+            response = client.get(f'/v1/products/{product_id + 1}', headers=headers)
+            assert response.status_code == 404
+            assert msgpack.unpackb(response.content)['message'] == 'Product not found'
+        finally:
+            await storage.apply('DELETE FROM products')
+
+
+@pytest.mark.asyncio
+async def test_product_events(app):
+    """Test streaming product events emitted by write handlers."""
+    async with app as client:
+        last_event_id = BROKER.last_id
+        product_id = client.post('/v1/products/', json=product_payload_fixture).json()[
+            'item'
+        ]['id']
+        client.put(f'/v1/products/{product_id}', json=product_payload_fixture)
+        client.delete(f'/v1/products/{product_id}')
+
+        stream = product_routes.product_events(
+            BROKER, id_in=[product_id], last_event_id=last_event_id
+        )
+        chunks = [await anext(stream) for _ in range(4)]
+        await stream.aclose()
+        assert chunks[0].startswith('retry:')
+        for chunk, event_type in zip(chunks[1:], ('created', 'updated', 'deleted')):
+            assert f'event: {event_type}\n' in chunk
+            assert f'"id":{product_id}' in chunk
+
+        stream = product_routes.product_events(BROKER, last_event_id=0)
+        chunks = [chunk async for chunk in stream]
+        assert chunks[-1].startswith('event: reset')
+
+
+@pytest.mark.asyncio
+async def test_shared_product_cache(app, monkeypatch, tmp_path, query_budget):
+    """Test serving product reads from the shared cache and invalidating changed products."""
+    cache = SharedRowCache(str(tmp_path / 'products.cache'), slots=64, slot_size=512)
+    monkeypatch.setitem(v1.app_.extra, 'product_cache', cache)
+    async with app as client, client.app.extra['storage'].pool.acquire() as connection:
+        storage = MySQLStorage(connection)
+
+        try:
+            product_id = await create_product(storage)
+            with query_budget(client, statements=1):
+                first = client.get(f'/v1/products/{product_id}').json()
+            with query_budget(client, statements=0):
+                assert client.get(f'/v1/products/{product_id}').json() == first
+            assert (cache.hits, cache.misses, cache.stores) == (1, 1, 1)
+
+            client.put(f'/v1/products/{product_id}/price', json={'price': 2.0})
+            item = client.get(f'/v1/products/{product_id}').json()['item']
+            assert item['price'] == 2.0
+            client.put(
+                f'/v1/products/{product_id}',
+                json={**product_payload_fixture, 'name': 'renamed'},
+            )
+            item = client.get(f'/v1/products/{product_id}').json()['item']
+            assert item['name'] == 'renamed'
+            client.delete(f'/v1/products/{product_id}')
+            assert client.get(f'/v1/products/{product_id}').status_code == 404
+
+            # A load started before an invalidation is not stored
+            version = cache.version(product_id)
+            cache.invalidate(product_id)
+            assert not cache.put(product_id, first['item'], version)
+            assert cache.get(product_id) is None
+        finally:
+            cache.close()
+            await storage.apply('DELETE FROM products')
+            await storage.apply('DELETE FROM product_tombstones')
+
+
+@pytest.mark.asyncio
+async def test_query_governor(app, monkeypatch, query_budget):
+    """Test admitting, downgrading and rejecting lists by estimated cost."""
+    async with app as client, client.app.extra['storage'].pool.acquire() as connection:
+        storage = MySQLStorage(connection)
+        governor = QueryGovernor(
+            client.app.extra['storage'],
+            tables=('products',),
+            max_cost=10_000,
+            max_count_cost=1000,
+            statement_times={'page': 1.0, 'count': 0.5},
+        )
+        monkeypatch.setitem(v1.app_.extra, 'query_governor', governor)
+
+        try:
+            ids = [await create_product(storage) for _ in range(3)]
+            await governor.refresh()
+            assert governor.table_rows == {'products': ids[-1]}
+
+            governor.table_rows['products'] = 100_000
+            response = client.get('/v1/products/', params={'id_in': ids})
+            assert response.json()['total_pages_exact'] is True
+
+            # Scans for the page only, the count is skipped
+            with query_budget(client, statements=1):
+                response = client.get(
+                    '/v1/products/', params={'name_like': 'str', 'items_per_page': 2}
+                )
+            data = response.json()
+            assert len(data['items']) == 2
+            assert (data['total_pages'], data['total_pages_exact']) == (2, False)
+            data = client.get(
+                '/v1/products/',
+                params={'name_like': 'str', 'items_per_page': 2, 'page': 2},
+            ).json()
+            assert len(data['items']) == 1
+            assert (data['total_pages'], data['total_pages_exact']) == (2, False)
+
+            # Sorting by a column without index examines every row
+            response = client.get('/v1/products/', params={'sort': 'name'})
+            assert response.status_code == 422
+            response = client.get(
+                '/v1/products/', params={'name_like': 'str', 'page': 2000}
+            )
+            assert response.status_code == 422
+
+            # Facets aggregate every filtered row and cannot skip it like a count
+            response = client.get('/v1/products/facets', params={'id_in': ids})
+            assert response.json()['item']['total'] == 3
+            response = client.get('/v1/products/facets', params={'name_like': 'str'})
+            assert response.status_code == 422
+
+            assert governor.decisions == {'admitted': 2, 'downgraded': 2, 'rejected': 3}
+        finally:
+            await storage.apply('DELETE FROM products')
+
+
+@pytest.mark.asyncio
+async def test_query_budgets(app, query_budget):
+    """Test that product endpoints stay within their database round-trip budgets."""
+    async with app as client:
+        with query_budget(client, statements=1, rows=1):
+            product_id = client.post(
+                '/v1/products/', json=product_payload_fixture
+            ).json()['item']['id']
+        with query_budget(client, statements=1, rows=1):
+            client.get(f'/v1/products/{product_id}')
+        with query_budget(client, statements=2):
+            client.get('/v1/products/', params={'price_gt': 0, 'page': 1})
+        with query_budget(client, statements=1):
+            client.get('/v1/products/facets')
+        with query_budget(client, statements=2):
+            client.put(f'/v1/products/{product_id}', json=product_payload_fixture)
+        with query_budget(client, statements=2, rows=2):
+            response = client.delete(f'/v1/products/{product_id}')
+        assert response.json()['item']['id'] == product_id
+        with query_budget(client, statements=2, rows=0):
+            response = client.delete(f'/v1/products/{product_id}')
+        assert response.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_sharded_products(sharded_app, monkeypatch):
+    """Test routing, allocating IDs and merging lists across shards."""
+    monkeypatch.setattr(product_routes, 'CHANGES_VISIBILITY_LAG_MICROSECONDS', 0)
+    async with sharded_app as client:
+        database = client.app.extra['storage']
+        try:
+            product_ids = [
+                client.post(
+                    '/v1/products/', json={**product_payload_fixture, 'price': i + 1}
+                ).json()['item']['id']
+                for i in range(7)
+            ]
+            assert len(set(product_ids)) == 7
+            counts = []
+            for shard in database.shards:
+                async with shard.pool.acquire() as connection:
+                    counts.append(
+                        await MySQLStorage(connection).check('SELECT id FROM products')
+                    )
+            assert sum(counts) == 7 and max(counts) < 7
+
+            for product_id in product_ids:
+                response = client.get(f'/v1/products/{product_id}')
+                assert response.json()['item']['id'] == product_id
+
+            response = client.get(
+                '/v1/products/', params={'items_per_page': 3, 'page': 2}
+            )
+            data = response.json()
+            assert [i['id'] for i in data['items']] == sorted(product_ids)[3:6]
+            assert data['total_pages'] == 3
+
+            response = client.get('/v1/products/facets', params={'buckets': 2})
+            data = response.json()['item']
+            assert data['total'] == 7
+            assert (data['min_price'], data['max_price'], data['avg_price']) == (1, 7, 4)
+            assert [b['count'] for b in data['price_histogram']] == [3, 4]
+
+            client.delete(f'/v1/products/{product_ids[0]}')
+            response = client.get('/v1/products/changes')
+            items = response.json()['items']
+            assert sorted(i['id'] for i in items) == sorted(product_ids)
+            assert [i['id'] for i in items if i['deleted']] == [product_ids[0]]
+        finally:
+            for shard in database.shards:
+                async with shard.pool.acquire() as connection:
+                    await MySQLStorage(connection).apply('DELETE FROM products')
+                    await MySQLStorage(connection).apply('DELETE FROM product_tombstones')
+
+
+@pytest.mark.asyncio
+async def test_update_product_price(app):
+    """Test updating prices directly and through the write-behind buffer."""
+    async with app as client, client.app.extra['storage'].pool.acquire() as connection:
+        storage = MySQLStorage(connection)
+        database = client.app.extra['storage']
+        # Own pool, the one of the app is recreated on the loop of every request
+        writer_database = (
+            database
+            if isinstance(database, MemoryDatabase)
+            else MySQLDatabase(
+                database.database,
+                host=database.host,
+                port=database.port,
+                user=database.user,
+                password=database.password,
+            )
+        )
+        await writer_database.acquire_pool()
+        writer = WriteBehindBuffer(
+            writer_database,
+            table='products',
+            column='price',
+            on_flush=lambda ids: product_routes.publish_price_updates(
+                BROKER, writer_database, ids
+            ),
+        )
+
+        try:
+            product_id = await create_product(storage)
+            response = client.put(f'/v1/products/{product_id}/price', json={'price': 2.0})
+            assert response.status_code == 200
+            event = BROKER.history[-1]
+            assert (event.type, event.data) == (
+                'price_updated',
+                {'id': product_id, 'price': 2.0},
+            )
+            response = client.put(
+                f'/v1/products/{product_id + 1}/price', json={'price': 2.0}
+            )
+            assert response.status_code == 404
+
+            v1.app_.extra['price_writer'] = writer
+            last_event_id = BROKER.last_id
+            for item_id, price in (
+                (product_id, 3.0),
+                (product_id + 1, 5.0),
+                (product_id, 4.0),
+            ):
+                response = client.put(
+                    f'/v1/products/{item_id}/price', json={'price': price}
+                )
+                assert response.status_code == 202
+            assert writer.pending == {product_id: 4.0, product_id + 1: 5.0}
+            # Buffered updates are not announced before they are written
+            assert BROKER.last_id == last_event_id
+
+            await writer.flush()
+            item = await storage.get(
+                'SELECT price FROM products WHERE id = %s', product_id
+            )
+            assert item.price == 4.0
+            # Only written prices of existing products are announced
+            assert [(e.type, e.data) for e in BROKER._replay(last_event_id)] == [
+                ('price_updated', {'id': product_id, 'price': 4.0})
+            ]
+            stats = writer.stats()
+            assert (stats.accepted, stats.written, stats.pending) == (3, 2, 0)
+            assert stats.coalescing_ratio == 1.5
+
+            # Updates of a failed flush stay counted once retried
+            writer.submit(product_id, 6.0)
+            writer.submit(product_id, 7.0)
+            writer.table = 'missing_products'
+            with pytest.raises(Exception):
+                await writer.flush()
+            writer.table = 'products'
+            assert writer.pending_updates == {product_id: 2}
+            assert writer.stats().coalescing_ratio == 1.5
+            await writer.flush()
+            stats = writer.stats()
+            assert (stats.accepted, stats.written, stats.failures) == (5, 3, 1)
+            assert stats.coalescing_ratio == round(5 / 3, 3)
+
+            # A row failing on its own is dropped once its batch failed again
+            other_id = await create_product(storage)
+            writer.submit(product_id, float('inf'))
+            writer.submit(other_id, 8.0)
+            for _ in range(2):
+                with pytest.raises(Exception):
+                    await writer.flush()
+            assert writer.pending == {}
+            item = await storage.get('SELECT price FROM products WHERE id = %s', other_id)
+            assert item.price == 8.0
+            stats = writer.stats()
+            assert (stats.written, stats.failures, stats.dropped) == (4, 3, 1)
+            response = client.put(
+                f'/v1/products/{product_id}/price', json={'price': 'Infinity'}
+            )
+            assert response.status_code == 422
+
+            # Whole row updates and deletes drop buffered prices, which would revert them
+            client.put(f'/v1/products/{product_id}/price', json={'price': 9.0})
+            client.put(f'/v1/products/{other_id}/price', json={'price': 9.0})
+            client.put(f'/v1/products/{product_id}', json=product_payload_fixture)
+            client.delete(f'/v1/products/{other_id}')
+            assert writer.pending == {}
+            await writer.flush()
+            item = await storage.get(
+                'SELECT price FROM products WHERE id = %s', product_id
+            )
+            assert item.price == product_payload_fixture['price']
+        finally:
+            v1.app_.extra['price_writer'] = None
+            await writer_database.close_pool()
+            await storage.apply('DELETE FROM products')
+
+
+@pytest.mark.asyncio
+async def test_idempotent_create(app, query_budget):
+    """Test replaying retried writes by idempotency key."""
+    async with app as client, client.app.extra['storage'].pool.acquire() as connection:
+        storage = MySQLStorage(connection)
+        headers = {'Idempotency-Key': 'test-idempotent-create'}
+
+        try:
+            response = client.post(
+                '/v1/products/', json=product_payload_fixture, headers=headers
+            )
+            assert response.status_code == 201
+            with query_budget(client, statements=0):
+                replay = client.post(
+                    '/v1/products/', json=product_payload_fixture, headers=headers
+                )
+            assert replay.status_code == 201
+            assert replay.headers['Idempotent-Replayed'] == 'true'
+            assert replay.json() == response.json()
+            assert await storage.check('SELECT id FROM products') == 1
+
+            response = client.post(
+                '/v1/products/',
+                json={**product_payload_fixture, 'price': 2.0},
+                headers=headers,
+            )
+            assert response.status_code == 422
+        finally:
+            await storage.apply('DELETE FROM products')
+
+
+@pytest.mark.asyncio
+async def test_idempotency_per_client():
+    """Test scoping idempotency keys to the client and capping buffered bodies."""
+    calls = []
+
+    async def app(scope, receive, send):
+        calls.append((await receive())['body'])
+        await send({'type': 'http.response.start', 'status': 201, 'headers': []})
+        await send({'type': 'http.response.body', 'body': str(len(calls)).encode()})
+
+    middleware = IdempotencyMiddleware(
+        app, paths=('/v1/products',), max_body_bytes=10, api_keys={'a', 'b'}
+    )
+
+    async def post(api_key: bytes, *chunks: bytes) -> list[dict]:
+        messages = [
+            {'type': 'http.request', 'body': c, 'more_body': i < len(chunks) - 1}
+            for i, c in enumerate(chunks)
+        ]
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {
+            'type': 'http',
+            'method': 'POST',
+            'path': '/v1/products',
+            'query_string': b'',
+            'client': ('10.0.0.1', 1),
+            'headers': [(b'idempotency-key', b'same'), (b'x-api-key', api_key)],
+        }
+        await middleware(scope, receive, send)
+        return sent
+
+    assert (await post(b'a', b'{}'))[1]['body'] == b'1'
+    assert (await post(b'a', b'{}'))[1]['body'] == b'1'
+    # The same key of another client is another request
+    assert (await post(b'b', b'{}'))[1]['body'] == b'2'
+
+    sent = await post(b'a', b'{"name":', b'"too long"}')
+    assert sent[0]['status'] == 413
+    assert len(calls) == 2
+
+
+class InsertCursor:
+    rowcount = 1
+
+
+@pytest.mark.asyncio
+async def test_idempotency_survives_cancellation():
+    """Test storing writes whose client went away, releasing keys of failures that wrote nothing."""
+    calls = []
+    started = asyncio.Event()
+
+    async def app(scope, receive, send):
+        await receive()
+        calls.append(scope['path'])
+        started.set()
+        await asyncio.sleep(0.05)
+        if scope['path'] != '/v1/products/read-only-failure':
+            track_query_stats().record('INSERT INTO products VALUES (1)', InsertCursor())
+        status = 201 if scope['path'] == '/v1/products' else 500
+        await send({'type': 'http.response.start', 'status': status, 'headers': []})
+        await send({'type': 'http.response.body', 'body': str(len(calls)).encode()})
+
+    middleware = IdempotencyMiddleware(app, paths=('/v1/products',))
+
+    async def post(path: str, send) -> None:
+        scope = {
+            'type': 'http',
+            'method': 'POST',
+            'path': path,
+            'query_string': b'',
+            'client': ('10.0.0.1', 1),
+            'headers': [(b'idempotency-key', b'key')],
+        }
+
+        async def receive():
+            return {'type': 'http.request', 'body': b'{}', 'more_body': False}
+
+        await middleware(scope, receive, send)
+
+    async def broken_send(message):
+        raise OSError('Client went away')
+
+    def collect(sent: list):
+        async def send(message):
+            sent.append(message)
+
+        return send
+
+    # Cancelled by the request timeout mid-write
+    task = asyncio.ensure_future(post('/v1/products', broken_send))
+    await started.wait()
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    # Sending to a client that went away
+    with pytest.raises(OSError):
+        await post('/v1/products', broken_send)
+
+    sent = []
+    await post('/v1/products', collect(sent))
+    assert sent[0]['status'] == 201
+    assert (sent[1]['body'], len(calls)) == (b'1', 1)
+
+    # Failures after a write are replayed, failures without one execute again
+    for path, replayed in (
+        ('/v1/products/write-failure', True),
+        ('/v1/products/read-only-failure', False),
+    ):
+        for _ in range(2):
+            sent = []
+            await post(path, collect(sent))
+            assert sent[0]['status'] == 500
+        assert calls.count(path) == (1 if replayed else 2)
+
+
+@pytest.mark.asyncio
+async def test_rate_limit(app, monkeypatch):
+    """Test throttling clients that exceed their token bucket."""
+    from main import RATE_LIMITS  # pylint: disable=C0415
+
+    monkeypatch.setattr(RATE_LIMITS, 'burst', 3.0)
+    monkeypatch.setattr(RATE_LIMITS, 'rate', 0.01)
+    monkeypatch.setattr(RATE_LIMITS, 'buckets', OrderedDict())
+    async with app as client:
+        # A default page of 100 items costs 2 tokens, a page of 50 items 1.5
+        assert client.get('/v1/products').status_code == 200
+        response = client.get('/v1/products', params={'items_per_page': 50})
+        assert response.status_code == 429
+        assert response.headers['Retry-After'] == '50'
+
+        # Unknown API keys do not escape the limit of the address
+        response = client.get(
+            '/v1/products', params={'items_per_page': 50}, headers={'X-API-Key': 'other'}
+        )
+        assert response.status_code == 429
+
+    # Other clients are not affected, the least recently seen one is evicted past the limit
+    scope = {'headers': [(b'x-api-key', b'known')], 'client': ('10.0.0.1', 1)}
+    assert client_identity(scope, api_keys={'known'}) == 'key:known'
+    assert client_identity(scope) == 'ip:10.0.0.1'
+    backend = LocalRateLimitBackend(rate=0.01, burst=1.0, max_clients=2)
+    assert await backend.take('a', 1) == 0
+    assert await backend.take('b', 1) == 0
+    assert await backend.take('a', 1) > 0
+    assert await backend.take('c', 1) == 0
+    assert list(backend.buckets) == ['a', 'c']
+
+
+@pytest.mark.asyncio
+async def test_prepared_statements(app, monkeypatch):
+    """Test product CRUD over server-side prepared statements."""
+    async with app as client, client.app.extra['storage'].pool.acquire() as connection:
+        storage = MySQLStorage(connection)
+        database = client.app.extra['storage']
+        monkeypatch.setattr(database, 'prepared_statements', True)
+        is_mysql = not isinstance(database, MemoryDatabase)
+        if is_mysql:
+            executed = await storage.get("SHOW GLOBAL STATUS LIKE 'Com_stmt_execute'")
+
+        try:
+            response = client.post('/v1/products/', json=product_payload_fixture)
+            assert response.status_code == 201
+            product_id = response.json()['item']['id']
+            for image_url in ('http://a.b/c.png', 'http://a.b/d.png'):
+                # Second requests reuse the statements prepared by the first ones
+                response = client.put(
+                    f'/v1/products/{product_id}',
+                    json={**product_payload_fixture, 'image_url': image_url},
+                )
+                assert response.status_code == 200
+                response = client.get(f'/v1/products/{product_id}')
+                assert response.json()['item'] == {
+                    **product_payload_fixture,
+                    'id': product_id,
+                    'image_url': image_url,
+                }
+            assert client.delete(f'/v1/products/{product_id}').status_code == 200
+            assert client.get(f'/v1/products/{product_id}').status_code == 404
+
+            if is_mysql:
+                after = await storage.get("SHOW GLOBAL STATUS LIKE 'Com_stmt_execute'")
+                assert int(after.Value) - int(executed.Value) >= 8
+        finally:
+            await storage.apply('DELETE FROM products')
+            await storage.apply('DELETE FROM product_tombstones')
+
+
+@pytest.mark.asyncio
+async def test_compressed_descriptions(app, monkeypatch):
+    """Test storing descriptions compressed and compressing existing rows."""
+    monkeypatch.setattr(product_routes, 'CHANGES_VISIBILITY_LAG_MICROSECONDS', 0)
+    compressor = TextCompressor(min_length=32, batch_pause=0)
+    monkeypatch.setitem(v1.app_.extra, 'description_compressor', compressor)
+    description = 'a long and repetitive description ' * 20
+    async with app as client, client.app.extra['storage'].pool.acquire() as connection:
+        storage = MySQLStorage(connection)
+
+        try:
+            payload = {**product_payload_fixture, 'description': description}
+            product_id = client.post('/v1/products/', json=payload).json()['item']['id']
+            plain_id = await create_product(storage)  # Too short to compress
+            row = await storage.get(
+                'SELECT description, description_compressed FROM products WHERE id = %s',
+                product_id,
+            )
+            assert row.description == ''
+            assert len(row.description_compressed) < len(description) / 5
+
+            response = client.get(f'/v1/products/{product_id}')
+            assert response.json()['item']['description'] == description
+            response = client.get('/v1/products/changes')
+            assert [i['description'] for i in response.json()['items']] == [
+                description,
+                product_payload_fixture['description'],
+            ]
+
+            # Rows written before compression was enabled
+            await storage.apply(
+                'UPDATE products SET description = %s, description_compressed = NULL '
+                'WHERE id = %s',
+                (description, product_id),
+            )
+            database = client.app.extra['storage']
+            # Another worker is compressing the shard
+            lock_name = f'{database.database}.products.description_compressed'
+            await storage.get('SELECT GET_LOCK(%s, 0) AS locked', lock_name)
+            assert await compressor.backfill(database) == 0
+            await storage.get('SELECT RELEASE_LOCK(%s) AS released', lock_name)
+
+            assert await compressor.backfill(database) == 1
+            assert await compressor.backfill(database) == 0
+            row = await storage.get(
+                'SELECT description, description_compressed FROM products WHERE id = %s',
+                product_id,
+            )
+            assert row.description == '' and row.description_compressed
+            response = client.get(
+                '/v1/products', params={'id_in': [product_id, plain_id]}
+            )
+            assert [i['description'] for i in response.json()['items']] == [
+                description,
+                product_payload_fixture['description'],
+            ]
+        finally:
+            await storage.apply('DELETE FROM products')
+
+
+@pytest.mark.asyncio
+async def test_batch_create_products(app, query_budget):
+    """Test creating products with a single statement."""
+    async with app as client, client.app.extra['storage'].pool.acquire() as connection:
+        storage = MySQLStorage(connection)
+        payload = {
+            'items': [{**product_payload_fixture, 'price': i + 1} for i in range(5)]
+        }
+
+        try:
+            with query_budget(client, statements=1):
+                response = client.post('/v1/products/batch', json=payload)
+            assert response.status_code == 201
+            items = response.json()['items']
+            assert [i['price'] for i in items] == [1, 2, 3, 4, 5]
+            for item in items:
+                response = client.get(f'/v1/products/{item["id"]}')
+                assert response.json()['item']['price'] == item['price']
+
+            response = client.post('/v1/products/batch', json={'items': []})
+            assert response.status_code == 422
+        finally:
+            await storage.apply('DELETE FROM products')
+
+
+@pytest.mark.asyncio
+async def test_sorted_products(sharded_app):
+    """Test sorting and filtering lists merged across shards."""
+    async with sharded_app as client:
+        database = client.app.extra['storage']
+        try:
+            response = client.post(
+                '/v1/products/batch',
+                json={
+                    'items': [
+                        {**product_payload_fixture, 'name': f'product {c}', 'price': p}
+                        for c, p in zip('edcba', (3, 1, 3, 2, 5))
+                    ]
+                },
+            )
+            product_ids = [i['id'] for i in response.json()['items']]
+            assert len(set(product_ids)) == 5
+
+            response = client.get('/v1/products/', params={'sort': '-price'})
+            assert [i['name'] for i in response.json()['items']] == [
+                'product a',
+                'product c',
+                'product e',
+                'product b',
+                'product d',
+            ]
+
+            response = client.get(
+                '/v1/products/',
+                params={'sort': 'name', 'price_ge': 2, 'items_per_page': 2, 'page': 2},
+            )
+            data = response.json()
+            assert [i['name'] for i in data['items']] == ['product c', 'product e']
+            assert data['total_pages'] == 2
+
+            response = client.get('/v1/products/', params={'sort': 'description'})
+            assert response.status_code == 422
+        finally:
+            for shard in database.shards:
+                async with shard.pool.acquire() as connection:
+                    await MySQLStorage(connection).apply('DELETE FROM products')
+
+
+@pytest.mark.asyncio
+async def test_validation_errors(app):
+    """Test bounding 422 responses to malformed queries."""
+    async with app as client:
+        params = [('id_in', 'x' * 1000)] * 50 + [('price_lt', 'abc')]
+        response = client.get('/v1/products/', params=params)
+        assert response.status_code == 422
+        detail = response.json()['detail']
+        assert len(detail) == 10
+        assert detail[0]['loc'] == ['query', 'id_in', 0]
+        assert detail[0]['input'] == 'x' * 100
+
+        response = client.get('/v1/products/', params={'items_per_page': 0})
+        assert response.json()['detail'][0]['ctx'] == {'gt': 0}